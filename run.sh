@@ -4,6 +4,15 @@
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 VENV_PATH="$SCRIPT_DIR/venv/bin/activate"
 
+# 交互终端下优先使用本地最近数据 / 预生成报告并在后台刷新，不阻塞在网络上；
+# cron 等非交互调用（stdout 不是终端）保持实时抓取
+OFFLINE_FLAG=""
+LIVE_FLAG="--live"
+if [ -t 1 ]; then
+    OFFLINE_FLAG="--offline-first"
+    LIVE_FLAG=""
+fi
+
 show_help() {
     echo "Aiberm 价格监控工具"
     echo ""
@@ -11,6 +20,15 @@ show_help() {
     echo "  ./run.sh prices [关键词]     # 查询价格"
     echo "  ./run.sh balance             # 查询余额与用量汇总"
     echo "  ./run.sh recommend           # 推荐性价比模型"
+    echo "  ./run.sh accounts            # 多账户余额与用量汇总 (accounts/*.json)"
+    echo "  ./run.sh metrics             # 启动 Prometheus 指标导出 (127.0.0.1:9464/metrics)"
+    echo "  ./run.sh scheduler           # 常驻运行价格 / 用量 / 余额采集（代替 cron）"
+    echo "  ./run.sh serve               # 启动本地 JSON 查询服务 (127.0.0.1:9465)"
+    echo "  ./run.sh recommend --top 20  # 推荐前 20 个模型"
+    echo "  ./run.sh recommend --pareto  # 按类别的成本/能力帕累托前沿"
+    echo "  ./run.sh prices --format json      # 机器可读输出 (json/ndjson/csv/text)"
+    echo "  ./run.sh balance --profile         # 输出各阶段耗时 (Chrome trace JSON)"
+    echo "  ./run.sh balance --live            # 忽略预生成报告，实时查询"
     echo "  ./run.sh help                # 显示帮助"
     echo ""
     echo "示例:"
@@ -22,43 +40,70 @@ show_help() {
     echo "  - balance: 首次运行自动打开浏览器登录一次"
     echo "  - 登录态保存本地，后续自动查询 API"
     echo "  - prices: 使用公开 API，无需登录"
+    echo "  - 在终端中运行时优先显示本地最近数据（标注数据年龄），并在后台刷新"
 }
 
 case "${1:-help}" in
     prices)
         FILTER="${2:-}"
-        echo "🔄 正在查询价格${FILTER:+ (筛选: $FILTER)}..."
+        case "$FILTER" in -*) FILTER="" ;; esac
+        echo "🔄 正在查询价格${FILTER:+ (筛选: $FILTER)}..." >&2
         if [ -f "$VENV_PATH" ]; then
             source "$VENV_PATH"
-            python3 "$SCRIPT_DIR/scripts/fetch_prices.py" $FILTER
+            python3 "$SCRIPT_DIR/scripts/fetch_prices.py" $OFFLINE_FLAG "${@:2}"
         else
-            curl -s "https://aiberm.com/api/pricing" | python3 "$SCRIPT_DIR/scripts/quick_fetch.py" $FILTER
+            curl -s "https://aiberm.com/api/pricing" | python3 "$SCRIPT_DIR/scripts/quick_fetch.py" "${@:2}"
         fi
         ;;
     balance)
-        echo "🔄 正在查询余额..."
+        echo "🔄 正在查询余额..." >&2
         if [ -f "$VENV_PATH" ]; then
             source "$VENV_PATH"
         fi
         if [ -f "$SCRIPT_DIR/.auth_state.json" ]; then
-            python3 "$SCRIPT_DIR/scripts/skill_report.py" || {
+            python3 "$SCRIPT_DIR/scripts/skill_report.py" $OFFLINE_FLAG $LIVE_FLAG "${@:2}" || {
                 python3 "$SCRIPT_DIR/scripts/fetch_balance_auto.py"
-                python3 "$SCRIPT_DIR/scripts/skill_report.py"
+                python3 "$SCRIPT_DIR/scripts/skill_report.py" --live "${@:2}"
             }
         else
-            python3 "$SCRIPT_DIR/scripts/skill_report.py" || python3 "$SCRIPT_DIR/scripts/fetch_balance_auto.py"
-            python3 "$SCRIPT_DIR/scripts/skill_report.py"
+            python3 "$SCRIPT_DIR/scripts/skill_report.py" "${@:2}" || python3 "$SCRIPT_DIR/scripts/fetch_balance_auto.py"
+            python3 "$SCRIPT_DIR/scripts/skill_report.py" "${@:2}"
         fi
         ;;
     recommend)
-        echo "🔄 正在生成推荐..."
+        echo "🔄 正在生成推荐..." >&2
         if [ -f "$VENV_PATH" ]; then
             source "$VENV_PATH"
-            python3 "$SCRIPT_DIR/scripts/recommend_models.py"
+            python3 "$SCRIPT_DIR/scripts/recommend_models.py" "${@:2}"
         else
             echo "❌ 虚拟环境不存在，请先创建 venv"
         fi
         ;;
+    accounts)
+        echo "🔄 正在查询多账户余额..." >&2
+        if [ -f "$VENV_PATH" ]; then
+            source "$VENV_PATH"
+        fi
+        python3 "$SCRIPT_DIR/scripts/fetch_accounts.py" "${@:2}"
+        ;;
+    metrics)
+        if [ -f "$VENV_PATH" ]; then
+            source "$VENV_PATH"
+        fi
+        python3 "$SCRIPT_DIR/scripts/metrics_exporter.py" "${@:2}"
+        ;;
+    scheduler)
+        if [ -f "$VENV_PATH" ]; then
+            source "$VENV_PATH"
+        fi
+        python3 "$SCRIPT_DIR/scripts/scheduler.py" "${@:2}"
+        ;;
+    serve)
+        if [ -f "$VENV_PATH" ]; then
+            source "$VENV_PATH"
+        fi
+        python3 "$SCRIPT_DIR/scripts/query_server.py" "${@:2}"
+        ;;
     help|--help|-h|*)
         show_help
         ;;
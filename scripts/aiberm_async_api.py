@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Aiberm 控制台 API 异步客户端
+基于 asyncio + aiohttp，与 aiberm_console_api 的函数签名保持一致，
+可在同一个事件循环中并发发起大量请求，无需为每个请求开线程。
+
+用法:
+    async with AsyncConsoleClient() as client:
+        user, usage = await asyncio.gather(
+            client.fetch_user_self(auth_state=auth_state),
+            client.fetch_usage_data(auth_state=auth_state, start_timestamp=s, end_timestamp=e),
+        )
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from aiberm_console_api import (
+    build_base_headers,
+    build_cookie_header,
+    build_headers,
+)
+from constants import DATA_SELF_API, PRICING_API, USER_API
+from profiling import span
+from request_policy import (
+    CircuitOpenError,
+    call_with_policy_async,
+    get_policy,
+    observe_request,
+)
+from single_flight import AsyncSingleFlight, flight_key
+
+# 连接池总上限
+DEFAULT_POOL_LIMIT = 50
+# 单个主机的最大并发请求数
+DEFAULT_PER_HOST_LIMIT = 8
+# 连接池级别的兜底超时（秒），单个请求的超时由端点请求策略决定
+DEFAULT_TIMEOUT = 30
+# 计入重试 / 熔断的 aiohttp 请求错误
+CLIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class AsyncConsoleClient:
+    """
+    异步控制台客户端
+
+    - 共享一个 aiohttp 连接池（keep-alive 复用连接）
+    - 按主机限流：每个主机一个信号量，超出的请求在本地排队
+    - 每个请求独立超时；调用方取消任务时请求随之取消
+    - 不共享 Cookie：每次请求显式携带对应账户的 Cookie 头，多账户互不干扰
+    - 启用 single_flight 的端点，同时在途的相同请求（含 Cookie 头）只发一次，共享解析结果
+    """
+
+    def __init__(
+        self,
+        pool_limit=DEFAULT_POOL_LIMIT,
+        per_host_limit=DEFAULT_PER_HOST_LIMIT,
+        timeout=None,
+    ):
+        self.pool_limit = pool_limit
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self._session = None
+        self._semaphores = {}
+        self._flights = AsyncSingleFlight()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+        return False
+
+    async def open(self):
+        """创建连接池"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit, limit_per_host=self.per_host_limit
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+            )
+        return self._session
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _semaphore(self, url):
+        host = urlsplit(url).netloc
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    async def get_json(
+        self, url, headers=None, params=None, timeout=None, endpoint="default"
+    ):
+        """
+        按端点请求策略发起 GET 请求并解析 JSON（重试 / 熔断 / 对冲）
+
+        网络错误、超时、HTTP 错误或解析失败时返回 None；
+        asyncio.CancelledError 不会被吞掉，调用方可正常取消。
+        """
+        session = await self.open()
+
+        async def attempt(request_timeout):
+            async with self._semaphore(url):
+                started = time.monotonic()
+                try:
+                    with span("fetch." + endpoint):
+                        async with session.get(
+                            url,
+                            headers=headers,
+                            params=params,
+                            timeout=aiohttp.ClientTimeout(total=request_timeout),
+                        ) as response:
+                            response.raise_for_status()
+                            body = await response.read()
+                except CLIENT_ERRORS:
+                    observe_request(endpoint, time.monotonic() - started, 0, False)
+                    raise
+                observe_request(endpoint, time.monotonic() - started, len(body), True)
+                with span("parse." + endpoint, bytes=len(body)):
+                    return json.loads(body)
+
+        def call():
+            return call_with_policy_async(
+                endpoint, attempt, timeout=timeout or self.timeout, errors=CLIENT_ERRORS
+            )
+
+        try:
+            if get_policy(endpoint).single_flight:
+                key = flight_key(endpoint, url, params, headers)
+                return await self._flights.do(key, call)
+            return await call()
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            ValueError,
+            CircuitOpenError,
+        ):
+            return None
+
+    async def fetch_pricing_data(self, timeout=None):
+        """获取价格数据（公开接口）"""
+        data = await self.get_json(PRICING_API, timeout=timeout, endpoint="pricing")
+        if not data or not data.get("success"):
+            return None
+        return data
+
+    def _auth_headers(self, session_cookie=None, auth_state=None):
+        """构造带登录态的请求头"""
+        if auth_state is not None:
+            cookie_header = build_cookie_header(auth_state)
+            if not cookie_header:
+                return None
+            headers = build_base_headers(auth_state=auth_state)
+            headers["Cookie"] = cookie_header
+            return headers
+        return build_headers(session_cookie=session_cookie)
+
+    async def fetch_user_self(self, session_cookie=None, auth_state=None, timeout=None):
+        """获取用户信息与余额"""
+        headers = self._auth_headers(session_cookie, auth_state)
+        if headers is None:
+            return None
+        data = await self.get_json(
+            USER_API, headers=headers, timeout=timeout, endpoint="user_self"
+        )
+        if not data or not data.get("success"):
+            return None
+        return data.get("data", {})
+
+    async def fetch_usage_data(
+        self,
+        session_cookie=None,
+        start_timestamp=None,
+        end_timestamp=None,
+        default_time="day",
+        timeout=None,
+        auth_state=None,
+    ):
+        """获取使用统计数据"""
+        if start_timestamp is None or end_timestamp is None:
+            return None
+        headers = self._auth_headers(session_cookie, auth_state)
+        if headers is None:
+            return None
+        params = {
+            "start_timestamp": int(start_timestamp),
+            "end_timestamp": int(end_timestamp),
+            "default_time": default_time,
+        }
+        data = await self.get_json(
+            DATA_SELF_API,
+            headers=headers,
+            params=params,
+            timeout=timeout,
+            endpoint="usage",
+        )
+        if not data or not data.get("success"):
+            return None
+        return data.get("data", [])
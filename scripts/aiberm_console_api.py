@@ -10,7 +10,21 @@ from pathlib import Path
 
 import requests
 
-from constants import BALANCE_FILE, DATA_SELF_API, QUOTA_DIVISOR, USER_API
+from alerts import anomaly_events, publish
+from balance_series import format_forecast
+from constants import (
+    BALANCE_FILE,
+    DATA_SELF_API,
+    QUOTA_DIVISOR,
+    USAGE_TOP_K,
+    USER_API,
+)
+from profiling import span, traced
+from request_policy import request_get
+from storage import get_storage
+from usage_anomaly import anomaly_file, detect_anomalies, format_anomalies
+from usage_rollup import UsageRollup, build_rollups, rollup_file, save_rollups
+from usage_windows import format_windows, update_windows, windows_file
 
 
 def load_auth_state(auth_file: Path):
@@ -132,23 +146,27 @@ def build_session_from_auth_state(auth_state, domain_keyword="aiberm.com"):
     return session
 
 
-def fetch_user_self(session_cookie=None, auth_state=None, timeout=10):
-    """获取用户信息与余额"""
+def fetch_user_self(session_cookie=None, auth_state=None, timeout=None, session=None):
+    """获取用户信息与余额（session 为长驻进程复用的登录态会话，省略时按 auth_state 新建）"""
     try:
         if auth_state is not None:
-            session = build_session_from_auth_state(auth_state)
+            session = session or build_session_from_auth_state(auth_state)
             if not session:
                 return None
-            response = session.get(
+            response = request_get(
+                "user_self",
                 USER_API,
+                session=session,
                 headers=build_base_headers(auth_state=auth_state),
                 timeout=timeout,
             )
         else:
             headers = build_headers(session_cookie=session_cookie)
-            response = requests.get(USER_API, headers=headers, timeout=timeout)
-        response.raise_for_status()
-        data = response.json()
+            response = request_get(
+                "user_self", USER_API, headers=headers, timeout=timeout
+            )
+        with span("parse.user_self"):
+            data = response.json()
         if not data.get("success"):
             return None
         return data.get("data", {})
@@ -163,10 +181,11 @@ def fetch_usage_data(
     start_timestamp=None,
     end_timestamp=None,
     default_time="day",
-    timeout=10,
+    timeout=None,
     auth_state=None,
+    session=None,
 ):
-    """获取使用统计数据"""
+    """获取使用统计数据（session 同 fetch_user_self）"""
     if start_timestamp is None or end_timestamp is None:
         return None
     params = {
@@ -176,25 +195,28 @@ def fetch_usage_data(
     }
     try:
         if auth_state is not None:
-            session = build_session_from_auth_state(auth_state)
+            session = session or build_session_from_auth_state(auth_state)
             if not session:
                 return None
-            response = session.get(
+            response = request_get(
+                "usage",
                 DATA_SELF_API,
+                session=session,
                 headers=build_base_headers(auth_state=auth_state),
                 params=params,
                 timeout=timeout,
             )
         else:
             headers = build_headers(session_cookie=session_cookie)
-            response = requests.get(
+            response = request_get(
+                "usage",
                 DATA_SELF_API,
                 headers=headers,
                 params=params,
                 timeout=timeout,
             )
-        response.raise_for_status()
-        data = response.json()
+        with span("parse.usage"):
+            data = response.json()
         if not data.get("success"):
             return None
         return data.get("data", [])
@@ -204,50 +226,29 @@ def fetch_usage_data(
         return None
 
 
-def summarize_usage(records):
-    """统计使用数据"""
-    total_quota = 0
-    total_tokens = 0
-    total_count = 0
-    by_model = {}
-
-    for record in records or []:
-        quota = record.get("quota", 0) or 0
-        token_used = record.get("token_used", 0) or 0
-        count = record.get("count", 0) or 0
-        model_name = record.get("model_name", "unknown")
-
-        total_quota += quota
-        total_tokens += token_used
-        total_count += count
-
-        model_stats = by_model.setdefault(
-            model_name, {"quota": 0, "token_used": 0, "count": 0}
-        )
-        model_stats["quota"] += quota
-        model_stats["token_used"] += token_used
-        model_stats["count"] += count
-
-    top_models = sorted(
-        by_model.items(), key=lambda item: item[1]["quota"], reverse=True
-    )[:5]
-
+@traced("aggregate.usage")
+def summarize_usage(records, top_n=USAGE_TOP_K):
+    """统计使用数据（单次遍历，见 usage_rollup）"""
+    rollup = UsageRollup("day").add_all(records)
+    totals = rollup.totals()
     return {
-        "total_quota": total_quota,
-        "total_tokens": total_tokens,
-        "total_count": total_count,
-        "top_models": top_models,
+        "total_quota": totals["quota"],
+        "total_tokens": totals["token_used"],
+        "total_count": totals["count"],
+        "top_models": rollup.by_model(top_n),
     }
 
 
-def build_snapshot(user_data, usage_records, start_timestamp, end_timestamp):
+def build_snapshot(
+    user_data, usage_records, start_timestamp, end_timestamp, top_n=USAGE_TOP_K
+):
     """组装余额/用量快照"""
     quota = user_data.get("quota")
     used_quota = user_data.get("used_quota", 0)
     remaining_amount = quota / QUOTA_DIVISOR if quota is not None else None
     used_amount = used_quota / QUOTA_DIVISOR if used_quota is not None else None
 
-    usage_summary = summarize_usage(usage_records)
+    usage_summary = summarize_usage(usage_records, top_n=top_n)
 
     return {
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -276,17 +277,40 @@ def build_snapshot(user_data, usage_records, start_timestamp, end_timestamp):
     }
 
 
+@traced("history.save_snapshot")
 def save_snapshot(snapshot, output_file: Path = BALANCE_FILE):
-    """保存快照到文件"""
+    """保存快照（JSON 后端原子替换文件，读者不会读到写了一半的文件）"""
     try:
-        output_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(snapshot, f, ensure_ascii=False, indent=2)
-    except IOError:
+        get_storage().save_snapshot(output_file, snapshot)
+    except (IOError, OSError):
         return False
     return True
 
 
+def save_usage(usage_records, account="default", window=None):
+    """
+    保存用量明细（按账户 / 模型 / 时间桶去重，供按时间段统计），
+    并保存按小时 / 天 / 周预先汇总的结果（window 为本次查询的 (start_ts, end_ts)），
+    同时增量更新滚动用量窗口与用量异常检测。
+
+    返回要写入快照的字段 {"usage_windows", "anomalies"}，写入失败时返回空字典。
+    """
+    rollups = build_rollups(usage_records or [])
+    try:
+        if usage_records:
+            get_storage().save_usage(usage_records, account=account)
+            save_rollups(rollups, rollup_file(account), window)
+        # 没有新用量时也要更新：滑出窗口的桶需要从合计中减去，空档按 0 计入基线
+        anomalies = detect_anomalies(rollups["hour"], anomaly_file(account), window)
+        publish(anomaly_events(anomalies, account))
+        return {
+            "usage_windows": update_windows(rollups["hour"], windows_file(account)),
+            "anomalies": anomalies,
+        }
+    except (IOError, OSError):
+        return {}
+
+
 def format_snapshot(snapshot):
     """格式化输出内容"""
     user = snapshot.get("user", {})
@@ -315,19 +339,57 @@ def format_snapshot(snapshot):
         lines.append(f"   历史消耗: ${used_amount:.2f}")
     else:
         lines.append("   历史消耗: N/A")
+    if "forecast" in snapshot:
+        lines.extend(format_forecast(snapshot["forecast"]))
 
     lines.append("\n📊 使用统计 (时间段内)")
     lines.append(f"   统计请求数: {usage.get('total_count', 0)}")
     lines.append(f"   统计 Tokens: {usage.get('total_tokens', 0)}")
     if usage.get("total_quota") is not None:
         lines.append(f"   统计消耗: ${usage.get('total_quota', 0) / QUOTA_DIVISOR:.2f}")
+    if snapshot.get("usage_windows"):
+        lines.append(format_windows(snapshot["usage_windows"]))
+    lines.extend(format_anomalies(snapshot.get("anomalies")))
 
     top_models = usage.get("top_models", [])
     if top_models:
-        lines.append("\n🏆 消耗排行 (Top 5)")
+        lines.append(f"\n🏆 消耗排行 (Top {len(top_models)})")
         for name, stats in top_models:
             quota = stats.get("quota", 0)
             count = stats.get("count", 0)
             lines.append(f"   {name}: ${quota / QUOTA_DIVISOR:.2f} / {count} 次")
 
     return lines
+
+
+@traced("render.snapshot")
+def render_snapshot(snapshot, out):
+    """按输出格式渲染快照"""
+    if not out.structured:
+        out.text(*format_snapshot(snapshot))
+        return
+
+    usage = snapshot.get("usage_summary", {})
+    out.meta(
+        timestamp=snapshot.get("timestamp"),
+        user=snapshot.get("user", {}),
+        balance=snapshot.get("balance", {}),
+        usage_window=snapshot.get("usage_window", {}),
+        forecast=snapshot.get("forecast"),
+        usage_windows=snapshot.get("usage_windows"),
+        anomalies=snapshot.get("anomalies", []),
+        total_quota=usage.get("total_quota"),
+        total_tokens=usage.get("total_tokens"),
+        total_count=usage.get("total_count"),
+    )
+    for rank, (name, stats) in enumerate(usage.get("top_models", []), 1):
+        out.row(
+            {
+                "rank": rank,
+                "model_name": name,
+                "quota": stats.get("quota", 0),
+                "quota_amount": stats.get("quota", 0) / QUOTA_DIVISOR,
+                "token_used": stats.get("token_used", 0),
+                "count": stats.get("count", 0),
+            }
+        )
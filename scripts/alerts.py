@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 告警管道
+采集过程中产生的事件（价格变动、余额不足、用量异常）经过以下流程送达各通道:
+
+    publish(事件) → 批次窗口内合并（同一事件只保留最新） → 去抖（同一事件在
+    ALERT_DEBOUNCE 内只发送一次，按通道记录、跨进程共享状态） → 每个通道一个发送队列 + 工作线程
+
+去抖状态只在通道发送成功后写入：webhook 暂时不可用时，失败的事件下次发布时仍会发送。
+
+publish() 只把事件放进内存缓冲区，从不等待网络或磁盘；慢通道只会让自己的队列积压，
+队列满时丢弃新批次，不会阻塞采集，也不会拖慢其他通道。进程退出时最多等待
+ALERT_FLUSH_TIMEOUT 秒把剩余批次发出。
+
+通道（config.json 的 "alerts"，未配置时只写 references/alerts.ndjson）:
+    {
+      "alerts": {
+        "enabled": true,
+        "batch_window": 2,
+        "debounce": 21600,
+        "sinks": [
+          {"type": "webhook", "url": "http://127.0.0.1:8765/alerts"},
+          {"type": "file", "path": "references/alerts.ndjson"},
+          {"type": "stdout"}
+        ]
+      }
+    }
+
+用法:
+    python3 scripts/alerts.py serve --port 8765            # 本地 webhook 接收端（联调用）
+    python3 scripts/alerts.py test --webhook http://127.0.0.1:8765/alerts
+"""
+
+import argparse
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from constants import (
+    ALERT_BATCH_WINDOW,
+    ALERT_DEBOUNCE,
+    ALERT_FLUSH_TIMEOUT,
+    ALERT_LOG_FILE,
+    ALERT_QUEUE_SIZE,
+    ALERT_SINK_TIMEOUT,
+    ALERT_STATE_FILE,
+    BALANCE_WARNING_CRITICAL,
+    BALANCE_WARNING_LOW,
+    CONFIG_FILE,
+    PROJECT_ROOT,
+    QUOTA_DIVISOR,
+)
+from file_store import CorruptStoreError, append_line, read_json, update_json
+from output import stdout_is_structured
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+SEVERITY_ICONS = {"critical": "🚨", "warning": "⚠️ ", "info": "ℹ️ "}
+
+# 价格变动检测比较的字段
+PRICE_FIELDS = ("quota_type", "model_ratio", "completion_ratio", "model_price")
+
+
+def make_event(kind, key, message, severity="info", **data):
+    """
+    构造事件
+
+    key 用于合并与去抖：同一 key 的事件在批次内只保留最新一条，
+    在去抖时间内只发送一次。
+    """
+    return {
+        "kind": kind,
+        "key": key,
+        "severity": severity,
+        "message": message,
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "data": data,
+    }
+
+
+def format_event(event):
+    """事件的单行文本"""
+    icon = SEVERITY_ICONS.get(event.get("severity"), "")
+    return f"{icon} [{event.get('kind')}] {event.get('message')}"
+
+
+# ========== 事件来源 ==========
+
+
+def _format_ratio_change(old, new):
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+        return f"{old} → {new}（{(new - old) / old * 100:+.1f}%）"
+    return f"{old} → {new}"
+
+
+def price_change_events(old_pricing, new_pricing):
+    """
+    对比两次价格数据（/api/pricing 的完整响应），产出价格变动事件
+
+    每个模型的倍率 / 按次价格变化、上下架各一条；分组折扣变化一条。
+    """
+    old_pricing = old_pricing or {}
+    new_pricing = new_pricing or {}
+    old_models = {
+        model.get("model_name"): model
+        for model in old_pricing.get("data", [])
+        if model.get("model_name")
+    }
+    new_models = {
+        model.get("model_name"): model
+        for model in new_pricing.get("data", [])
+        if model.get("model_name")
+    }
+    events = []
+
+    old_group = (old_pricing.get("group_ratio") or {}).get("default")
+    new_group = (new_pricing.get("group_ratio") or {}).get("default")
+    if old_group is not None and new_group is not None and old_group != new_group:
+        events.append(
+            make_event(
+                "price_change",
+                f"group_ratio:{new_group}",
+                f"分组折扣变化: {_format_ratio_change(old_group, new_group)}",
+                severity="warning",
+                old=old_group,
+                new=new_group,
+            )
+        )
+
+    for name, model in new_models.items():
+        old = old_models.get(name)
+        if old is None:
+            events.append(
+                make_event(
+                    "model_added", f"model_added:{name}", f"新上架模型: {name}", model=name
+                )
+            )
+            continue
+        changes = {
+            field: (old.get(field), model.get(field))
+            for field in PRICE_FIELDS
+            if old.get(field) != model.get(field)
+        }
+        if not changes:
+            continue
+        details = "，".join(
+            f"{field} {_format_ratio_change(before, after)}"
+            for field, (before, after) in changes.items()
+        )
+        new_values = ",".join(str(model.get(field)) for field in PRICE_FIELDS)
+        events.append(
+            make_event(
+                "price_change",
+                f"price:{name}:{new_values}",
+                f"{name} 价格变动: {details}",
+                severity="warning",
+                model=name,
+                changes={field: list(pair) for field, pair in changes.items()},
+            )
+        )
+
+    for name in sorted(old_models.keys() - new_models.keys()):
+        events.append(
+            make_event(
+                "model_removed", f"model_removed:{name}", f"模型已下架: {name}", model=name
+            )
+        )
+    return events
+
+
+def load_previous_pricing(storage):
+    """保存新价格前读取上一次的价格记录（用于对比），读取失败时返回 None"""
+    try:
+        return storage.load_latest_pricing()
+    except (CorruptStoreError, IOError):
+        return None
+
+
+def balance_events(snapshot):
+    """
+    余额样本的预警事件（阈值见 constants.BALANCE_WARNING_*，单位为分，
+    与 remaining_amount 比较时换算为元/美元单位）
+    """
+    balance = snapshot.get("balance", {})
+    remaining = balance.get("remaining_amount")
+    if remaining is None:
+        return []
+    account = snapshot.get("account", "default")
+    label = "" if account == "default" else f"[{account}] "
+    if remaining < BALANCE_WARNING_CRITICAL / 100:
+        severity, text = "critical", "余额严重不足，请及时充值"
+    elif remaining < BALANCE_WARNING_LOW / 100:
+        severity, text = "warning", "余额较低，建议充值"
+    else:
+        return []
+
+    runway = (snapshot.get("forecast") or {}).get("days_to_empty")
+    if runway is not None:
+        text += f"（预计 {runway:.1f} 天后用完）"
+    return [
+        make_event(
+            "balance_low",
+            f"balance:{account}:{severity}",
+            f"{label}剩余 ${remaining:.2f}，{text}",
+            severity=severity,
+            account=account,
+            remaining_amount=remaining,
+        )
+    ]
+
+
+def anomaly_events(anomalies, account="default"):
+    """用量异常（见 usage_anomaly.py）对应的事件"""
+    label = "" if account == "default" else f"[{account}] "
+    return [
+        make_event(
+            "usage_anomaly",
+            f"anomaly:{account}:{anomaly['model_name']}:{anomaly['bucket']}",
+            f"{label}{anomaly['time']} {anomaly['model_name']} 消耗突增: "
+            f"${anomaly['quota'] / QUOTA_DIVISOR:.2f}"
+            f"（基线 ${anomaly['baseline']['quota'] / QUOTA_DIVISOR:.2f}）",
+            severity="warning",
+            account=account,
+            **anomaly,
+        )
+        for anomaly in anomalies or []
+    ]
+
+
+# ========== 发送通道 ==========
+
+
+class StdoutSink:
+    """输出到标准输出（本进程以 --format json/ndjson/csv 输出数据时改写到 stderr）"""
+
+    name = "stdout"
+
+    def send(self, batch):
+        lines = [f"\n🔔 告警 ({len(batch['events'])} 条)"]
+        lines.extend(f"   {format_event(event)}" for event in batch["events"])
+        stream = sys.stderr if stdout_is_structured() else sys.stdout
+        print("\n".join(lines), file=stream, flush=True)
+
+
+class FileSink:
+    """每个事件追加一行 NDJSON"""
+
+    name = "file"
+
+    def __init__(self, path=ALERT_LOG_FILE):
+        path = Path(path)
+        self.path = path if path.is_absolute() else PROJECT_ROOT / path
+
+    def send(self, batch):
+        for event in batch["events"]:
+            append_line(self.path, json.dumps(event, ensure_ascii=False))
+
+
+class WebhookSink:
+    """整批以 JSON POST 到 webhook"""
+
+    name = "webhook"
+
+    def __init__(self, url, timeout=ALERT_SINK_TIMEOUT, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = headers or {}
+
+    def send(self, batch):
+        # 延迟导入：quick_fetch 等轻量脚本在没有 requests 的环境也能发布事件（写文件 / 标准输出）
+        import requests
+
+        response = requests.post(
+            self.url, json=batch, timeout=self.timeout, headers=self.headers
+        )
+        response.raise_for_status()
+
+
+SINK_TYPES = {"stdout": StdoutSink, "file": FileSink, "webhook": WebhookSink}
+
+
+def build_sink(options):
+    """按配置项 {"type": ..., 其余为构造参数} 创建通道"""
+    options = dict(options)
+    sink_type = options.pop("type", None)
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"不支持的告警通道: {sink_type}")
+    return SINK_TYPES[sink_type](**options)
+
+
+class SinkWorker:
+    """
+    单个通道的发送队列与工作线程
+
+    发送成功后调用 on_sent(worker, batch)（用于记录去抖状态）；发送失败的事件不做记录，
+    下次再发布时会重新发送。
+    """
+
+    _STOP = object()
+
+    def __init__(self, sink, maxsize=ALERT_QUEUE_SIZE, key=None, on_sent=None):
+        self.sink = sink
+        self.key = key or sink.name
+        self.on_sent = on_sent
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        # 已入队、尚未发送完成的事件 key（避免同一进程在发送完成前重复入队）
+        self.inflight = set()
+        self._inflight_lock = threading.Lock()
+        self.thread = threading.Thread(
+            target=self._run, name=f"alert-{sink.name}", daemon=True
+        )
+        self.thread.start()
+
+    def is_inflight(self, key):
+        with self._inflight_lock:
+            return key in self.inflight
+
+    def submit(self, batch):
+        """放入队列（不等待），队列已满时丢弃并计数"""
+        keys = {event["key"] for event in batch["events"]}
+        with self._inflight_lock:
+            self.inflight |= keys
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            self.dropped += 1
+            self._release(keys)
+
+    def _release(self, keys):
+        with self._inflight_lock:
+            self.inflight -= keys
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is self._STOP:
+                return
+            try:
+                self.sink.send(batch)
+                self.sent += 1
+                if self.on_sent is not None:
+                    self.on_sent(self, batch)
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️  告警发送失败（{self.sink.name}）: {e}", file=sys.stderr)
+            finally:
+                self._release({event["key"] for event in batch["events"]})
+
+    def stop(self, timeout):
+        """发送完队列中的批次后退出，最多等待 timeout 秒"""
+        try:
+            self.queue.put(self._STOP, timeout=max(0.0, timeout))
+        except queue.Full:
+            return
+        self.thread.join(max(0.0, timeout))
+
+
+def _worker_keys(sinks):
+    """各通道在去抖状态中的标识（同类型的多个通道按出现顺序编号）"""
+    seen = {}
+    keys = []
+    for sink in sinks:
+        count = seen.get(sink.name, 0)
+        seen[sink.name] = count + 1
+        keys.append(sink.name if count == 0 else f"{sink.name}#{count + 1}")
+    return keys
+
+
+class AlertPipeline:
+    """
+    事件缓冲 → 批次 → 去抖 → 各通道发送队列
+
+    去抖按通道记录：某个事件只有在该通道发送成功后才记入 state_file，
+    通道暂时不可用时事件不会被去抖吞掉。
+    """
+
+    def __init__(
+        self,
+        sinks,
+        batch_window=ALERT_BATCH_WINDOW,
+        debounce=ALERT_DEBOUNCE,
+        state_file: Path = ALERT_STATE_FILE,
+    ):
+        self.workers = [
+            SinkWorker(sink, key=key, on_sent=self._mark_sent)
+            for sink, key in zip(sinks, _worker_keys(sinks))
+        ]
+        self.batch_window = batch_window
+        self.debounce = debounce
+        self.state_file = state_file
+        self.suppressed = 0
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def publish(self, event):
+        """加入当前批次（同一 key 只保留最新一条）；批次窗口到期后统一发送"""
+        with self._lock:
+            if self._closed:
+                return
+            self._pending[event["key"]] = event
+            if self._timer is None:
+                self._timer = threading.Timer(self.batch_window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def publish_all(self, events):
+        for event in events:
+            self.publish(event)
+
+    def _load_state(self):
+        """去抖状态 {"通道:事件 key": 上次发送成功的时间}，读取失败时视为空"""
+        if not self.debounce:
+            return {}
+        try:
+            state = read_json(self.state_file, {})
+        except (IOError, OSError, CorruptStoreError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def _mark_sent(self, worker, batch):
+        """通道发送成功后记录各事件的发送时间（跨进程加锁）"""
+        if not self.debounce:
+            return
+        now = time.time()
+
+        def mark(state):
+            if not isinstance(state, dict):
+                state = {}
+            state = {
+                key: sent_at
+                for key, sent_at in state.items()
+                if isinstance(sent_at, (int, float)) and now - sent_at < self.debounce
+            }
+            for event in batch["events"]:
+                state[f"{worker.key}:{event['key']}"] = now
+            return state
+
+        try:
+            update_json(self.state_file, mark, default={})
+        except (IOError, OSError):
+            pass
+
+    def _fresh(self, worker, events, state, now):
+        """该通道需要发送的事件：去抖时间内未发送成功过，且不在发送队列中"""
+        fresh = []
+        for event in events:
+            sent_at = state.get(f"{worker.key}:{event['key']}")
+            if isinstance(sent_at, (int, float)) and now - sent_at < self.debounce:
+                continue
+            if worker.is_inflight(event["key"]):
+                continue
+            fresh.append(event)
+        return fresh
+
+    def flush(self):
+        """立即发送当前批次"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending = {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+        state = self._load_state()
+        now = time.time()
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for worker in self.workers:
+            events = self._fresh(worker, pending, state, now)
+            self.suppressed += len(pending) - len(events)
+            if not events:
+                continue
+            worker.submit(
+                {
+                    "source": "aiberm",
+                    "timestamp": timestamp,
+                    "count": len(events),
+                    "events": events,
+                }
+            )
+
+    def close(self, timeout=ALERT_FLUSH_TIMEOUT):
+        """发出剩余批次并等待各通道发送完成（总共最多 timeout 秒）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.stop(deadline - time.monotonic())
+
+
+def load_alert_config():
+    """读取 config.json 中的 alerts 配置"""
+    if not CONFIG_FILE.exists():
+        return {}
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+    alerts = config.get("alerts", {}) if isinstance(config, dict) else {}
+    return alerts if isinstance(alerts, dict) else {}
+
+
+def create_pipeline(config=None):
+    """按配置创建告警管道，告警被关闭时返回 None"""
+    config = load_alert_config() if config is None else config
+    if not config.get("enabled", True):
+        return None
+    sinks = []
+    for options in config.get("sinks") or [{"type": "file"}]:
+        try:
+            sinks.append(build_sink(options))
+        except (TypeError, ValueError) as e:
+            print(f"⚠️  告警通道配置无效（{options}）: {e}", file=sys.stderr)
+    if not sinks:
+        return None
+    return AlertPipeline(
+        sinks,
+        batch_window=config.get("batch_window", ALERT_BATCH_WINDOW),
+        debounce=config.get("debounce", ALERT_DEBOUNCE),
+    )
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """进程内共享的告警管道（首次使用时创建，进程退出时自动发送剩余事件）"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = create_pipeline() or False
+            if _pipeline:
+                atexit.register(_pipeline.close)
+        return _pipeline or None
+
+
+def publish(events):
+    """发布一组事件（告警关闭或没有事件时什么也不做）"""
+    if not events:
+        return
+    pipeline = get_pipeline()
+    if pipeline is not None:
+        pipeline.publish_all(events)
+
+
+# ========== 本地 webhook 接收端（联调用） ==========
+
+
+def make_receiver_handler(received):
+    """创建 webhook 接收处理器，收到的批次追加到 received"""
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                batch = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self.send_error(400)
+                return
+            received.append(batch)
+            print(f"\n📥 收到告警批次 ({batch.get('count', 0)} 条)", flush=True)
+            for event in batch.get("events", []):
+                print(f"   {format_event(event)}", flush=True)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 告警管道")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="启动本地 webhook 接收端")
+    serve.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+
+    test = subparsers.add_parser("test", help="发送一批示例事件")
+    test.add_argument("--webhook", default=None, help="webhook 地址（默认使用配置的通道）")
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    if args.command == "serve":
+        server = ThreadingHTTPServer(
+            (args.host, args.port), make_receiver_handler([])
+        )
+        print(f"🔔 webhook 接收端已启动: http://{args.host}:{args.port}/alerts")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n⚠️  用户中断")
+        finally:
+            server.server_close()
+        return
+
+    if args.webhook:
+        # 示例事件不去抖，也不写入共享的去抖状态
+        pipeline = AlertPipeline(
+            [WebhookSink(args.webhook), StdoutSink()], debounce=0
+        )
+    else:
+        pipeline = create_pipeline()
+        if pipeline is None:
+            print("❌ 告警已关闭或没有可用的通道")
+            sys.exit(1)
+
+    stamp = int(time.time())
+    pipeline.publish_all(
+        [
+            make_event("test", f"test:{stamp}:1", "告警管道测试（info）"),
+            make_event(
+                "test", f"test:{stamp}:2", "告警管道测试（warning）", severity="warning"
+            ),
+        ]
+    )
+    pipeline.close()
+    for worker in pipeline.workers:
+        print(
+            f"   {worker.sink.name}: 成功 {worker.sent} 批，失败 {worker.failed} 批，"
+            f"丢弃 {worker.dropped} 批"
+        )
+
+
+if __name__ == "__main__":
+    main()
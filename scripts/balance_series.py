@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 余额时间序列与消耗预测
+每次查询余额时向 balance_series.ndjson 追加一条 (时间, quota, used_quota)，
+并增量更新消耗速率状态（指数加权，按时间衰减），每个新样本 O(1)，不回扫历史序列。
+
+消耗速率 = 衰减累计消耗 / 衰减累计时长：
+    d = exp(-Δt / τ)
+    burn_used = burn_used * d + Δused
+    burn_time = burn_time * d + Δt
+    （τ = 半衰期 / ln2，半衰期见 constants.BURN_RATE_HALF_LIFE）
+采样间隔不规则时同样成立；充值只会增加 quota，不影响基于 used_quota 的消耗统计。
+"""
+
+import json
+import math
+import time
+from datetime import datetime
+from pathlib import Path
+
+from alerts import balance_events, publish
+from constants import (
+    BALANCE_FORECAST_FILE,
+    BALANCE_SERIES_FILE,
+    BURN_RATE_HALF_LIFE,
+    BURN_RATE_MIN_SPAN,
+    QUOTA_DIVISOR,
+)
+from file_store import append_line, atomic_write_json, locked
+from profiling import traced
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def new_state():
+    """空的消耗速率状态"""
+    return {
+        "samples": 0,
+        "last_ts": None,
+        "last_quota": None,
+        "last_used_quota": None,
+        "burn_used": 0.0,
+        "burn_time": 0.0,
+    }
+
+
+def update_state(state, timestamp, quota, used_quota, half_life=BURN_RATE_HALF_LIFE):
+    """用一个新样本更新状态（原地修改并返回）"""
+    last_ts = state.get("last_ts")
+    if last_ts is not None:
+        elapsed = timestamp - last_ts
+        if elapsed <= 0:
+            return state
+
+        if used_quota is not None and state.get("last_used_quota") is not None:
+            consumed = used_quota - state["last_used_quota"]
+        elif quota is not None and state.get("last_quota") is not None:
+            # 没有 used_quota 时退回到余额下降量（无法区分充值）
+            consumed = state["last_quota"] - quota
+        else:
+            consumed = 0
+        consumed = max(0, consumed)
+
+        decay = math.exp(-elapsed * math.log(2) / half_life)
+        state["burn_used"] = state["burn_used"] * decay + consumed
+        state["burn_time"] = state["burn_time"] * decay + elapsed
+
+    state["samples"] = state.get("samples", 0) + 1
+    state["last_ts"] = timestamp
+    state["last_quota"] = quota
+    state["last_used_quota"] = used_quota
+    return state
+
+
+def forecast(state, min_span=BURN_RATE_MIN_SPAN):
+    """
+    根据状态计算消耗预测
+
+    返回 {"samples", "burn_rate", "burn_amount_per_day", "days_to_empty", "empty_at"}；
+    有效观测时长不足 min_span 时速率相关字段为 None。
+    """
+    result = {
+        "samples": state.get("samples", 0),
+        "burn_rate": None,
+        "burn_amount_per_day": None,
+        "days_to_empty": None,
+        "empty_at": None,
+    }
+    if state.get("burn_time", 0) < min_span:
+        return result
+
+    rate = state["burn_used"] / state["burn_time"] * SECONDS_PER_DAY
+    result["burn_rate"] = rate
+    result["burn_amount_per_day"] = rate / QUOTA_DIVISOR
+
+    quota = state.get("last_quota")
+    if rate > 0 and quota is not None:
+        days = max(0.0, quota / rate)
+        result["days_to_empty"] = days
+        empty_ts = state["last_ts"] + days * SECONDS_PER_DAY
+        result["empty_at"] = datetime.fromtimestamp(empty_ts).strftime("%Y-%m-%d")
+    return result
+
+
+def iter_series(series_file: Path = BALANCE_SERIES_FILE):
+    """逐行读取余额序列（跳过损坏的行）"""
+    if not series_file.exists():
+        return
+    with open(series_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                sample = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(sample, dict) and sample.get("ts") is not None:
+                yield sample
+
+
+def rebuild_state(series_file: Path = BALANCE_SERIES_FILE):
+    """从完整序列重建状态（仅在状态文件缺失或损坏时使用）"""
+    state = new_state()
+    for sample in iter_series(series_file):
+        update_state(state, sample["ts"], sample.get("quota"), sample.get("used_quota"))
+    return state
+
+
+def load_state(
+    state_file: Path = BALANCE_FORECAST_FILE, series_file: Path = BALANCE_SERIES_FILE
+):
+    """读取消耗速率状态，缺失或损坏时从序列重建"""
+    if state_file.exists():
+        try:
+            with open(state_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("state"), dict):
+                return data["state"]
+        except (json.JSONDecodeError, IOError):
+            pass
+    return rebuild_state(series_file)
+
+
+def load_forecast(
+    state_file: Path = BALANCE_FORECAST_FILE, series_file: Path = BALANCE_SERIES_FILE
+):
+    """读取最近一次的消耗预测，没有任何样本时返回 None"""
+    state = load_state(state_file, series_file)
+    if not state.get("samples"):
+        return None
+    return forecast(state)
+
+
+@traced("history.balance_series")
+def record_snapshot(
+    snapshot,
+    series_file: Path = BALANCE_SERIES_FILE,
+    state_file: Path = BALANCE_FORECAST_FILE,
+    timestamp=None,
+):
+    """
+    记录一次余额快照：追加到序列并增量更新预测状态，余额低于预警线时发布告警
+
+    返回更新后的预测（见 forecast()），写入失败时返回 None。
+    """
+    balance = snapshot.get("balance", {})
+    quota = balance.get("quota")
+    used_quota = balance.get("used_quota")
+    if quota is None and used_quota is None:
+        return None
+    timestamp = timestamp if timestamp is not None else time.time()
+
+    sample = {
+        "ts": round(timestamp, 3),
+        "time": snapshot.get("timestamp"),
+        "quota": quota,
+        "used_quota": used_quota,
+    }
+    try:
+        # 序列追加与状态更新在同一把锁内完成，并发采集时两者保持一致
+        with locked(state_file):
+            state = load_state(state_file, series_file)
+            update_state(state, sample["ts"], quota, used_quota)
+            result = forecast(state)
+            append_line(series_file, json.dumps(sample, ensure_ascii=False))
+            atomic_write_json(
+                state_file, {"state": state, "forecast": result}, indent=None
+            )
+    except (IOError, OSError):
+        return None
+    publish(balance_events({**snapshot, "forecast": result}))
+    return result
+
+
+def describe_forecast(forecast_data):
+    """预测的文字描述，返回 (日均消耗, 预计可用)，样本不足时日均消耗为 None"""
+    if not forecast_data or forecast_data.get("burn_rate") is None:
+        return None, "样本不足（多次查询后给出预测）"
+
+    burn = f"${forecast_data['burn_amount_per_day']:.2f}（近期加权）"
+    days = forecast_data.get("days_to_empty")
+    if days is None:
+        return burn, "近期无消耗"
+    return burn, f"{days:.1f} 天（约 {forecast_data['empty_at']} 用完）"
+
+
+def format_forecast(forecast_data):
+    """格式化预测信息（文本行列表）"""
+    burn, runway = describe_forecast(forecast_data)
+    lines = [f"   日均消耗: {burn}"] if burn else []
+    lines.append(f"   预计可用: {runway}")
+    return lines
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 模型能力配置
+读取 model_capabilities.json（各模型的推理 / 代码评分、上下文长度等），
+供替代建议打分（skill_report）与帕累托前沿（recommend_models --pareto）使用。
+"""
+
+import json
+
+from constants import CAPABILITY_FILE
+from profiling import traced
+
+
+@traced("history.capabilities")
+def load_capabilities():
+    """加载模型能力配置（文件缺失或格式错误时返回空字典）"""
+    if not CAPABILITY_FILE.exists():
+        return {}
+    try:
+        with open(CAPABILITY_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return data
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 模型分类
+把分类关键词编译成一个正则，一次扫描模型名即可确定分类，代替 分类 × 关键词 的嵌套子串查找:
+
+- 分类默认取 constants.MODEL_CATEGORIES，可在 config.json 的 "categories" 中覆盖或新增
+  （同名分类整体替换，值为 null 时删除该分类）
+- 先用全部关键词的合并正则找到最左侧命中的分类 c，再用"排在 c 之前的分类"的合并正则
+  检查是否有更靠前的分类也命中（通常一次即可确定），结果与原来"按分类顺序、
+  第一个包含任一关键词的分类"完全一致
+- 分类结果按模型名缓存；长驻进程中同一个分类器跨价格快照复用，
+  config.json 变化后才重新编译（缓存随之失效）
+
+config.json 示例:
+    {"categories": {"qwen": {"name": "Qwen 系列", "models": ["qwen3"], "desc": "阿里的开源模型"}}}
+"""
+
+import json
+import re
+import threading
+from functools import lru_cache
+
+from constants import CATEGORY_CACHE_SIZE, CONFIG_FILE, MODEL_CATEGORIES
+
+OTHER_CATEGORY = "other"
+
+
+def load_categories():
+    """默认分类叠加 config.json 的 "categories" 覆盖项（保持默认分类在前的顺序）"""
+    categories = {key: dict(info) for key, info in MODEL_CATEGORIES.items()}
+    if not CONFIG_FILE.exists():
+        return categories
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return categories
+    overrides = config.get("categories") if isinstance(config, dict) else None
+    if not isinstance(overrides, dict):
+        return categories
+
+    for key, info in overrides.items():
+        if info is None:
+            categories.pop(key, None)
+        elif isinstance(info, dict) and info.get("models"):
+            categories[key] = {
+                "name": info.get("name", key),
+                "models": [str(keyword).lower() for keyword in info["models"]],
+                "desc": info.get("desc", ""),
+            }
+    return categories
+
+
+class CategoryClassifier:
+    """编译后的分类器（线程安全，可在多个线程间共享）"""
+
+    def __init__(self, categories=None):
+        self.categories = categories if categories is not None else load_categories()
+        keyword_category = {}
+        for category, info in self.categories.items():
+            for keyword in info["models"]:
+                keyword_category.setdefault(keyword.lower(), category)
+        self._keyword_category = keyword_category
+        # _patterns[i]：排在第 i 个分类之前的所有分类的关键词（_patterns[len] 为全部关键词）
+        ordered = list(self.categories)
+        self._order = {category: index for index, category in enumerate(ordered)}
+        self._patterns = [
+            self._compile(
+                keyword
+                for keyword, category in keyword_category.items()
+                if self._order[category] < index
+            )
+            for index in range(len(ordered) + 1)
+        ]
+        self.classify = lru_cache(maxsize=CATEGORY_CACHE_SIZE)(self._classify)
+
+    @staticmethod
+    def _compile(keywords):
+        # 长关键词在前，同一位置优先匹配更长的关键词
+        keywords = sorted(keywords, key=len, reverse=True)
+        if not keywords:
+            return None
+        return re.compile("|".join(re.escape(keyword) for keyword in keywords))
+
+    def _classify(self, model_name):
+        name = (model_name or "").lower()
+        best = None
+        pattern = self._patterns[-1]
+        while pattern is not None:
+            match = pattern.search(name)
+            if match is None:
+                break
+            best = self._keyword_category[match.group()]
+            pattern = self._patterns[self._order[best]]
+        return best or OTHER_CATEGORY
+
+    def group(self, models):
+        """按分类分组模型记录，返回 {分类: [模型]}（含 other，分类顺序与配置一致）"""
+        grouped = {category: [] for category in self.categories}
+        grouped[OTHER_CATEGORY] = []
+        for model in models:
+            grouped[self.classify(model.get("model_name", ""))].append(model)
+        return grouped
+
+
+_classifier = None
+_classifier_mtime = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    """当前配置对应的分类器（config.json 未变化时复用，分类缓存随之保留）"""
+    global _classifier, _classifier_mtime
+    try:
+        mtime = CONFIG_FILE.stat().st_mtime
+    except OSError:
+        mtime = None
+    with _classifier_lock:
+        if _classifier is None or mtime != _classifier_mtime:
+            _classifier = CategoryClassifier()
+            _classifier_mtime = mtime
+        return _classifier
+
+
+def detect_category(model_name):
+    """模型名所属的分类（无匹配时为 other）"""
+    return get_classifier().classify(model_name)
@@ -4,6 +4,7 @@ Aiberm 余额查询脚本
 查询账户余额和使用情况
 """
 
+import argparse
 import requests
 import json
 import sys
@@ -17,6 +18,9 @@ from constants import (
     BALANCE_WARNING_LOW,
     BALANCE_WARNING_CRITICAL,
 )
+from output import OutputWriter, add_format_argument
+from profiling import add_profile_argument, profile_session, span, traced
+from request_policy import CircuitOpenError, request_get
 
 
 def load_config():
@@ -53,15 +57,18 @@ def get_user_balance(system_token):
     }
 
     try:
-        response = requests.get(USER_API, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        response = request_get("user_self", USER_API, headers=headers)
+        with span("parse.user_self"):
+            data = response.json()
 
         if not data.get("success"):
             print(f"❌ API 返回失败: {data.get('message', '未知错误')}")
             return None
 
         return data.get("data", {})
+    except CircuitOpenError:
+        print("❌ 余额接口连续失败，已暂停请求，请稍后再试")
+        return None
     except requests.Timeout:
         print("❌ 请求超时，请检查网络连接")
         return None
@@ -83,66 +90,99 @@ def format_quota(quota):
     return f"¥{quota / 100:.2f}"
 
 
-def display_balance(user_data):
+@traced("render.balance")
+def display_balance(user_data, out=None):
     """显示余额信息"""
-    print(f"\n💰 Aiberm 账户余额")
-    print(f"⏰ 查询时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 60)
-
-    # 基本信息
-    print(f"\n👤 用户信息")
-    print(f"   用户名: {user_data.get('username', 'N/A')}")
-    print(f"   邮箱: {user_data.get('email', 'N/A')}")
-    print(f"   用户组: {user_data.get('group', 'default')}")
+    out = out or OutputWriter()
+    query_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # 余额信息
     quota = user_data.get("quota")
     used_quota = user_data.get("used_quota", 0)
     remaining = quota - used_quota if quota is not None else None
+    request_count = user_data.get("request_count")
+
+    if out.structured:
+        out.row(
+            {
+                "query_time": query_time,
+                "username": user_data.get("username"),
+                "email": user_data.get("email"),
+                "group": user_data.get("group", "default"),
+                "quota": quota,
+                "used_quota": used_quota,
+                "remaining": remaining,
+                "request_count": request_count,
+            }
+        )
+        return
 
-    print(f"\n💵 配额信息")
-    print(f"   总配额: {format_quota(quota)}")
-    print(f"   已使用: {format_quota(used_quota)}")
-    print(f"   剩余: {format_quota(remaining)}")
+    out.text(f"\n💰 Aiberm 账户余额", f"⏰ 查询时间: {query_time}", "=" * 60)
+
+    # 基本信息
+    out.text(
+        f"\n👤 用户信息",
+        f"   用户名: {user_data.get('username', 'N/A')}",
+        f"   邮箱: {user_data.get('email', 'N/A')}",
+        f"   用户组: {user_data.get('group', 'default')}",
+    )
+
+    out.text(
+        f"\n💵 配额信息",
+        f"   总配额: {format_quota(quota)}",
+        f"   已使用: {format_quota(used_quota)}",
+        f"   剩余: {format_quota(remaining)}",
+    )
 
     if quota is not None and quota > 0:
         usage_percent = (used_quota / quota) * 100
-        print(f"   使用率: {usage_percent:.1f}%")
+        out.text(f"   使用率: {usage_percent:.1f}%")
 
         # 余额预警
         if remaining is not None:
             if remaining < BALANCE_WARNING_CRITICAL:  # 少于1元
-                print("\n⚠️  余额不足 ¥1，请及时充值！")
+                out.text("\n⚠️  余额不足 ¥1，请及时充值！")
             elif remaining < BALANCE_WARNING_LOW:  # 少于5元
-                print("\n⚠️  余额较低，建议充值")
+                out.text("\n⚠️  余额较低，建议充值")
 
     # 请求统计
-    request_count = user_data.get("request_count")
     if request_count is not None:
-        print(f"\n📊 使用统计")
-        print(f"   总请求次数: {request_count:,}")
+        out.text(f"\n📊 使用统计", f"   总请求次数: {request_count:,}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 余额查询（系统令牌）")
+    add_format_argument(parser)
+    add_profile_argument(parser)
+    return parser.parse_args(argv)
 
 
 def main():
     """主函数"""
-    print("🔄 正在加载配置...")
-    config = load_config()
+    args = parse_args()
+
+    with profile_session(args, "check_balance"), OutputWriter(
+        args.format
+    ) as out, out.redirect_incidental():
+        print("🔄 正在加载配置...")
+        config = load_config()
 
-    if not config:
-        sys.exit(1)
+        if not config:
+            sys.exit(1)
 
-    system_token = config.get("system_token")
-    if not system_token:
-        print("❌ 配置文件中缺少 system_token")
-        sys.exit(1)
+        system_token = config.get("system_token")
+        if not system_token:
+            print("❌ 配置文件中缺少 system_token")
+            sys.exit(1)
 
-    print("🔄 正在查询余额...")
-    user_data = get_user_balance(system_token)
+        print("🔄 正在查询余额...")
+        user_data = get_user_balance(system_token)
 
-    if not user_data:
-        sys.exit(1)
+        if not user_data:
+            sys.exit(1)
 
-    display_balance(user_data)
+        display_balance(user_data, out)
 
 
 if __name__ == "__main__":
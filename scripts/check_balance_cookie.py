@@ -3,6 +3,7 @@
 通过浏览器登录态调用控制台 API 获取余额/用量
 """
 
+import argparse
 import sys
 import time
 from pathlib import Path
@@ -11,42 +12,70 @@ from aiberm_console_api import (
     build_snapshot,
     fetch_usage_data,
     fetch_user_self,
-    format_snapshot,
     load_auth_state,
+    render_snapshot,
     save_snapshot,
+    save_usage,
 )
-from constants import BALANCE_FILE
+from balance_series import record_snapshot
+from constants import BALANCE_FILE, USAGE_TOP_K
+from output import OutputWriter, add_format_argument
+from profiling import add_profile_argument, profile_session
+from ranking import positive_int
 
 
 AUTH_FILE = Path(__file__).parent.parent / ".auth_state.json"
 
 
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 余额/用量查询（登录态）")
+    parser.add_argument(
+        "--top",
+        type=positive_int,
+        default=USAGE_TOP_K,
+        metavar="K",
+        help=f"消耗排行显示前 K 个模型（默认 {USAGE_TOP_K}）",
+    )
+    add_format_argument(parser)
+    add_profile_argument(parser)
+    return parser.parse_args(argv)
+
+
 def main():
     """主函数"""
-    auth_state = load_auth_state(AUTH_FILE)
-    if not auth_state:
-        print("❌ 未找到登录态，请先运行: python3 scripts/fetch_balance_auto.py")
-        sys.exit(1)
-
-    user_data = fetch_user_self(auth_state=auth_state)
-    if not user_data:
-        print("❌ 余额查询失败，可能登录态已过期")
-        sys.exit(1)
-
-    end_ts = int(time.time())
-    start_ts = end_ts - 7 * 24 * 60 * 60
-    usage_records = fetch_usage_data(
-        auth_state=auth_state,
-        start_timestamp=start_ts,
-        end_timestamp=end_ts,
-        default_time="day",
-    )
+    args = parse_args()
+
+    with profile_session(args, "check_balance_cookie"), OutputWriter(
+        args.format
+    ) as out, out.redirect_incidental():
+        auth_state = load_auth_state(AUTH_FILE)
+        if not auth_state:
+            print("❌ 未找到登录态，请先运行: python3 scripts/fetch_balance_auto.py")
+            sys.exit(1)
+
+        user_data = fetch_user_self(auth_state=auth_state)
+        if not user_data:
+            print("❌ 余额查询失败，可能登录态已过期")
+            sys.exit(1)
+
+        end_ts = int(time.time())
+        start_ts = end_ts - 7 * 24 * 60 * 60
+        usage_records = fetch_usage_data(
+            auth_state=auth_state,
+            start_timestamp=start_ts,
+            end_timestamp=end_ts,
+            default_time="day",
+        )
 
-    snapshot = build_snapshot(user_data, usage_records or [], start_ts, end_ts)
-    save_snapshot(snapshot, BALANCE_FILE)
+        snapshot = build_snapshot(
+            user_data, usage_records or [], start_ts, end_ts, top_n=args.top
+        )
+        snapshot["forecast"] = record_snapshot(snapshot)
+        snapshot.update(save_usage(usage_records, window=(start_ts, end_ts)))
+        save_snapshot(snapshot, BALANCE_FILE)
 
-    for line in format_snapshot(snapshot):
-        print(line)
+        render_snapshot(snapshot, out)
 
 
 if __name__ == "__main__":
@@ -10,7 +10,21 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent.parent
 REFERENCES_DIR = PROJECT_ROOT / "references"
 CONFIG_FILE = PROJECT_ROOT / "config.json"
+CAPABILITY_FILE = PROJECT_ROOT / "model_capabilities.json"  # 模型能力评分（可选，见 capabilities.py）
 HISTORY_FILE = REFERENCES_DIR / "price_history.json"
+PRICE_CHANGES_FILE = REFERENCES_DIR / "price_changes.json"  # 逐模型价格变化（不受 MAX_HISTORY_RECORDS 限制）
+USAGE_FILE = REFERENCES_DIR / "usage_buckets.json"
+USAGE_ROLLUP_FILE = REFERENCES_DIR / "usage_rollup.json"
+USAGE_WINDOWS_FILE = REFERENCES_DIR / "usage_windows.json"
+USAGE_ANOMALY_FILE = REFERENCES_DIR / "usage_anomalies.json"
+STORAGE_DB_FILE = REFERENCES_DIR / "aiberm.db"
+REQUEST_STATE_FILE = REFERENCES_DIR / "request_state.json"  # 各端点的熔断状态与延迟样本（跨进程保留）
+SINGLE_FLIGHT_DIR = REFERENCES_DIR / "inflight"  # 跨进程请求合并的锁与共享响应
+RESULT_CACHE_DIR = REFERENCES_DIR / "result_cache"  # 推荐结果缓存（见 result_cache.py）
+RESULT_CACHE_SIZE = 64  # 推荐结果缓存最多保留的条目数（超出时淘汰最久未使用的）
+RESULT_CACHE_VERSION = 1  # 推荐结果缓存的版本号，修改排序逻辑或输出结构时递增，使旧条目失效
+USAGE_RETENTION_DAYS = 90  # JSON 存储保留的用量明细天数（SQLite 不限）
+USAGE_WINDOWS = {"1d": 1, "7d": 7, "30d": 30}  # 增量维护的滚动用量窗口（天）
 
 # API 配置
 BASE_URL = "https://aiberm.com"
@@ -18,6 +32,32 @@ PRICING_API = f"{BASE_URL}/api/pricing"
 USER_API = f"{BASE_URL}/api/user/self"
 DATA_SELF_API = f"{BASE_URL}/api/data/self"
 
+# 请求策略（重试 / 退避 / 熔断 / 对冲请求），按端点配置
+# 可在 config.json 的 "request_policies" 中按端点覆盖任意字段
+REQUEST_POLICIES = {
+    "default": {
+        "timeout": 10,  # 单次请求超时（秒）
+        "attempts": 3,  # 最多尝试次数（含首次）
+        "backoff_base": 0.5,  # 指数退避基数（秒），实际等待为 [0, base * 2^n] 内随机
+        "backoff_max": 8.0,  # 单次退避上限（秒）
+        "breaker_threshold": 5,  # 连续失败多少次后熔断
+        "breaker_cooldown": 60,  # 熔断持续时间（秒），之后放行一次探测请求
+        "hedge": False,  # 是否启用对冲请求（仅限幂等 GET）
+        "hedge_quantile": 0.95,  # 按历史延迟的该分位数决定何时发出对冲请求
+        "hedge_min_delay": 0.2,  # 对冲等待下限（秒）
+        "hedge_min_samples": 10,  # 延迟样本不足时不对冲
+        "single_flight": False,  # 是否合并同时在途的相同请求（进程内，见 single_flight）
+        # 是否同时跨进程合并（响应会短暂写入 references/inflight/，只用于公开接口；
+        # 带登录态的请求即使开启也只在进程内合并）
+        "single_flight_processes": False,
+    },
+    "pricing": {"hedge": True, "single_flight": True, "single_flight_processes": True},
+    "user_self": {"hedge": True, "single_flight": True},
+    "usage": {"timeout": 20},
+}
+# 延迟样本最多每隔多少秒写入 request_state.json（熔断状态变化时立即写入，进程退出时写入剩余部分）
+REQUEST_STATE_INTERVAL = 60
+
 # 基准价格配置（NewAPI 默认）
 # 输入 $0.15/百万token，输出 $0.6/百万token
 BASE_INPUT_PRICE = 0.15  # 美元/百万token
@@ -29,17 +69,91 @@ DEFAULT_GROUP_RATIO = 0.23
 # 历史记录保留数量
 MAX_HISTORY_RECORDS = 30
 
+# 模型搜索（model_search.py）：相关度低于该值的模型不返回（0~1，命中的查询词权重占比）
+SEARCH_MIN_SCORE = 0.75
+
+# 帕累托推荐（recommend_models.py --pareto）：与成本一起比较的能力维度（越大越好），
+# model_capabilities.json 中出现的其他数值字段排在这些维度之后
+PARETO_DIMENSIONS = ("reasoning_score", "speed_score", "context_length")
+
+# 同款模型（model_aliases.py）：价格差不超过该比例视为同价，不提示换用
+ALIAS_PRICE_TOLERANCE = 0.01
+
+# 排行数量配置（可通过命令行 --top 覆盖）
+RECOMMEND_TOP_K = 10  # 整体推荐 / 替代品列表
+CATEGORY_TOP_K = 3  # 分类推荐
+USAGE_TOP_K = 5  # 余额快照中的消耗排行
+REPORT_TOP_K = 3  # 汇总报告中的用量排行
+ALTERNATIVE_TOP_K = 3  # 汇总报告中每个模型的替代建议
+
 # 额度换算 (单位: 美元)
 QUOTA_DIVISOR = 500000
 
 # 余额数据文件
 BALANCE_FILE = REFERENCES_DIR / "balance.json"
 
+# 余额时间序列（追加写入的 NDJSON）与增量消耗速率状态
+BALANCE_SERIES_FILE = REFERENCES_DIR / "balance_series.ndjson"
+BALANCE_FORECAST_FILE = REFERENCES_DIR / "balance_forecast.json"
+BURN_RATE_HALF_LIFE = 3 * 24 * 60 * 60  # 消耗速率 EWMA 半衰期（秒）
+BURN_RATE_MIN_SPAN = 60 * 60  # 有效观测时长不足该值（秒）时不做预测
+
+# 用量异常检测（按模型、按小时桶的指数加权均值 / 方差）
+ANOMALY_HALF_LIFE = 24  # 基线半衰期（小时桶数）
+ANOMALY_Z_THRESHOLD = 3.0  # 超过基线多少个标准差视为异常
+ANOMALY_MIN_SAMPLES = 24  # 基线样本（桶）不足时不判定
+ANOMALY_MIN_QUOTA = 250000  # 单桶消耗低于该额度（$0.5）时不判定
+ANOMALY_HISTORY = 100  # 保留的最近异常条数
+
+# 多账户配置：ACCOUNTS_DIR 下每个 *.json 为一个账户的 Playwright 登录态
+ACCOUNTS_DIR = PROJECT_ROOT / "accounts"
+ACCOUNT_SNAPSHOT_DIR = REFERENCES_DIR / "accounts"
+DEFAULT_ACCOUNT = "default"  # 单账户（.auth_state.json）数据使用的账户名，ACCOUNTS_DIR 中不能使用
+FLEET_SUMMARY_FILE = REFERENCES_DIR / "fleet_summary.json"
+ACCOUNT_CONCURRENCY = 8  # 同时查询的账户数上限
+
+# 离线优先模式：本地数据在该时间内（秒）视为"足够新"，直接作答并后台刷新
+OFFLINE_MAX_AGE = 6 * 60 * 60
+
+# 预生成报告：采集到新的余额 / 用量 / 价格后写入，./run.sh balance 直接读取
+REPORT_FILE = REFERENCES_DIR / "report.json"
+# 预生成报告超过该年龄（秒）时不再直接使用，改为实时查询（--report-max-age 覆盖）
+REPORT_MAX_AGE = 60 * 60
+# 读取的预生成报告超过该年龄（秒）时，同时在后台刷新（常驻调度器运行时通常不会触发）
+REPORT_REFRESH_AGE = 15 * 60
+
+# 常驻调度器（scheduler.py）：各采集任务的间隔（秒），可在 config.json 的 "scheduler" 中覆盖
+SCHEDULER_JOBS = {
+    "pricing": {"interval": 10 * 60},
+    "usage": {"interval": 15 * 60},
+    "balance": {"interval": 15 * 60},
+}
+SCHEDULER_JITTER = 0.1  # 间隔随机抖动比例（±10%），避免多个实例同时请求
+SCHEDULER_MAX_BACKOFF = 60 * 60  # 连续失败时退避间隔的上限（秒）
+SCHEDULER_USAGE_DAYS = 30  # 内存中保留的用量天数（首次同步全量拉取）
+SCHEDULER_USAGE_OVERLAP = 2 * 60 * 60  # 增量同步时向前多拉取的时长（秒），覆盖仍在累积的小时桶
+
+# --profile 未指定文件时，性能追踪输出目录
+PROFILE_DIR = REFERENCES_DIR / "profiles"
+
 # 余额预警阈值（单位：分）
 BALANCE_WARNING_LOW = 500  # 少于5元警告
 BALANCE_WARNING_CRITICAL = 100  # 少于1元严重警告
 
+# 告警管道（可在 config.json 的 "alerts" 中覆盖，见 alerts.py）
+ALERT_LOG_FILE = REFERENCES_DIR / "alerts.ndjson"  # file 通道默认输出
+ALERT_STATE_FILE = REFERENCES_DIR / "alert_state.json"  # 去抖状态（各通道、各事件上次发送成功的时间）
+ALERT_BATCH_WINDOW = 2.0  # 该时间（秒）内的事件合并为一批发送
+ALERT_DEBOUNCE = 6 * 60 * 60  # 同一事件在该时间（秒）内不重复发送
+ALERT_QUEUE_SIZE = 100  # 每个通道最多排队的批次数，超出时丢弃新批次
+ALERT_SINK_TIMEOUT = 5  # webhook 请求超时（秒）
+ALERT_FLUSH_TIMEOUT = 10  # 进程退出时等待发送完成的最长时间（秒）
+
 # 模型分类配置
+# 分类结果缓存的模型名数量上限（见 categories.py）
+CATEGORY_CACHE_SIZE = 4096
+
+# 默认模型分类（可在 config.json 的 "categories" 中覆盖，见 categories.py）
 MODEL_CATEGORIES = {
     "claude": {
         "name": "Claude 系列",
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 内存数据缓存
+长驻进程（指标导出、查询服务等）共用：后台线程按固定间隔刷新价格、余额与用量，
+读取方只访问内存中的最新结果，永远不会因读取而触发上游请求。
+"""
+
+import random
+import threading
+import time
+
+from aiberm_console_api import fetch_usage_data, fetch_user_self, load_auth_state
+from offline import load_latest_pricing
+from skill_report import AUTH_FILE, fetch_pricing_data
+
+# 默认刷新间隔（秒）
+DEFAULT_REFRESH_INTERVAL = 300
+# 用量统计天数
+DEFAULT_USAGE_DAYS = 30
+
+
+class DataCache:
+    """价格 / 余额 / 用量的内存缓存，刷新结果通过监听器广播"""
+
+    def __init__(self, auth_file=AUTH_FILE, usage_days=DEFAULT_USAGE_DAYS):
+        self.auth_file = auth_file
+        self.usage_days = usage_days
+        self.pricing_data = None
+        self.pricing_updated = None
+        self.user_data = None
+        self.usage_records = None
+        self.account_updated = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback):
+        """注册刷新监听器 callback(cache)，每次刷新完成后调用"""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in list(self._listeners):
+            try:
+                callback(self)
+            except Exception:
+                pass
+
+    def seed_from_store(self):
+        """用本地价格历史预热缓存，启动后首次刷新前也能作答"""
+        record = load_latest_pricing()
+        if record and record.get("data"):
+            with self._lock:
+                self.pricing_data = record["data"]
+                self.pricing_updated = None
+            self._notify()
+
+    def refresh_pricing(self):
+        """刷新价格，失败时保留旧数据，返回是否成功"""
+        pricing_data = fetch_pricing_data()
+        if not pricing_data:
+            return False
+        with self._lock:
+            self.pricing_data = pricing_data
+            self.pricing_updated = time.time()
+        return True
+
+    def refresh_account(self):
+        """刷新余额与用量（需要登录态），失败时保留旧数据"""
+        auth_state = load_auth_state(self.auth_file)
+        if not auth_state:
+            return False
+        user_data = fetch_user_self(auth_state=auth_state)
+        if not user_data:
+            return False
+
+        end_ts = int(time.time())
+        start_ts = end_ts - self.usage_days * 24 * 60 * 60
+        usage_records = fetch_usage_data(
+            auth_state=auth_state,
+            start_timestamp=start_ts,
+            end_timestamp=end_ts,
+            default_time="day",
+        )
+        with self._lock:
+            self.user_data = user_data
+            if usage_records is not None:
+                self.usage_records = usage_records
+            self.account_updated = time.time()
+        return True
+
+    def refresh(self):
+        """刷新全部数据并通知监听器"""
+        results = {
+            "pricing": self.refresh_pricing(),
+            "account": self.refresh_account(),
+        }
+        self._notify()
+        return results
+
+    def snapshot(self):
+        """返回当前缓存内容（只读引用）"""
+        with self._lock:
+            return {
+                "pricing_data": self.pricing_data,
+                "pricing_updated": self.pricing_updated,
+                "user_data": self.user_data,
+                "usage_records": self.usage_records,
+                "account_updated": self.account_updated,
+            }
+
+    def start(self, interval=DEFAULT_REFRESH_INTERVAL, jitter=0.1):
+        """启动后台刷新线程（立即刷新一次，之后每 interval 秒 ± jitter 比例刷新）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                self.refresh()
+                delay = interval * (1 + random.uniform(-jitter, jitter))
+                self._stop.wait(max(1.0, delay))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="data-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台刷新"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
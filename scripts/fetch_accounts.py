@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+多账户余额/用量批量查询
+- 读取 accounts/ 目录下每个账户的登录态文件（Playwright storage_state）
+- 在同一个事件循环中并发查询 user/self 与 data/self（有并发上限）
+- 每个账户保存一份快照，并汇总生成 fleet_summary.json
+总耗时接近单个账户的请求延迟，而不是账户数 × 延迟。
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from aiberm_async_api import AsyncConsoleClient
+from aiberm_console_api import (
+    build_snapshot,
+    load_auth_state,
+    save_snapshot,
+    save_usage,
+)
+from balance_series import record_snapshot
+from constants import (
+    ACCOUNT_CONCURRENCY,
+    ACCOUNT_SNAPSHOT_DIR,
+    ACCOUNTS_DIR,
+    DEFAULT_ACCOUNT,
+    FLEET_SUMMARY_FILE,
+    QUOTA_DIVISOR,
+    USAGE_TOP_K,
+)
+from output import OutputWriter, add_format_argument
+from profiling import add_profile_argument, profile_session, traced
+from ranking import positive_int, top_k
+
+
+def discover_accounts(accounts_dir: Path):
+    """
+    列出目录下的登录态文件，账户名取文件名
+
+    DEFAULT_ACCOUNT 保留给单账户数据（其用量汇总、窗口与异常状态使用全局文件），
+    同名文件会被跳过，见 reserved_account_file。
+    """
+    if not accounts_dir.is_dir():
+        return []
+    return sorted(
+        (path.stem, path)
+        for path in accounts_dir.glob("*.json")
+        if not path.name.startswith(".") and path.stem != DEFAULT_ACCOUNT
+    )
+
+
+def reserved_account_file(accounts_dir: Path):
+    """使用了保留账户名的登录态文件，没有时返回 None"""
+    path = accounts_dir / f"{DEFAULT_ACCOUNT}.json"
+    return path if path.is_file() else None
+
+
+async def fetch_account(client, name, auth_file, start_ts, end_ts, top_n):
+    """查询单个账户，返回 (账户名, 快照或 None, 错误信息)"""
+    auth_state = load_auth_state(auth_file)
+    if not auth_state:
+        return name, None, "登录态文件无效"
+
+    user_data, usage_records = await asyncio.gather(
+        client.fetch_user_self(auth_state=auth_state),
+        client.fetch_usage_data(
+            auth_state=auth_state,
+            start_timestamp=start_ts,
+            end_timestamp=end_ts,
+            default_time="day",
+        ),
+    )
+    if not user_data:
+        return name, None, "余额查询失败，可能登录态已过期"
+
+    # 用量明细按账户保存（文件 / 数据库写入放到线程中，不阻塞事件循环）
+    usage_state = await asyncio.to_thread(
+        save_usage, usage_records, name, (start_ts, end_ts)
+    )
+
+    snapshot = build_snapshot(
+        user_data, usage_records or [], start_ts, end_ts, top_n=top_n
+    )
+    snapshot["account"] = name
+    snapshot.update(usage_state)
+    return name, snapshot, None
+
+
+async def fetch_all_accounts(
+    accounts, days=7, concurrency=ACCOUNT_CONCURRENCY, top_n=USAGE_TOP_K
+):
+    """并发查询所有账户（最多 concurrency 个同时进行）"""
+    end_ts = int(time.time())
+    start_ts = end_ts - days * 24 * 60 * 60
+    limiter = asyncio.Semaphore(max(1, concurrency))
+
+    async with AsyncConsoleClient(per_host_limit=max(1, concurrency) * 2) as client:
+
+        async def bounded(name, auth_file):
+            async with limiter:
+                return await fetch_account(
+                    client, name, auth_file, start_ts, end_ts, top_n
+                )
+
+        return await asyncio.gather(
+            *(bounded(name, auth_file) for name, auth_file in accounts)
+        )
+
+
+@traced("aggregate.fleet")
+def build_fleet_summary(results, top_n=USAGE_TOP_K):
+    """汇总所有账户的余额与用量"""
+    accounts = []
+    failed = []
+    model_totals = {}
+    totals = {
+        "remaining_amount": 0.0,
+        "used_amount": 0.0,
+        "usage_quota": 0,
+        "usage_tokens": 0,
+        "usage_count": 0,
+    }
+
+    for name, snapshot, error in results:
+        if snapshot is None:
+            failed.append({"account": name, "error": error})
+            continue
+
+        balance = snapshot.get("balance", {})
+        usage = snapshot.get("usage_summary", {})
+        totals["remaining_amount"] += balance.get("remaining_amount") or 0
+        totals["used_amount"] += balance.get("used_amount") or 0
+        totals["usage_quota"] += usage.get("total_quota", 0)
+        totals["usage_tokens"] += usage.get("total_tokens", 0)
+        totals["usage_count"] += usage.get("total_count", 0)
+
+        for model_name, stats in usage.get("top_models", []):
+            merged = model_totals.setdefault(
+                model_name, {"quota": 0, "token_used": 0, "count": 0}
+            )
+            for key in merged:
+                merged[key] += stats.get(key, 0)
+
+        accounts.append(
+            {
+                "account": name,
+                "username": snapshot.get("user", {}).get("username"),
+                "remaining_amount": balance.get("remaining_amount"),
+                "used_amount": balance.get("used_amount"),
+                "usage_quota": usage.get("total_quota", 0),
+                "usage_tokens": usage.get("total_tokens", 0),
+                "usage_count": usage.get("total_count", 0),
+                "days_to_empty": (snapshot.get("forecast") or {}).get(
+                    "days_to_empty"
+                ),
+            }
+        )
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "account_count": len(accounts),
+        "failed_count": len(failed),
+        "totals": totals,
+        "accounts": accounts,
+        "failed": failed,
+        # 各账户 Top N 的合并排行（近似全局排行）
+        "top_models": top_k(
+            model_totals.items(), top_n, key=lambda item: item[1]["quota"], largest=True
+        ),
+    }
+
+
+@traced("render.fleet")
+def render_fleet_summary(summary, out):
+    """按输出格式渲染汇总"""
+    if out.structured:
+        out.meta(
+            timestamp=summary["timestamp"],
+            account_count=summary["account_count"],
+            failed_count=summary["failed_count"],
+            totals=summary["totals"],
+        )
+        out.set_columns(
+            [
+                "account",
+                "username",
+                "remaining_amount",
+                "used_amount",
+                "usage_quota",
+                "usage_tokens",
+                "usage_count",
+                "days_to_empty",
+                "error",
+            ]
+        )
+        out.rows(summary["accounts"])
+        out.rows(summary["failed"])
+        return
+
+    totals = summary["totals"]
+    out.text(
+        "\n💼 Aiberm 多账户汇总",
+        f"⏰ 查询时间: {summary['timestamp']}",
+        f"👥 账户数: {summary['account_count']} 成功 / {summary['failed_count']} 失败",
+        "=" * 60,
+        f"💵 剩余余额合计: ${totals['remaining_amount']:.2f}",
+        f"📊 历史消耗合计: ${totals['used_amount']:.2f}",
+        f"📈 时间段内消耗: ${totals['usage_quota'] / QUOTA_DIVISOR:.2f} / {totals['usage_count']} 次 / {totals['usage_tokens']} tokens",
+    )
+
+    if summary["accounts"]:
+        out.text("\n👤 各账户")
+        for item in summary["accounts"]:
+            remaining = item["remaining_amount"]
+            remaining_text = f"${remaining:.2f}" if remaining is not None else "N/A"
+            line = (
+                f"   {item['account']}: 余额 {remaining_text}, "
+                f"时间段消耗 ${item['usage_quota'] / QUOTA_DIVISOR:.2f}"
+            )
+            if item.get("days_to_empty") is not None:
+                line += f", 预计可用 {item['days_to_empty']:.1f} 天"
+            out.text(line)
+
+    if summary["top_models"]:
+        out.text(f"\n🏆 消耗排行 (Top {len(summary['top_models'])})")
+        for model_name, stats in summary["top_models"]:
+            out.text(
+                f"   {model_name}: ${stats['quota'] / QUOTA_DIVISOR:.2f} / {stats['count']} 次"
+            )
+
+    if summary["failed"]:
+        out.text("\n⚠️  查询失败的账户")
+        for item in summary["failed"]:
+            out.text(f"   {item['account']}: {item['error']}")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 多账户余额/用量查询")
+    parser.add_argument(
+        "--dir",
+        type=Path,
+        default=ACCOUNTS_DIR,
+        help=f"登录态目录（默认 {ACCOUNTS_DIR}）",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=ACCOUNT_CONCURRENCY,
+        metavar="N",
+        help=f"同时查询的账户数上限（默认 {ACCOUNT_CONCURRENCY}）",
+    )
+    parser.add_argument(
+        "--days", type=int, default=7, metavar="N", help="用量统计天数（默认 7）"
+    )
+    parser.add_argument(
+        "--top",
+        type=positive_int,
+        default=USAGE_TOP_K,
+        metavar="K",
+        help=f"消耗排行显示前 K 个模型（默认 {USAGE_TOP_K}）",
+    )
+    add_format_argument(parser)
+    add_profile_argument(parser)
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    with profile_session(args, "fetch_accounts"), OutputWriter(
+        args.format
+    ) as out, out.redirect_incidental():
+        reserved = reserved_account_file(args.dir)
+        if reserved is not None:
+            print(
+                f'⚠️  已跳过 {reserved}：账户名 "{DEFAULT_ACCOUNT}" 保留给单账户数据，请重命名该文件'
+            )
+        accounts = discover_accounts(args.dir)
+        if not accounts:
+            print(f"❌ 未找到账户登录态，请将 storage_state 文件放到: {args.dir}")
+            sys.exit(1)
+
+        print(f"🔄 正在并发查询 {len(accounts)} 个账户...")
+        results = asyncio.run(
+            fetch_all_accounts(
+                accounts,
+                days=args.days,
+                concurrency=args.concurrency,
+                top_n=args.top,
+            )
+        )
+
+        for name, snapshot, _ in results:
+            if snapshot is not None:
+                snapshot["forecast"] = record_snapshot(
+                    snapshot,
+                    series_file=ACCOUNT_SNAPSHOT_DIR / f"{name}.series.ndjson",
+                    state_file=ACCOUNT_SNAPSHOT_DIR / f"{name}.forecast.json",
+                )
+                save_snapshot(snapshot, ACCOUNT_SNAPSHOT_DIR / f"{name}.json")
+
+        summary = build_fleet_summary(results, top_n=args.top)
+        save_snapshot(summary, FLEET_SUMMARY_FILE)
+
+        render_fleet_summary(summary, out)
+
+        if not summary["account_count"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
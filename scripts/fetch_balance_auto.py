@@ -7,7 +7,6 @@ Aiberm 余额自动抓取脚本（手动确认模式）
 """
 
 import asyncio
-import json
 import sys
 import os
 import time
@@ -22,7 +21,10 @@ from aiberm_console_api import (
     get_session_cookie,
     load_auth_state,
     save_snapshot,
+    save_usage,
 )
+from balance_series import record_snapshot
+from file_store import atomic_write_json
 
 # 路径配置
 SCRIPT_DIR = Path(__file__).parent
@@ -59,9 +61,7 @@ def sanitize_balance_info(balance_data):
 def save_balance(balance_data):
     """保存抓取调试信息"""
     safe_data = sanitize_balance_info(balance_data)
-    SCRAPE_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(SCRAPE_FILE, "w", encoding="utf-8") as f:
-        json.dump(safe_data, f, ensure_ascii=False, indent=2)
+    atomic_write_json(SCRAPE_FILE, safe_data)
     print(f"✅ 抓取调试已保存: {SCRAPE_FILE}")
 
 
@@ -87,6 +87,8 @@ def fetch_balance_via_api():
     )
 
     snapshot = build_snapshot(user_data, usage_records or [], start_ts, end_ts)
+    snapshot["forecast"] = record_snapshot(snapshot)
+    snapshot.update(save_usage(usage_records, window=(start_ts, end_ts)))
     save_snapshot(snapshot, BALANCE_FILE)
 
     for line in format_snapshot(snapshot):
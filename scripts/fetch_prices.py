@@ -4,6 +4,7 @@ Aiberm 价格查询脚本
 获取所有模型的当前价格信息
 """
 
+import argparse
 import requests
 import json
 import sys
@@ -11,27 +12,42 @@ from datetime import datetime
 from pathlib import Path
 
 # 导入常量配置
+from alerts import load_previous_pricing, price_change_events, publish
 from constants import (
     PRICING_API,
-    HISTORY_FILE,
     BASE_INPUT_PRICE,
     BASE_OUTPUT_PRICE,
-    MAX_HISTORY_RECORDS,
+    OFFLINE_MAX_AGE,
 )
+from model_search import ModelIndex
+from offline import (
+    age_seconds,
+    format_age,
+    is_fresh,
+    load_latest_pricing,
+    spawn_refresh,
+)
+from output import OutputWriter, add_format_argument
+from profiling import add_profile_argument, profile_session, span, traced
+from request_policy import CircuitOpenError, request_get
+from storage import get_storage
 
 
 def fetch_current_prices():
     """获取当前所有模型的价格"""
     try:
-        response = requests.get(PRICING_API, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        response = request_get("pricing", PRICING_API)
+        with span("parse.pricing"):
+            data = response.json()
 
         if not data.get("success"):
             print("❌ API 返回失败")
             return None
 
         return data
+    except CircuitOpenError:
+        print("❌ 价格接口连续失败，已暂停请求，请稍后再试")
+        return None
     except requests.Timeout:
         print("❌ 请求超时，请检查网络连接")
         return None
@@ -109,116 +125,210 @@ def format_model_info(model_data, group_ratio):
         }
 
 
-def save_to_history(pricing_data):
-    """保存价格数据到历史记录"""
-    try:
-        HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
-
-        # 读取现有历史
-        history = []
-        if HISTORY_FILE.exists():
-            try:
-                with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                    history = json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"⚠️  读取历史记录失败，将创建新记录: {e}")
-                history = []
-
-        # 添加新记录
-        record = {"timestamp": datetime.now().isoformat(), "data": pricing_data}
-        history.append(record)
-
-        # 只保留最近 N 条记录
-        history = history[-MAX_HISTORY_RECORDS:]
-
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-
-        print(f"✅ 价格已保存到历史记录（共 {len(history)} 条）")
-    except IOError as e:
-        print(f"❌ 保存历史记录失败: {e}")
+@traced("history.save")
+def save_to_history(pricing_data, quiet=False):
+    """
+    保存价格数据到历史记录（quiet 为 True 时只输出错误）
 
+    通过配置的存储后端写入（JSON 后端加锁读-改-写并原子替换文件），
+    多个采集进程同时运行也不会互相覆盖。
+    返回保存后的记录条数，失败时返回 None。
+    """
 
-def display_prices(pricing_data, filter_model=None):
-    """显示价格信息"""
-    models = pricing_data.get("data", [])
-    group_ratios = pricing_data.get("group_ratio", {})
-    default_ratio = group_ratios.get("default", 0.23)
+    def report_corrupt(moved, error):
+        print(f"⚠️  历史记录无法解析（{error}），已备份为 {moved}，将创建新记录")
 
-    print(f"\n📊 Aiberm 模型价格查询")
-    print(f"⏰ 查询时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"💰 用户分组折扣: {default_ratio} (default 组)")
-    print(f"📦 模型总数: {len(models)}")
-    print("=" * 80)
+    storage = get_storage()
+    previous = load_previous_pricing(storage)
+    try:
+        count = storage.save_pricing(pricing_data, on_corrupt=report_corrupt)
+    except (IOError, OSError) as e:
+        print(f"❌ 保存历史记录失败: {e}")
+        return None
 
-    # 筛选模型
+    if previous:
+        publish(price_change_events(previous.get("data"), pricing_data))
+
+    if not quiet:
+        print(f"✅ 价格已保存到历史记录（共 {count} 条）")
+    return count
+
+
+PRICE_COLUMNS = [
+    "model_name",
+    "original_name",
+    "type",
+    "base_input_price",
+    "base_output_price",
+    "user_input_price",
+    "user_output_price",
+    "model_ratio",
+    "completion_ratio",
+    "base_price_per_image",
+    "user_price_per_image",
+    "supported_types",
+]
+
+
+@traced("render.prices")
+def display_prices(pricing_data, filter_model=None, out=None, data_timestamp=None):
+    """显示价格信息（data_timestamp 不为空时表示使用的是本地存储数据）"""
+    out = out or OutputWriter()
+    models = pricing_data.get("data", [])
+    group_ratio = pricing_data.get("group_ratio", {})
+    default_ratio = group_ratio.get("default", 0.23)
+    query_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    out.meta(
+        query_time=query_time,
+        group_ratio=default_ratio,
+        model_count=len(models),
+        filter=filter_model,
+    )
+    if data_timestamp:
+        age = age_seconds(data_timestamp)
+        out.meta(data_source="offline", data_timestamp=data_timestamp, data_age=age)
+        time_line = f"⏰ 数据时间: {data_timestamp[:19]}（本地数据，{format_age(age)}）"
+    else:
+        time_line = f"⏰ 查询时间: {query_time}"
+    out.text(
+        f"\n📊 Aiberm 模型价格查询",
+        time_line,
+        f"💰 用户分组折扣: {default_ratio} (default 组)",
+        f"📦 模型总数: {len(models)}",
+        "=" * 80,
+    )
+
+    # 筛选模型（按相关度排序，支持拼写错误、部分版本号与提供商前缀）
     if filter_model:
-        models = [
-            m for m in models if filter_model.lower() in m.get("model_name", "").lower()
-        ]
+        with span("price.search", models=len(models)):
+            models = ModelIndex(models).filter(filter_model)
         if not models:
-            print(f"\n❌ 未找到包含 '{filter_model}' 的模型")
+            out.status(f"\n❌ 未找到包含 '{filter_model}' 的模型")
             return
 
+    # 结构化输出：逐行写出，不区分文本/图片分组
+    if out.structured:
+        out.set_columns(PRICE_COLUMNS)
+        for model_data in models:
+            out.row(format_model_info(model_data, default_ratio))
+        return
+
     # 分类显示
     text_models = []
     image_models = []
 
-    for model_data in models:
-        info = format_model_info(model_data, default_ratio)
-        if info["type"] == "text":
-            text_models.append(info)
-        else:
-            image_models.append(info)
+    with span("price.compute", models=len(models)):
+        for model_data in models:
+            info = format_model_info(model_data, default_ratio)
+            if info["type"] == "text":
+                text_models.append(info)
+            else:
+                image_models.append(info)
 
     # 显示文本模型
     if text_models:
-        print(f"\n📝 文本模型 ({len(text_models)} 个)")
-        print("-" * 80)
+        out.text(f"\n📝 文本模型 ({len(text_models)} 个)", "-" * 80)
         for info in text_models:
-            print(f"\n🔹 {info['model_name']}")
+            out.text(f"\n🔹 {info['model_name']}")
             if info["original_name"]:
-                print(f"   原始名称: {info['original_name']}")
-            print(
-                f"   输入价格: ${info['user_input_price']}/百万token (基准: ${info['base_input_price']})"
-            )
-            print(
-                f"   输出价格: ${info['user_output_price']}/百万token (基准: ${info['base_output_price']})"
+                out.text(f"   原始名称: {info['original_name']}")
+            out.text(
+                f"   输入价格: ${info['user_input_price']}/百万token (基准: ${info['base_input_price']})",
+                f"   输出价格: ${info['user_output_price']}/百万token (基准: ${info['base_output_price']})",
+                f"   倍率: 输入 {info['model_ratio']}x, 输出 {info['completion_ratio']}x",
+                f"   支持接口: {', '.join(info['supported_types'])}",
             )
-            print(
-                f"   倍率: 输入 {info['model_ratio']}x, 输出 {info['completion_ratio']}x"
-            )
-            print(f"   支持接口: {', '.join(info['supported_types'])}")
 
     # 显示图片模型
     if image_models:
-        print(f"\n🖼️  图片生成模型 ({len(image_models)} 个)")
-        print("-" * 80)
+        out.text(f"\n🖼️  图片生成模型 ({len(image_models)} 个)", "-" * 80)
         for info in image_models:
-            print(f"\n🔹 {info['model_name']}")
+            out.text(f"\n🔹 {info['model_name']}")
             if info["original_name"]:
-                print(f"   原始名称: {info['original_name']}")
-            print(
-                f"   生成价格: ${info['user_price_per_image']}/张 (基准: ${info['base_price_per_image']})"
+                out.text(f"   原始名称: {info['original_name']}")
+            out.text(
+                f"   生成价格: ${info['user_price_per_image']}/张 (基准: ${info['base_price_per_image']})",
+                f"   支持接口: {', '.join(info['supported_types'])}",
             )
-            print(f"   支持接口: {', '.join(info['supported_types'])}")
-
 
-def main():
-    """主函数"""
-    filter_model = sys.argv[1] if len(sys.argv) > 1 else None
 
-    print("🔄 正在获取价格数据...")
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 模型价格查询")
+    parser.add_argument("filter_model", nargs="?", help="按模型名称关键词筛选")
+    parser.add_argument(
+        "--offline-first",
+        action="store_true",
+        help="本地价格足够新时直接使用，并在后台刷新",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=int,
+        default=OFFLINE_MAX_AGE,
+        metavar="SEC",
+        help=f"离线优先模式下本地数据的最大年龄（秒，默认 {OFFLINE_MAX_AGE}）",
+    )
+    parser.add_argument(
+        "--refresh-only",
+        action="store_true",
+        help="只抓取并保存价格，不输出（供后台刷新使用）",
+    )
+    add_format_argument(parser)
+    add_profile_argument(parser)
+    return parser.parse_args(argv)
+
+
+def refresh_prices():
+    """抓取并保存价格（后台刷新）"""
     pricing_data = fetch_current_prices()
-
     if not pricing_data:
         sys.exit(1)
+    save_to_history(pricing_data)
 
-    # 显示价格
-    display_prices(pricing_data, filter_model)
 
-    # 保存历史
-    save_to_history(pricing_data)
+def main():
+    """主函数"""
+    args = parse_args()
+
+    if args.refresh_only:
+        refresh_prices()
+        return
+
+    with profile_session(args, "fetch_prices"), OutputWriter(
+        args.format
+    ) as out, out.redirect_incidental():
+        stored = load_latest_pricing() if args.offline_first else None
+        if stored and is_fresh(age_seconds(stored.get("timestamp")), args.max_age):
+            if spawn_refresh("fetch_prices.py"):
+                out.status("🔄 已在后台刷新价格数据")
+            display_prices(
+                stored.get("data", {}), args.filter_model, out, stored.get("timestamp")
+            )
+            return
+
+        print("🔄 正在获取价格数据...")
+        pricing_data = fetch_current_prices()
+
+        if not pricing_data:
+            # 离线优先模式下，网络不可用时退回到较旧的本地数据
+            if stored:
+                out.status("⚠️  价格接口不可用，使用本地历史数据")
+                display_prices(
+                    stored.get("data", {}),
+                    args.filter_model,
+                    out,
+                    stored.get("timestamp"),
+                )
+                return
+            sys.exit(1)
+
+        # 显示价格
+        display_prices(pricing_data, args.filter_model, out)
+        out.flush()
+
+        # 保存历史
+        save_to_history(pricing_data)
 
 
 if __name__ == "__main__":
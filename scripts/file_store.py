@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 文件存储模块
+多个采集进程（cron 的 prices、临时的 balance 等）可能同时写 references/ 下的文件:
+- 写入一律走 临时文件 + fsync + rename，读者只会看到完整的旧文件或新文件
+- 读-改-写在旁路锁文件（<文件名>.lock）上加 fcntl 建议锁，锁内只做本地读写，不包含网络请求
+- 无法解析的 JSON 文件会被移到一旁（<文件名>.corrupt-<时间>）保留现场，而不是被静默覆盖
+"""
+
+import contextlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台：退化为仅原子写入
+    fcntl = None
+
+# 等待锁的最长时间（秒）
+LOCK_TIMEOUT = 10.0
+# 获取锁失败时的轮询间隔（秒）
+LOCK_POLL_INTERVAL = 0.05
+
+
+class StoreLockTimeout(IOError):
+    """等待文件锁超时"""
+
+
+class CorruptStoreError(ValueError):
+    """存储文件内容无法解析"""
+
+    def __init__(self, path, error):
+        super().__init__(f"{path}: {error}")
+        self.path = path
+        self.error = error
+
+
+def lock_path(path: Path):
+    return path.with_name(path.name + ".lock")
+
+
+@contextlib.contextmanager
+def locked(path: Path, shared=False, timeout=LOCK_TIMEOUT):
+    """在 path 对应的锁文件上持有建议锁（shared=True 为共享锁）"""
+    if fcntl is None:
+        yield
+        return
+
+    lock_file = lock_path(path)
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        mode = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, mode)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise StoreLockTimeout(f"等待文件锁超时: {lock_file}")
+                time.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(directory: Path):
+    """rename 后同步目录项（部分平台/文件系统不支持，忽略错误）"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: Path, text):
+    """原子写入文本：同目录临时文件 + fsync + rename"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+    _fsync_dir(path.parent)
+
+
+def atomic_write_json(path: Path, data, indent=2):
+    """原子写入 JSON"""
+    atomic_write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+def read_json(path: Path, default=None):
+    """
+    读取 JSON 文件（无需加锁：写入方总是整体替换文件）
+
+    文件不存在时返回 default，内容无法解析时抛出 CorruptStoreError。
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        raise CorruptStoreError(path, e)
+
+
+def quarantine(path: Path):
+    """将损坏的文件移到一旁，返回新路径（文件不存在时返回 None）"""
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    target = path.with_name(f"{path.name}.corrupt-{stamp}")
+    try:
+        os.replace(path, target)
+    except FileNotFoundError:
+        return None
+    return target
+
+
+def update_json(path: Path, update, default=None, on_corrupt=None):
+    """
+    加锁读-改-写 JSON 文件
+
+    update(data) 返回要写入的新数据；文件损坏时先移到一旁，
+    调用 on_corrupt(隔离后的路径, 错误) 后以 default 继续。
+    返回写入的新数据。
+    """
+    with locked(path):
+        try:
+            data = read_json(path, default)
+        except CorruptStoreError as e:
+            moved = quarantine(path)
+            if on_corrupt is not None:
+                on_corrupt(moved, e.error)
+            data = default
+        new_data = update(data)
+        atomic_write_json(path, new_data)
+    return new_data
+
+
+def append_line(path: Path, line):
+    """加锁追加一行（已追加的内容不会被改写，读者无需加锁）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with locked(path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line.rstrip("\n") + "\n")
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Aiberm Prometheus 指标导出
+在本地提供 /metrics（Prometheus 文本格式）:
+- 每个模型的输入/输出/平均价格（按分组）、模型倍率、分组折扣
+- user/self 的余额与历史消耗
+- data/self 的分模型用量
+- 每个端点的请求延迟与响应大小直方图
+指标来自后台定时刷新的内存缓存，抓取（scrape）本身不会触发任何上游请求。
+"""
+
+import argparse
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from constants import BASE_INPUT_PRICE, BASE_OUTPUT_PRICE, QUOTA_DIVISOR
+from data_cache import DEFAULT_REFRESH_INTERVAL, DataCache
+from request_policy import add_observer
+from skill_report import aggregate_usage
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9464
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 10240, 51200, 102400, 512000, 1048576, 5242880)
+
+
+def escape_label(value):
+    """转义标签值"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """按标签分组的累计直方图（线程安全）"""
+
+    def __init__(self, name, help_text, buckets, label_name):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_name = label_name
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[label_value] = series
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            items = [
+                (label, list(s["counts"]), s["sum"], s["count"])
+                for label, s in sorted(self._series.items())
+            ]
+        for label, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = format_labels({self.label_name: label, "le": bound})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels({self.label_name: label, "le": "+Inf"})
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            base = format_labels({self.label_name: label})
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """汇总缓存数据与请求观测，生成 Prometheus 文本"""
+
+    def __init__(self):
+        self.latency = Histogram(
+            "aiberm_fetch_duration_seconds",
+            "Upstream request latency by endpoint",
+            LATENCY_BUCKETS,
+            "endpoint",
+        )
+        self.size = Histogram(
+            "aiberm_fetch_response_bytes",
+            "Upstream response size by endpoint",
+            SIZE_BUCKETS,
+            "endpoint",
+        )
+        self._failures = {}
+        self._gauges_text = ""
+        self._lock = threading.Lock()
+
+    def observe_request(self, endpoint, seconds, size, ok):
+        """request_policy 观察者回调"""
+        self.latency.observe(endpoint, seconds)
+        if ok:
+            self.size.observe(endpoint, size)
+        else:
+            with self._lock:
+                self._failures[endpoint] = self._failures.get(endpoint, 0) + 1
+
+    def update_from_cache(self, cache):
+        """缓存刷新后重新生成仪表盘指标（抓取时直接复用）"""
+        text = "\n".join(build_gauge_lines(cache.snapshot()))
+        with self._lock:
+            self._gauges_text = text
+
+    def render(self):
+        with self._lock:
+            gauges = self._gauges_text
+            failures = dict(self._failures)
+        lines = [gauges] if gauges else []
+        lines.extend(self.latency.render())
+        lines.extend(self.size.render())
+        lines.append("# HELP aiberm_fetch_failures_total Failed upstream requests")
+        lines.append("# TYPE aiberm_fetch_failures_total counter")
+        for endpoint, count in sorted(failures.items()):
+            labels = format_labels({"endpoint": endpoint})
+            lines.append(f"aiberm_fetch_failures_total{labels} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _gauge(lines, name, help_text, samples):
+    """追加一组 gauge（samples 为 (labels, value) 列表）"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} gauge")
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{format_labels(labels)} {value}")
+
+
+def build_gauge_lines(snapshot):
+    """根据缓存快照生成 gauge 行"""
+    lines = []
+    pricing_data = snapshot.get("pricing_data") or {}
+    models = pricing_data.get("data", [])
+    group_ratios = pricing_data.get("group_ratio", {}) or {"default": 0.23}
+
+    _gauge(
+        lines,
+        "aiberm_group_ratio",
+        "Group discount ratio",
+        [({"group": group}, ratio) for group, ratio in sorted(group_ratios.items())],
+    )
+
+    ratio_samples = []
+    completion_samples = []
+    input_samples = []
+    output_samples = []
+    avg_samples = []
+    image_samples = []
+    for model in models:
+        name = model.get("model_name")
+        if not name:
+            continue
+        if model.get("quota_type", 0) == 1:
+            for group, ratio in group_ratios.items():
+                image_samples.append(
+                    (
+                        {"model": name, "group": group},
+                        model.get("model_price", 0) * ratio,
+                    )
+                )
+            continue
+        model_ratio = model.get("model_ratio", 0)
+        completion_ratio = model.get("completion_ratio", 1)
+        ratio_samples.append(({"model": name}, model_ratio))
+        completion_samples.append(({"model": name}, completion_ratio))
+        for group, ratio in group_ratios.items():
+            labels = {"model": name, "group": group}
+            input_price = BASE_INPUT_PRICE * model_ratio * ratio
+            output_price = BASE_OUTPUT_PRICE * completion_ratio * ratio
+            input_samples.append((labels, input_price))
+            output_samples.append((labels, output_price))
+            avg_samples.append((labels, (input_price + output_price) / 2))
+
+    _gauge(lines, "aiberm_model_ratio", "Model input ratio", ratio_samples)
+    _gauge(
+        lines,
+        "aiberm_model_completion_ratio",
+        "Model completion ratio",
+        completion_samples,
+    )
+    _gauge(
+        lines,
+        "aiberm_model_input_price_dollars",
+        "Input price in USD per million tokens",
+        input_samples,
+    )
+    _gauge(
+        lines,
+        "aiberm_model_output_price_dollars",
+        "Output price in USD per million tokens",
+        output_samples,
+    )
+    _gauge(
+        lines,
+        "aiberm_model_avg_price_dollars",
+        "Average of input and output price in USD per million tokens",
+        avg_samples,
+    )
+    _gauge(
+        lines,
+        "aiberm_model_image_price_dollars",
+        "Image generation price in USD per image",
+        image_samples,
+    )
+
+    user_data = snapshot.get("user_data")
+    if user_data:
+        quota = user_data.get("quota")
+        used_quota = user_data.get("used_quota")
+        _gauge(lines, "aiberm_balance_quota", "Remaining quota", [({}, quota)])
+        _gauge(lines, "aiberm_used_quota", "Used quota", [({}, used_quota)])
+        _gauge(
+            lines,
+            "aiberm_balance_dollars",
+            "Remaining balance in USD",
+            [({}, quota / QUOTA_DIVISOR if quota is not None else None)],
+        )
+        _gauge(
+            lines,
+            "aiberm_request_count",
+            "Total request count reported by user/self",
+            [({}, user_data.get("request_count"))],
+        )
+
+    usage_records = snapshot.get("usage_records")
+    if usage_records:
+        by_model = aggregate_usage(usage_records)
+        _gauge(
+            lines,
+            "aiberm_usage_quota",
+            "Quota used per model in the usage window",
+            [({"model": name}, stats["quota"]) for name, stats in by_model],
+        )
+        _gauge(
+            lines,
+            "aiberm_usage_tokens",
+            "Tokens used per model in the usage window",
+            [({"model": name}, stats["token_used"]) for name, stats in by_model],
+        )
+        _gauge(
+            lines,
+            "aiberm_usage_requests",
+            "Requests per model in the usage window",
+            [({"model": name}, stats["count"]) for name, stats in by_model],
+        )
+
+    _gauge(
+        lines,
+        "aiberm_last_refresh_timestamp_seconds",
+        "Unix time of the last successful refresh",
+        [
+            ({"source": "pricing"}, snapshot.get("pricing_updated")),
+            ({"source": "account"}, snapshot.get("account_updated")),
+        ],
+    )
+    return lines
+
+
+def make_handler(registry):
+    """创建请求处理器"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm Prometheus 指标导出")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=DEFAULT_REFRESH_INTERVAL,
+        metavar="SEC",
+        help=f"数据刷新间隔（秒，默认 {DEFAULT_REFRESH_INTERVAL}）",
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    registry = MetricsRegistry()
+    add_observer(registry.observe_request)
+
+    cache = DataCache()
+    cache.add_listener(registry.update_from_cache)
+    cache.seed_from_store()
+    cache.start(interval=args.interval)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(registry))
+    print(f"📈 指标导出已启动: http://{args.host}:{args.port}/metrics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中断")
+    finally:
+        server.server_close()
+        cache.stop()
+
+
+if __name__ == "__main__":
+    main()
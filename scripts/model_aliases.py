@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 同款模型索引
+把同一模型的不同写法归为一组（等价类），每组按价格排好序，"X 最便宜的同款"为 O(1) 查询。
+例如 anthropic/claude-opus-4.5、anthropic/claude-opus-4.5:thinking、
+claude-opus-4-5-20251101、claude-opus-4-5-20251101-thinking 属于同一组。
+
+归一化规则（得到组键）:
+- 转小写，去掉提供商前缀（最后一个 "/" 之前的部分）
+- ":" 与 "." 统一为 "-"（4.5 → 4-5）
+- 去掉 -thinking 后缀与 8 位日期（-20251101）
+- 价格接口给出的 original_model_name 与 model_name 归入同一组（并查集合并）
+
+只索引文本模型（按次计费的图片模型不参与比较）。
+"""
+
+import re
+
+from constants import ALIAS_PRICE_TOLERANCE
+
+DATE_SUFFIX = re.compile(r"-20\d{6}(?=-|$)")
+THINKING_SUFFIX = re.compile(r"(-thinking)+$")
+
+
+def alias_key(model_name):
+    """模型名的组键（同款模型的不同写法得到相同的键）"""
+    name = (model_name or "").lower().rpartition("/")[2]
+    name = name.replace(":", "-").replace(".", "-")
+    name = THINKING_SUFFIX.sub("", name)
+    return DATE_SUFFIX.sub("", name)
+
+
+class AliasIndex:
+    """
+    同款模型索引
+
+    groups[组根] 为按平均成本升序的 [(模型名, 价格)]；
+    key_root 把组键映射到组根，查询时先归一化再查表。
+    """
+
+    def __init__(self, models, price_map):
+        parent = {}
+
+        def find(key):
+            root = key
+            while parent.setdefault(root, root) != root:
+                root = parent[root]
+            while parent[key] != root:
+                parent[key], key = root, parent[key]
+            return root
+
+        def union(a, b):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        members = []
+        for model in models:
+            name = model.get("model_name")
+            if not name or name not in price_map:
+                continue
+            key = alias_key(name)
+            find(key)
+            original = model.get("original_model_name")
+            if original:
+                union(key, alias_key(original))
+            members.append((key, name))
+
+        self.key_root = {key: find(key) for key in parent}
+        self.groups = {}
+        for key, name in members:
+            self.groups.setdefault(self.key_root[key], []).append((name, price_map[name]))
+        for variants in self.groups.values():
+            variants.sort(key=lambda item: (item[1]["avg_cost"], item[0]))
+
+    def variants(self, model_name):
+        """同组的全部写法 [(模型名, 价格)]（按平均成本升序），未知模型返回空列表"""
+        root = self.key_root.get(alias_key(model_name))
+        return self.groups.get(root, [])
+
+    def cheapest(self, model_name):
+        """同组中最便宜的 (模型名, 价格)，未知模型返回 None"""
+        variants = self.variants(model_name)
+        return variants[0] if variants else None
+
+    def cheaper_equivalent(self, model_name, price=None, tolerance=ALIAS_PRICE_TOLERANCE):
+        """
+        model_name 存在明显更便宜的同款时返回
+        {"model_name", "avg_cost", "savings_percent"}，否则返回 None
+
+        price 为 model_name 的价格（不在价格表中的模型可由调用方提供）；
+        差价不超过 tolerance（比例）视为同价。
+        """
+        cheapest = self.cheapest(model_name)
+        if cheapest is None:
+            return None
+        if price is None:
+            price = dict(self.variants(model_name)).get(model_name)
+        if not price or not price["avg_cost"]:
+            return None
+        name, cheapest_price = cheapest
+        savings = 1 - cheapest_price["avg_cost"] / price["avg_cost"]
+        if name == model_name or savings <= tolerance:
+            return None
+        return {
+            "model_name": name,
+            "avg_cost": cheapest_price["avg_cost"],
+            "savings_percent": savings * 100,
+        }
+
+    def __len__(self):
+        return len(self.groups)
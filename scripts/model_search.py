@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 模型名称搜索
+每份价格快照建一次倒排索引，按关键词返回按相关度排序的模型，代替逐个模型做子串匹配:
+
+- 归一化：名称（及 original_model_name）转小写，按非字母数字、字母 / 数字边界切成词，
+  claude-opus-4-5-20251101、anthropic/claude-opus-4.5、Claude Opus 4.5 得到相同的词
+- 倒排索引：词 → 模型；查询只访问命中词的倒排表，与模型总数无关
+- 词级模糊匹配：查询词与词表比较（不是与每个模型比较）
+    完全相同 1.0 / 前缀（opu → opus）0.9 / 编辑距离 1 0.75 / 编辑距离 2 0.6
+  前缀用有序词表二分查找；编辑距离只对与查询词共享三元组的候选词计算
+- 打分：覆盖率 = 命中的查询词权重 / 查询词总权重；版本号、日期等数字词与 "/" 前的
+  提供商前缀权重减半，所以 anthropic/claude-opus-4.5 也能匹配 claude-opus-4-5-20251101；
+  覆盖率相同时，查询词按原顺序连续出现在名称中（短语匹配，gpt-5 命中 gpt-5.1 而不是
+  gpt-image-1.5）的模型排在前面，其次是多余词更少（更精确，不计提供商前缀）的模型
+"""
+
+import re
+from bisect import bisect_left
+
+from constants import SEARCH_MIN_SCORE
+
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+")
+
+# 权重：普通词 1，数字词（版本号 / 日期）与提供商前缀中的词更弱
+NUMBER_WEIGHT = 0.5
+PROVIDER_WEIGHT = 0.5
+
+# 词匹配质量
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.9
+FUZZY_MATCH = {1: 0.75, 2: 0.6}
+
+# 参与模糊匹配的最短查询词长度；达到 LONG_TOKEN 时允许编辑距离 2
+FUZZY_MIN_LENGTH = 4
+LONG_TOKEN = 8
+
+
+def tokenize(name):
+    """把名称切成 [(词, 权重)]，同一词保留最大权重"""
+    name = (name or "").lower()
+    provider, _, rest = name.rpartition("/")
+    weights = {}
+    for part, provider_part in ((provider, True), (rest, False)):
+        for token in TOKEN_PATTERN.findall(part):
+            weight = NUMBER_WEIGHT if token.isdigit() else 1.0
+            if provider_part:
+                weight = min(weight, PROVIDER_WEIGHT)
+            weights[token] = max(weights.get(token, 0), weight)
+    return list(weights.items())
+
+
+def phrase(name):
+    """名称中提供商前缀之后的词序列，首尾加空格，用于判断查询词是否连续出现"""
+    tokens = TOKEN_PATTERN.findall((name or "").lower().rpartition("/")[2])
+    return f" {' '.join(tokens)} " if tokens else ""
+
+
+def trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """带相邻交换的编辑距离（OSA），超过 limit 时返回 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (
+                previous2 is not None
+                and i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def allows_prefix(token):
+    # 单个数字（4 → 45）不算前缀匹配；日期等较长数字允许（2025 → 20251101）
+    return len(token) >= 4 if token.isdigit() else len(token) >= 2
+
+
+class ModelIndex:
+    """一份模型列表的搜索索引（构建后只读，可在多个线程间共享）"""
+
+    def __init__(self, models):
+        self.models = list(models)
+        self.postings = {}
+        self.doc_tokens = []
+        self.doc_sizes = []
+        self.doc_phrases = []
+        for doc, model in enumerate(self.models):
+            name = model.get("model_name")
+            original = model.get("original_model_name")
+            tokens = {token for token, _ in tokenize(name)}
+            tokens.update(token for token, _ in tokenize(original))
+            for token in tokens:
+                self.postings.setdefault(token, []).append(doc)
+            self.doc_tokens.append(tokens)
+            # 提供商前缀不算多余词：openai/gpt-5 与 gpt-5 一样精确
+            name_phrase = phrase(name)
+            self.doc_sizes.append(len(name_phrase.split()) or 1)
+            self.doc_phrases.append((name_phrase, phrase(original)))
+
+        self.vocabulary = sorted(self.postings)
+        self.vocabulary_trigrams = {}
+        for token in self.vocabulary:
+            if len(token) >= FUZZY_MIN_LENGTH - 1 and not token.isdigit():
+                for gram in trigrams(token):
+                    self.vocabulary_trigrams.setdefault(gram, []).append(token)
+
+    def expand(self, token):
+        """查询词在词表中的匹配：{词表中的词: 匹配质量}"""
+        matches = {}
+        if token in self.postings:
+            matches[token] = EXACT_MATCH
+
+        if allows_prefix(token):
+            index = bisect_left(self.vocabulary, token)
+            while index < len(self.vocabulary) and self.vocabulary[index].startswith(token):
+                matches.setdefault(self.vocabulary[index], PREFIX_MATCH)
+                index += 1
+
+        if len(token) >= FUZZY_MIN_LENGTH and not token.isdigit():
+            limit = 2 if len(token) >= LONG_TOKEN else 1
+            candidates = set()
+            for gram in trigrams(token):
+                candidates.update(self.vocabulary_trigrams.get(gram, ()))
+            for candidate in candidates - matches.keys():
+                distance = edit_distance(token, candidate, limit)
+                if distance <= limit:
+                    matches[candidate] = FUZZY_MATCH[distance]
+        return matches
+
+    def search(self, query, min_score=SEARCH_MIN_SCORE, limit=None):
+        """
+        返回 [(模型, 相关度)]，按相关度降序
+
+        查询为空时按原顺序返回全部模型（相关度 1.0）。相关度相同时短语匹配优先:
+
+        >>> index = ModelIndex(
+        ...     {"model_name": name}
+        ...     for name in ("gpt-image-1.5", "openai/gpt-5.1", "openai/gpt-5")
+        ... )
+        >>> [model["model_name"] for model, _ in index.search("gpt-5")]
+        ['openai/gpt-5', 'openai/gpt-5.1', 'gpt-image-1.5']
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            results = [(model, 1.0) for model in self.models]
+            return results[:limit] if limit is not None else results
+
+        total_weight = sum(weight for _, weight in query_tokens)
+        expansions = []
+        for token, weight in query_tokens:
+            expanded = self.expand(token)
+            size = sum(len(self.postings[t]) for t in expanded)
+            expansions.append((weight, size, expanded))
+        # 权重大、倒排表短的词先处理；剩余词的权重已不足以让新模型达到 min_score 时，
+        # 只给已命中的模型补分，不再遍历常见词（如单个数字）的长倒排表
+        expansions.sort(key=lambda item: (-item[0], item[1]))
+        remaining = total_weight
+        matched = {}
+        for weight, _, expanded in expansions:
+            best = {}
+            if remaining >= min_score * total_weight:
+                for vocabulary_token, quality in expanded.items():
+                    for doc in self.postings[vocabulary_token]:
+                        if quality > best.get(doc, 0):
+                            best[doc] = quality
+            else:
+                for doc in matched:
+                    tokens = self.doc_tokens[doc]
+                    quality = max(
+                        (q for t, q in expanded.items() if t in tokens), default=0
+                    )
+                    if quality:
+                        best[doc] = quality
+            for doc, quality in best.items():
+                matched[doc] = matched.get(doc, 0) + weight * quality
+            remaining -= weight
+
+        query_phrase = phrase(query)
+        ranked = []
+        for doc, weight in matched.items():
+            score = weight / total_weight
+            if score < min_score:
+                continue
+            in_order = bool(query_phrase) and any(
+                query_phrase in name_phrase for name_phrase in self.doc_phrases[doc]
+            )
+            precision = min(1.0, len(query_tokens) / self.doc_sizes[doc])
+            name = self.models[doc].get("model_name") or ""
+            ranked.append((-score, not in_order, -precision, name, doc))
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(self.models[doc], round(-score, 4)) for score, *_, doc in ranked]
+
+    def filter(self, query, min_score=SEARCH_MIN_SCORE):
+        """按相关度排序的匹配模型列表"""
+        return [model for model, _ in self.search(query, min_score)]
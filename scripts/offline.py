@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 离线优先模块
+stale-while-revalidate：先用本地最近一次的价格/余额数据立即作答（标注数据年龄），
+同时在后台进程中刷新，刷新结果写回本地存储供下次使用。
+"""
+
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from constants import BALANCE_FILE, REFERENCES_DIR, REPORT_FILE
+from file_store import CorruptStoreError
+from profiling import span
+from storage import get_storage
+
+# 后台刷新的去重间隔（秒）：该时间内已发起过的刷新不再重复发起
+REFRESH_DEBOUNCE = 60
+
+SCRIPT_DIR = Path(__file__).parent
+
+
+def parse_timestamp(text):
+    """解析存储中的时间戳（ISO 格式或 %Y-%m-%d %H:%M:%S），返回 epoch 秒"""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(str(text)).timestamp()
+    except ValueError:
+        pass
+    try:
+        return time.mktime(time.strptime(str(text)[:19], "%Y-%m-%d %H:%M:%S"))
+    except ValueError:
+        return None
+
+
+def age_seconds(text, now=None):
+    """距离时间戳的秒数"""
+    ts = parse_timestamp(text)
+    if ts is None:
+        return None
+    return max(0.0, (now or time.time()) - ts)
+
+
+def format_age(seconds):
+    """格式化数据年龄"""
+    if seconds is None:
+        return "时间未知"
+    if seconds < 60:
+        return "刚刚"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} 分钟前"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小时前"
+    return f"{int(seconds // 86400)} 天前"
+
+
+def is_fresh(seconds, max_age):
+    """数据是否足够新（max_age 为 None 表示不限）"""
+    if seconds is None:
+        return False
+    return max_age is None or seconds <= max_age
+
+
+def load_latest_pricing():
+    """读取最近一次保存的价格记录 {"timestamp", "data"}，不存在或无法读取时返回 None"""
+    try:
+        with span("history.load"):
+            return get_storage().load_latest_pricing()
+    except (CorruptStoreError, IOError):
+        return None
+
+
+def load_balance_snapshot():
+    """读取最近一次保存的余额/用量快照，不存在或无法读取时返回 None"""
+    try:
+        with span("history.load_snapshot"):
+            return get_storage().load_snapshot(BALANCE_FILE)
+    except (CorruptStoreError, IOError):
+        return None
+
+
+def load_materialized_report():
+    """读取采集时预生成的汇总报告，不存在或无法读取时返回 None"""
+    try:
+        with span("history.load_report"):
+            return get_storage().load_snapshot(REPORT_FILE)
+    except (CorruptStoreError, IOError):
+        return None
+
+
+def spawn_refresh(script_name, *args):
+    """
+    在后台进程中刷新数据（不阻塞当前命令）
+
+    同一脚本在 REFRESH_DEBOUNCE 秒内只发起一次刷新。
+    返回是否实际发起了刷新。
+    """
+    marker = REFERENCES_DIR / f".refresh_{Path(script_name).stem}"
+    try:
+        if marker.exists() and time.time() - marker.stat().st_mtime < REFRESH_DEBOUNCE:
+            return False
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+    except OSError:
+        return False
+
+    try:
+        subprocess.Popen(
+            [sys.executable, str(SCRIPT_DIR / script_name), "--refresh-only", *args],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+            cwd=str(SCRIPT_DIR),
+        )
+    except OSError:
+        return False
+    return True
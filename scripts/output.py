@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 输出模块
+统一的缓冲输出，支持 text / json / ndjson / csv 四种格式
+"""
+
+import contextlib
+import csv
+import io
+import json
+import sys
+
+from profiling import traced
+
+OUTPUT_FORMATS = ("text", "json", "ndjson", "csv")
+
+# 缓冲区超过该字节数时写出（NDJSON / CSV 大输出按块流式写出）
+FLUSH_THRESHOLD = 64 * 1024
+
+# 本进程是否以结构化格式向 stdout 输出（其他模块据此把附带输出改写到 stderr）
+_structured_stdout = False
+
+
+def stdout_is_structured():
+    """本进程的 stdout 是否保留给机器可读输出"""
+    return _structured_stdout
+
+
+def add_format_argument(parser):
+    """为命令行解析器添加 --format 参数"""
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="text",
+        help="输出格式: text（默认）/ json / ndjson / csv",
+    )
+
+
+def _csv_value(value):
+    """CSV 单元格取值：标量原样输出，列表/字典转为紧凑表示"""
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(item, (list, tuple, dict)) for item in value):
+            return "|".join("" if item is None else str(item) for item in value)
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return value
+
+
+class OutputWriter:
+    """
+    缓冲输出器
+
+    - text: text() 写入的行在缓冲区累积，flush/close 时一次性写出
+    - json: meta() 与 row() 汇总为 {"meta": {...}, "rows": [...]} 一次写出
+    - ndjson: 每个 row() 一行 JSON，按块流式写出；meta 作为首行 {"_meta": {...}}
+    - csv: 表头取自 set_columns() 或第一行的键，逐行写出
+    结构化格式下 text() 被忽略，status() 写到 stderr，保证 stdout 可直接被程序解析。
+    """
+
+    def __init__(self, fmt="text", stream=None, flush_threshold=FLUSH_THRESHOLD):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        global _structured_stdout
+        self.format = fmt
+        self.stream = stream or sys.stdout
+        if fmt != "text" and self.stream is sys.stdout:
+            _structured_stdout = True
+        self.flush_threshold = flush_threshold
+        self._chunks = []
+        self._size = 0
+        self._meta = {}
+        self._meta_written = False
+        self._rows = []
+        self._columns = None
+        self._csv_writer = None
+        self._csv_buffer = None
+        self._closed = False
+
+    @property
+    def structured(self):
+        """是否为机器可读格式"""
+        return self.format != "text"
+
+    def _write(self, data):
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self.flush_threshold:
+            self.flush()
+
+    @traced("render.write")
+    def flush(self):
+        """将缓冲区内容写出"""
+        if self._chunks:
+            self.stream.write("".join(self._chunks))
+            self._chunks = []
+            self._size = 0
+        self.stream.flush()
+
+    def text(self, *lines):
+        """写入文本行（仅 text 格式生效）"""
+        if self.structured:
+            return
+        for line in lines:
+            self._write(f"{line}\n")
+
+    def status(self, message):
+        """写入进度/提示信息（结构化格式下写到 stderr）"""
+        if self.structured:
+            print(message, file=sys.stderr)
+        else:
+            self.text(message)
+
+    def meta(self, **fields):
+        """记录元信息（查询时间、分组折扣等）"""
+        self._meta.update(fields)
+
+    def set_columns(self, columns):
+        """指定 CSV 列（行结构不一致时使用）"""
+        self._columns = list(columns)
+
+    def _write_ndjson_meta(self):
+        if self._meta and not self._meta_written:
+            self._write(json.dumps({"_meta": self._meta}, ensure_ascii=False) + "\n")
+        self._meta_written = True
+
+    def row(self, record):
+        """写入一条结构化记录（text 格式下忽略）"""
+        if self.format == "json":
+            self._rows.append(record)
+        elif self.format == "ndjson":
+            self._write_ndjson_meta()
+            self._write(json.dumps(record, ensure_ascii=False) + "\n")
+        elif self.format == "csv":
+            if self._csv_writer is None:
+                self._csv_buffer = io.StringIO()
+                self._csv_writer = csv.DictWriter(
+                    self._csv_buffer,
+                    fieldnames=self._columns or list(record.keys()),
+                    restval="",
+                    extrasaction="ignore",
+                )
+                self._csv_writer.writeheader()
+            self._csv_writer.writerow(
+                {key: _csv_value(value) for key, value in record.items()}
+            )
+            self._write(self._csv_buffer.getvalue())
+            self._csv_buffer.seek(0)
+            self._csv_buffer.truncate()
+
+    def rows(self, records):
+        """写入多条结构化记录"""
+        for record in records:
+            self.row(record)
+
+    @contextlib.contextmanager
+    def redirect_incidental(self):
+        """结构化格式下将其余 print 输出转到 stderr"""
+        if not self.structured:
+            yield
+            return
+        with contextlib.redirect_stdout(sys.stderr):
+            yield
+
+    @traced("render.close")
+    def close(self):
+        """写出剩余内容"""
+        if self._closed:
+            return
+        self._closed = True
+        if self.format == "json":
+            payload = {"meta": self._meta, "rows": self._rows}
+            self._write(json.dumps(payload, ensure_ascii=False, indent=2) + "\n")
+        elif self.format == "ndjson":
+            self._write_ndjson_meta()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 出错时不再补写 JSON 外壳，只写出已缓冲的内容
+            self._closed = True
+            self.flush()
+        return False
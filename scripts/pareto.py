@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 帕累托前沿（skyline）
+在"成本更低、能力更强"的多个维度上找出不被支配的模型:
+模型 A 支配 B 当且仅当 A 在每个维度上都不差于 B，且至少一个维度严格更好。
+
+内部统一为"越小越好"的向量（成本取原值，能力分 / 上下文长度取负值），
+缺少的能力数据视为最差，不会让模型凭空进入前沿。
+
+算法（n 为模型数，d 为维数；先对向量去重，完全相同的模型同进同出）:
+按字典序排序后扫描，排在后面的点不可能支配前面的点，所以每个点只需查询
+"是否有已入选的点在其余 d-1 维上都不大于它"，并把入选点加入查询结构:
+- 2 维：记录其余一维的最小值，O(n log n)（排序）
+- 3 维：其余两维维护"阶梯"（第一维递增、第二维递减），查询 / 插入各一次二分，O(n log n)
+- 更多维：按名次建树状数组，节点内递归为低一维的结构，O(n log^(d-2) n)
+"""
+
+from bisect import bisect_right
+
+from constants import PARETO_DIMENSIONS
+
+WORST = float("inf")
+
+
+def skyline(vectors):
+    """返回不被支配的向量下标（各维均为越小越好），按向量字典序排列"""
+    groups = {}
+    for index, vector in enumerate(vectors):
+        groups.setdefault(tuple(vector), []).append(index)
+    unique = sorted(groups)
+    if not unique:
+        return []
+
+    dimensions = len(unique[0])
+    if dimensions == 1:
+        frontier = unique[:1]
+    else:
+        # 按字典序扫描：之前的点第一维都不大于当前点，只需查询其余维度是否被某个已入选点覆盖；
+        # 向量已去重，覆盖即严格支配。被支配的点不必加入结构（支配它的点覆盖范围更大）
+        rest = _ranks([vector[1:] for vector in unique], dimensions - 3)
+        structure = _dominance_structure(dimensions - 1, len(unique))
+        frontier = []
+        for vector, point in zip(unique, rest):
+            if not structure.covers(point):
+                frontier.append(vector)
+                structure.add(point)
+    return [index for vector in frontier for index in groups[vector]]
+
+
+def _ranks(points, count):
+    """前 count 维坐标压缩为从 1 开始的名次（相等的值名次相同，供树状数组使用）"""
+    if count <= 0:
+        return points
+    columns = list(zip(*points))
+    for j in range(count):
+        rank = {value: i for i, value in enumerate(sorted(set(columns[j])), 1)}
+        columns[j] = [rank[value] for value in columns[j]]
+    return list(zip(*columns))
+
+
+def _dominance_structure(dimensions, size):
+    if dimensions == 1:
+        return _Minimum()
+    if dimensions == 2:
+        return _Staircase()
+    return _FenwickDominance(dimensions, size)
+
+
+class _Minimum:
+    """1 维：是否存在不大于 x 的点"""
+
+    def __init__(self):
+        self.best = None
+
+    def covers(self, point):
+        return self.best is not None and self.best <= point[0]
+
+    def add(self, point):
+        if self.best is None or point[0] < self.best:
+            self.best = point[0]
+
+
+class _Staircase:
+    """2 维：阶梯（第一维递增、第二维严格递减），查询与插入各一次二分"""
+
+    def __init__(self):
+        self.ys = []
+        self.zs = []
+
+    def covers(self, point):
+        y, z = point
+        position = bisect_right(self.ys, y)
+        # 第一维不大于 y 的点中第二维最小的一个
+        return bool(position) and self.zs[position - 1] <= z
+
+    def add(self, point):
+        y, z = point
+        position = bisect_right(self.ys, y)
+        if position and self.zs[position - 1] <= z:
+            # 节点内已有覆盖它的点（全局未必有，所以插入前需在每个节点内检查）
+            return
+        if position and self.ys[position - 1] == y:
+            position -= 1
+        # 移除被新点遮住的台阶（第一维不小于 y 且第二维不小于 z）
+        end = position
+        while end < len(self.ys) and self.zs[end] >= z:
+            end += 1
+        self.ys[position:end] = [y]
+        self.zs[position:end] = [z]
+
+
+class _FenwickDominance:
+    """
+    d 维（d ≥ 3）：按第一维名次建稀疏树状数组，每个节点保存其名次区间内点的 d-1 维结构
+
+    查询"第一维名次 ≤ r"只访问 O(log n) 个节点，插入同样只更新 O(log n) 个节点；
+    逐层递归到 2 维阶梯，单次操作 O(log^(d-1) n)。
+    """
+
+    def __init__(self, dimensions, size):
+        self.dimensions = dimensions
+        self.size = size
+        self.nodes = {}
+
+    def covers(self, point):
+        rest = point[1:]
+        i = point[0]
+        while i > 0:
+            node = self.nodes.get(i)
+            if node is not None and node.covers(rest):
+                return True
+            i -= i & -i
+        return False
+
+    def add(self, point):
+        rest = point[1:]
+        i = point[0]
+        while i <= self.size:
+            node = self.nodes.get(i)
+            if node is None:
+                node = self.nodes[i] = _dominance_structure(self.dimensions - 1, self.size)
+            node.add(rest)
+            i += i & -i
+
+
+def capability_dimensions(capabilities):
+    """能力文件中出现过的数值维度：默认维度在前，其余按名称排序"""
+    found = set()
+    for cap in capabilities.values():
+        if isinstance(cap, dict):
+            found.update(
+                key
+                for key, value in cap.items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            )
+    ordered = [key for key in PARETO_DIMENSIONS if key in found]
+    return ordered + sorted(found - set(ordered))
+
+
+def model_vector(cost, capability, dimensions):
+    """(成本, -能力1, -能力2, ...)，缺失的能力值取最差"""
+    vector = [cost]
+    for dimension in dimensions:
+        value = (capability or {}).get(dimension)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            vector.append(-float(value))
+        else:
+            vector.append(WORST)
+    return vector
+
+
+def pareto_frontier(items, key):
+    """items 中不被支配的元素（key 给出越小越好的向量），按向量字典序排列"""
+    items = list(items)
+    return [items[index] for index in skyline([key(item) for item in items])]
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 按历史价格估算用量成本（as-of join）
+每个用量桶匹配其时间点上生效的价格快照（时间 ≤ 桶起点的最近一次快照），
+得到按当时价格估算的成本，而不是用今天的价格回溯全部用量。
+
+- 价格时间线：每个模型一份按时间升序的 (时间, 价格) 列表，价格未变化的快照不重复记录
+- 连接：每个桶在所属模型的时间线上二分查找（bisect），O(log 快照数)，
+  总复杂度 O(桶数 × log 快照数)，不做 桶 × 快照 的嵌套遍历
+- 早于最早快照的桶按最早的已知价格估算，并计入 before_history
+
+成本估算 = token_used × 平均成本（$/百万 token）/ 1e6。
+"""
+
+from bisect import bisect_right
+
+from file_store import CorruptStoreError
+from profiling import traced
+from storage import get_storage
+
+TOKENS_PER_UNIT = 1_000_000
+
+
+class PriceTimeline:
+    """按模型的价格时间线：times[model] 升序，prices[model] 与之一一对应"""
+
+    def __init__(self):
+        self.times = {}
+        self.prices = {}
+
+    def add(self, model, ts, price):
+        """追加一个价格点（ts 须不早于该模型已有的价格点）；与上一个价格相同时跳过"""
+        times = self.times.setdefault(model, [])
+        prices = self.prices.setdefault(model, [])
+        if prices and prices[-1] == price:
+            return
+        times.append(ts)
+        prices.append(price)
+
+    def price_at(self, model, ts):
+        """
+        ts 时刻生效的价格，返回 (price, 是否早于最早快照)
+
+        模型没有任何价格记录时返回 (None, False)。
+        """
+        times = self.times.get(model)
+        if not times:
+            return None, False
+        index = bisect_right(times, ts) - 1
+        if index < 0:
+            return self.prices[model][0], True
+        return self.prices[model][index], False
+
+    def __len__(self):
+        return sum(len(times) for times in self.times.values())
+
+
+@traced("history.price_timeline")
+def load_price_timeline(price_fn, models=None):
+    """
+    从存储的价格历史构建时间线
+
+    price_fn(模型价格条目, group_ratio) 计算价格（如 skill_report.compute_text_price）；
+    按次计费（quota_type == 1）的模型不参与 token 成本估算。历史不可读时返回空时间线。
+    """
+    timeline = PriceTimeline()
+    try:
+        for ts, model, group_ratio in get_storage().iter_model_prices(models):
+            if model.get("quota_type", 0) == 1 or not model.get("model_name"):
+                continue
+            timeline.add(model["model_name"], ts, price_fn(model, group_ratio))
+    except (CorruptStoreError, IOError):
+        return PriceTimeline()
+    return timeline
+
+
+def estimate_cost(token_used, price):
+    """按平均成本估算 token_used 的费用（美元），没有价格时返回 None"""
+    if not price:
+        return None
+    return token_used * price["avg_cost"] / TOKENS_PER_UNIT
+
+
+@traced("price.asof_join")
+def join_usage(hourly_rollup, timeline, current_prices=None, models=None):
+    """
+    将小时汇总的每个 (模型, 桶) 与当时生效的价格连接
+
+    返回按 (模型, 桶) 升序的行列表，每行包含 token_used / quota / 当时与当前的平均成本
+    及对应的估算成本；models 不为 None 时只连接这些模型。
+    """
+    current_prices = current_prices or {}
+    rows = []
+    for (model, bucket), cell in sorted(hourly_rollup.cells.items()):
+        if models is not None and model not in models:
+            continue
+        price, before_history = timeline.price_at(model, bucket)
+        current = current_prices.get(model)
+        if price is None:
+            price = current
+        token_used = cell[1]
+        rows.append(
+            {
+                "model_name": model,
+                "bucket": bucket,
+                "quota": cell[0],
+                "token_used": token_used,
+                "avg_cost": price["avg_cost"] if price else None,
+                "cost": estimate_cost(token_used, price),
+                "current_cost": estimate_cost(token_used, current),
+                "before_history": before_history,
+            }
+        )
+    return rows
+
+
+def cost_by_model(rows):
+    """
+    按模型汇总连接结果
+
+    返回 {model: {"historical_cost", "current_cost", "token_used", "buckets",
+    "before_history"}}；任一桶缺少价格时对应的成本为 None。
+    """
+    result = {}
+    for row in rows:
+        totals = result.setdefault(
+            row["model_name"],
+            {
+                "historical_cost": 0.0,
+                "current_cost": 0.0,
+                "token_used": 0,
+                "buckets": 0,
+                "before_history": 0,
+            },
+        )
+        for key, value in (
+            ("historical_cost", row["cost"]),
+            ("current_cost", row["current_cost"]),
+        ):
+            if value is None or totals[key] is None:
+                totals[key] = None
+            else:
+                totals[key] += value
+        totals["token_used"] += row["token_used"]
+        totals["buckets"] += 1
+        totals["before_history"] += row["before_history"]
+    return result
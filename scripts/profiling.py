@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 性能剖析模块
+在抓取、解析、价格计算、排序、历史读写、渲染等热点路径上打计时区间（span），
+--profile 时输出 Chrome trace 格式的 JSON（可在 chrome://tracing 或 Perfetto 中打开），
+--profile-cprofile 时另外导出 cProfile 统计文件。
+未开启时 span() 返回共享的空上下文，开销只有一次全局变量判断。
+"""
+
+import asyncio
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from constants import PROFILE_DIR
+
+# 当前生效的追踪器（None 表示未开启）
+_tracer = None
+
+
+class _NullSpan:
+    """未开启剖析时使用的空 span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "track", "started")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.track = self.tracer.current_track()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.track, self.started, ended, self.args)
+        return False
+
+
+class Tracer:
+    """
+    收集 span 并导出 Chrome trace
+
+    每个线程 / asyncio 任务各占一条轨道（tid），并发请求在时间线上分行显示。
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def current_track(self):
+        """当前轨道：asyncio 任务优先，其次线程"""
+        task = None
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            pass
+        if task is not None:
+            key = ("task", id(task))
+            label = task.get_name()
+        else:
+            thread = threading.current_thread()
+            key = ("thread", thread.ident)
+            label = thread.name
+        with self._lock:
+            tid = self._tracks.get(key)
+            if tid is None:
+                tid = len(self._tracks) + 1
+                self._tracks[key] = tid
+                self.events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self.pid,
+                        "tid": tid,
+                        "args": {"name": label},
+                    }
+                )
+        return tid
+
+    def span(self, name, args):
+        return _Span(self, name, args)
+
+    def record(self, name, tid, started, ended, args):
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round((started - self.origin) * 1e6, 3),
+            "dur": round((ended - started) * 1e6, 3),
+            "pid": self.pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """按 span 名称汇总：[(name, count, total_seconds)]，按总耗时降序"""
+        totals = {}
+        with self._lock:
+            events = [e for e in self.events if e["ph"] == "X"]
+        for event in events:
+            count, total = totals.get(event["name"], (0, 0.0))
+            totals[event["name"]] = (count + 1, total + event["dur"] / 1e6)
+        return sorted(
+            ((name, count, total) for name, (count, total) in totals.items()),
+            key=lambda item: item[2],
+            reverse=True,
+        )
+
+    def write(self, path: Path, metadata=None):
+        with self._lock:
+            events = list(self.events)
+        payload = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": metadata or {},
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def span(name, **args):
+    """
+    计时区间，用法: with span("fetch", endpoint="pricing"): ...
+
+    名称按 "类别.细分" 组织（fetch / parse / price / rank / aggregate / history / render），
+    未开启剖析时返回空上下文。
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, args)
+
+
+def traced(name):
+    """函数装饰器：整个调用记为一个 span"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.span(name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_profile_argument(parser):
+    """为命令行解析器添加 --profile / --profile-cprofile 参数"""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="TRACE_FILE",
+        help="记录各阶段耗时并输出 Chrome trace JSON（默认写入 references/profiles/）",
+    )
+    parser.add_argument(
+        "--profile-cprofile",
+        default=None,
+        metavar="STATS_FILE",
+        help="同时导出 cProfile 统计（可用 python -m pstats 或 snakeviz 查看）",
+    )
+
+
+def _default_trace_path(script_name):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return PROFILE_DIR / f"{script_name}-{stamp}.trace.json"
+
+
+def _print_summary(tracer, limit=10):
+    rows = tracer.summary()[:limit]
+    if not rows:
+        return
+    print("\n🔬 耗时分布（按总耗时）:", file=sys.stderr)
+    for name, count, total in rows:
+        print(f"   {name:<24} {total * 1000:>9.1f} ms  × {count}", file=sys.stderr)
+
+
+@contextlib.contextmanager
+def profile_session(args, script_name):
+    """
+    按命令行参数开启剖析，退出时写出 trace / cProfile 文件
+
+    args 需包含 add_profile_argument() 添加的 profile 与 profile_cprofile 属性；
+    两者都未设置时不做任何事。
+    """
+    global _tracer
+
+    trace_arg = getattr(args, "profile", None)
+    stats_file = getattr(args, "profile_cprofile", None)
+    if trace_arg is None and stats_file is None:
+        yield
+        return
+
+    tracer = Tracer() if trace_arg is not None else None
+    profiler = cProfile.Profile() if stats_file else None
+    previous = _tracer
+    if tracer is not None:
+        _tracer = tracer
+    if profiler is not None:
+        profiler.enable()
+    started = time.perf_counter()
+    try:
+        with span("total", script=script_name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(stats_file)
+            print(f"🔬 cProfile 统计已写入: {stats_file}", file=sys.stderr)
+        if tracer is not None:
+            _tracer = previous
+            path = Path(trace_arg) if trace_arg else _default_trace_path(script_name)
+            tracer.write(
+                path,
+                metadata={
+                    "script": script_name,
+                    "argv": sys.argv[1:],
+                    "elapsed_seconds": round(elapsed, 6),
+                },
+            )
+            _print_summary(tracer)
+            print(f"🔬 性能追踪已写入: {path}", file=sys.stderr)
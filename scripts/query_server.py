@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Aiberm 本地查询服务
+在本地提供 JSON 接口，供其他工具查询价格、推荐与余额，不必每次启动脚本重新抓取:
+
+    GET /prices?filter=claude&type=text      价格（按名称模糊搜索 / 类型筛选，按相关度排序）
+    GET /recommend?top=10                    整体性价比排行
+    GET /recommend/category?top=3            按类别推荐
+    GET /alternatives?model=<模型名>&top=10  更便宜的替代品
+    GET /balance                             最近的余额 / 用量快照
+    GET /health                              数据更新时间
+
+所有数据来自后台定时刷新的内存缓存（见 data_cache），每次刷新后预先计算好价格行、
+分类与排行；请求只读取内存中的结果，不会触发任何上游请求。
+"""
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from aiberm_console_api import build_snapshot
+from constants import CATEGORY_TOP_K, RECOMMEND_TOP_K
+from data_cache import DEFAULT_REFRESH_INTERVAL, DataCache
+from fetch_prices import format_model_info
+from model_search import ModelIndex
+from offline import load_balance_snapshot
+from recommend_models import (
+    categorize_models,
+    iter_priced_models,
+    rank_alternatives,
+    rank_by_category,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9465
+
+# 单次请求返回的排行条数上限
+MAX_TOP = 1000
+
+
+class QueryError(Exception):
+    """请求无法作答，status 为 HTTP 状态码"""
+
+    def __init__(self, status, error, message):
+        super().__init__(message)
+        self.status = status
+        self.error = error
+        self.message = message
+
+
+class QueryIndex:
+    """
+    由缓存快照预先计算的查询结果
+
+    每次缓存刷新时整体重建并替换引用，请求线程拿到的始终是一份完整、不再修改的状态。
+    """
+
+    def __init__(self, snapshot=None, stored_balance=None):
+        snapshot = snapshot or {}
+        pricing_data = snapshot.get("pricing_data") or {}
+        self.models = pricing_data.get("data", [])
+        self.group_ratio = pricing_data.get("group_ratio", {}).get("default", 0.23)
+        self.pricing_updated = snapshot.get("pricing_updated")
+        self.account_updated = snapshot.get("account_updated")
+
+        self.search_index = ModelIndex(self.models)
+        self.price_rows = {
+            id(model): format_model_info(model, self.group_ratio) for model in self.models
+        }
+        self.categorized = categorize_models(self.models)
+        self.overall = sorted(
+            iter_priced_models(self.models, self.group_ratio), key=lambda x: x["cost"]
+        )
+        self.balance = self._build_balance(snapshot, stored_balance)
+
+    @staticmethod
+    def _build_balance(snapshot, stored_balance):
+        """缓存中有账户数据时据此组装快照，否则使用本地保存的最近快照"""
+        user_data = snapshot.get("user_data")
+        updated = snapshot.get("account_updated")
+        if not user_data or updated is None:
+            return stored_balance
+        start_ts = updated - snapshot.get("usage_days", 0) * 24 * 60 * 60
+        balance = build_snapshot(
+            user_data, snapshot.get("usage_records") or [], start_ts, updated
+        )
+        if stored_balance and stored_balance.get("forecast"):
+            balance["forecast"] = stored_balance["forecast"]
+        return balance
+
+    def meta(self):
+        return {
+            "group_ratio": self.group_ratio,
+            "model_count": len(self.models),
+            "pricing_updated": self.pricing_updated,
+            "account_updated": self.account_updated,
+        }
+
+    def require_pricing(self):
+        if not self.models:
+            raise QueryError(503, "no_data", "价格数据尚未加载")
+
+    def prices(self, filter_text=None, model_type=None):
+        self.require_pricing()
+        rows = (self.price_rows[id(model)] for model in self.search_index.filter(filter_text))
+        return [row for row in rows if model_type is None or row["type"] == model_type]
+
+    def recommend(self, top_n):
+        self.require_pricing()
+        return [{"rank": i, **model} for i, model in enumerate(self.overall[:top_n], 1)]
+
+    def recommend_by_category(self, top_n):
+        self.require_pricing()
+        return rank_by_category(self.categorized, self.group_ratio, top_n)
+
+    def alternatives(self, model_name, top_n):
+        self.require_pricing()
+        result = rank_alternatives(model_name, self.models, self.group_ratio, top_n)
+        if result["error"] == "not_found":
+            raise QueryError(404, "not_found", f"未找到模型: {model_name}")
+        if result["error"] == "image_model":
+            raise QueryError(400, "image_model", "该模型为图片生成模型，无法比较文本成本")
+        return result
+
+    def balance_snapshot(self):
+        if not self.balance:
+            raise QueryError(503, "no_data", "暂无余额数据，请先运行: ./run.sh balance")
+        return self.balance
+
+
+class QueryService:
+    """持有当前 QueryIndex，并把请求路由到对应的查询"""
+
+    def __init__(self):
+        self.index = QueryIndex()
+
+    def rebuild(self, cache):
+        """DataCache 监听器：刷新完成后重建索引"""
+        snapshot = cache.snapshot()
+        snapshot["usage_days"] = cache.usage_days
+        # 整体替换引用：正在处理的请求继续使用旧索引
+        self.index = QueryIndex(snapshot, load_balance_snapshot())
+
+    def handle(self, path, params):
+        """返回 (状态码, 响应体)"""
+        index = self.index
+        try:
+            if path == "/prices":
+                model_type = _param(params, "type")
+                if model_type not in (None, "text", "image"):
+                    raise QueryError(400, "bad_request", "type 只能是 text 或 image")
+                data = index.prices(_param(params, "filter"), model_type)
+                return 200, {"meta": {**index.meta(), "count": len(data)}, "data": data}
+            if path == "/recommend":
+                data = index.recommend(_top(params, RECOMMEND_TOP_K))
+                return 200, {"meta": index.meta(), "data": data}
+            if path == "/recommend/category":
+                data = index.recommend_by_category(_top(params, CATEGORY_TOP_K))
+                return 200, {"meta": index.meta(), "data": data}
+            if path == "/alternatives":
+                model_name = _param(params, "model")
+                if not model_name:
+                    raise QueryError(400, "bad_request", "缺少参数 model")
+                result = index.alternatives(model_name, _top(params, RECOMMEND_TOP_K))
+                meta = {
+                    **index.meta(),
+                    "target": result["target"],
+                    "target_cost": result["target_cost"],
+                    "count": result["count"],
+                }
+                return 200, {"meta": meta, "data": result["alternatives"]}
+            if path == "/balance":
+                return 200, {"meta": index.meta(), "data": index.balance_snapshot()}
+            if path == "/health":
+                return 200, {"status": "ok", "meta": index.meta()}
+        except QueryError as e:
+            return e.status, {"error": e.error, "message": e.message}
+        return 404, {"error": "not_found", "message": f"未知路径: {path}"}
+
+
+def _param(params, name):
+    values = params.get(name)
+    return values[0] if values else None
+
+
+def _top(params, default):
+    value = _param(params, "top")
+    if value is None:
+        return default
+    try:
+        top_n = int(value)
+    except ValueError:
+        raise QueryError(400, "bad_request", "top 必须是整数")
+    if top_n <= 0:
+        raise QueryError(400, "bad_request", "top 必须大于 0")
+    return min(top_n, MAX_TOP)
+
+
+def make_handler(service):
+    """创建请求处理器"""
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            path = parts.path.rstrip("/") or "/"
+            status, payload = service.handle(path, parse_qs(parts.query))
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return QueryHandler
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 本地查询服务")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=DEFAULT_REFRESH_INTERVAL,
+        metavar="SEC",
+        help=f"数据刷新间隔（秒，默认 {DEFAULT_REFRESH_INTERVAL}）",
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    cache = DataCache()
+    service = QueryService()
+    cache.add_listener(service.rebuild)
+    cache.seed_from_store()
+    if not service.index.models:
+        # 没有本地价格时监听器未被调用，先用本地余额快照建立索引
+        service.rebuild(cache)
+    cache.start(interval=args.interval)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"🔎 查询服务已启动: http://{args.host}:{args.port}/prices")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中断")
+    finally:
+        server.server_close()
+        cache.stop()
+
+
+if __name__ == "__main__":
+    main()
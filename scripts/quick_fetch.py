@@ -5,27 +5,30 @@ Aiberm 快速价格查询脚本
 用于 Shell 脚本管道处理
 """
 
+import argparse
 import json
 import sys
 from datetime import datetime
 from pathlib import Path
 
 # 导入常量配置
+from alerts import load_previous_pricing, price_change_events, publish
 from constants import (
-    HISTORY_FILE,
     BASE_INPUT_PRICE,
     BASE_OUTPUT_PRICE,
-    MAX_HISTORY_RECORDS,
 )
+from model_search import ModelIndex
+from output import OutputWriter, add_format_argument
+from profiling import add_profile_argument, profile_session, span
+from storage import get_storage
 
 
-def main():
-    """主函数"""
-    filter_keyword = sys.argv[1].lower() if len(sys.argv) > 1 else ""
-    
+def render(filter_keyword, out):
+    """读取标准输入并输出价格"""
     # 从标准输入读取 JSON 数据
     try:
-        data = json.load(sys.stdin)
+        with span("parse.stdin"):
+            data = json.load(sys.stdin)
     except json.JSONDecodeError as e:
         print(f"❌ JSON 解析失败: {e}")
         sys.exit(1)
@@ -40,21 +43,29 @@ def main():
     models = data.get("data", [])
     group_ratio = data.get("group_ratio", {}).get("default", 0.23)
 
-    # 筛选模型
+    # 筛选模型（模糊匹配，结果随后按价格排序）
     if filter_keyword:
-        models = [
-            m for m in models if filter_keyword in m.get("model_name", "").lower()
-        ]
-
-    print(f"📊 Aiberm 价格查询 - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    print(f"💰 分组折扣: {group_ratio}")
-    print(f"📦 模型数: {len(models)}")
+        with span("price.search", models=len(models)):
+            models = ModelIndex(models).filter(filter_keyword)
+
+    query_time = datetime.now().strftime("%Y-%m-%d %H:%M")
+    out.meta(
+        query_time=query_time,
+        group_ratio=group_ratio,
+        model_count=len(models),
+        filter=filter_keyword or None,
+    )
+    out.text(
+        f"📊 Aiberm 价格查询 - {query_time}",
+        f"💰 分组折扣: {group_ratio}",
+        f"📦 模型数: {len(models)}",
+    )
     if filter_keyword:
-        print(f"🔍 筛选: {filter_keyword}")
-    print()
+        out.text(f"🔍 筛选: {filter_keyword}")
+    out.text("")
 
     if not models:
-        print("❌ 未找到匹配的模型")
+        out.status("❌ 未找到匹配的模型")
         return
 
     # 按输入价格排序
@@ -62,53 +73,103 @@ def main():
         ratio = m.get("model_ratio", 0)
         return BASE_INPUT_PRICE * ratio * group_ratio
 
-    models.sort(key=get_cost)
+    with span("rank.sort", models=len(models)):
+        models.sort(key=get_cost)
 
     # 显示模型
-    print("-" * 70)
-    for m in models:
-        name = m["model_name"]
-        ratio = m.get("model_ratio", 0)
-        comp = m.get("completion_ratio", 1)
-        quota_type = m.get("quota_type", 0)
-
-        print(f"\n🔹 {name}")
-
-        if quota_type == 1:
-            price = m.get("model_price", 0) * group_ratio
-            print(f"   类型: 图片生成")
-            print(f"   价格: ${price:.6f}/张")
-        else:
-            in_price = BASE_INPUT_PRICE * ratio * group_ratio
-            out_price = BASE_OUTPUT_PRICE * comp * group_ratio
-            print(f"   输入: ${in_price:.6f}/百万token (倍率 {ratio}x)")
-            print(f"   输出: ${out_price:.6f}/百万token (倍率 {comp}x)")
-
-            types = ", ".join(m.get("supported_endpoint_types", []))
-            if types:
-                print(f"   接口: {types}")
+    out.set_columns(
+        [
+            "model_name",
+            "type",
+            "input_price",
+            "output_price",
+            "price_per_image",
+            "model_ratio",
+            "completion_ratio",
+            "supported_types",
+        ]
+    )
+    with span("render.prices"):
+        out.text("-" * 70)
+        for m in models:
+            name = m["model_name"]
+            ratio = m.get("model_ratio", 0)
+            comp = m.get("completion_ratio", 1)
+            quota_type = m.get("quota_type", 0)
+            types = m.get("supported_endpoint_types", [])
+
+            if quota_type == 1:
+                price = m.get("model_price", 0) * group_ratio
+                out.row(
+                    {
+                        "model_name": name,
+                        "type": "image",
+                        "price_per_image": round(price, 6),
+                        "supported_types": types,
+                    }
+                )
+                out.text(
+                    f"\n🔹 {name}",
+                    f"   类型: 图片生成",
+                    f"   价格: ${price:.6f}/张",
+                )
+            else:
+                in_price = BASE_INPUT_PRICE * ratio * group_ratio
+                out_price = BASE_OUTPUT_PRICE * comp * group_ratio
+                out.row(
+                    {
+                        "model_name": name,
+                        "type": "text",
+                        "input_price": round(in_price, 6),
+                        "output_price": round(out_price, 6),
+                        "model_ratio": ratio,
+                        "completion_ratio": comp,
+                        "supported_types": types,
+                    }
+                )
+                out.text(
+                    f"\n🔹 {name}",
+                    f"   输入: ${in_price:.6f}/百万token (倍率 {ratio}x)",
+                    f"   输出: ${out_price:.6f}/百万token (倍率 {comp}x)",
+                )
+
+                if types:
+                    out.text(f"   接口: {', '.join(types)}")
+    out.flush()
 
     # 保存历史
-    try:
-        HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    def report_corrupt(moved, error):
+        print(f"\n⚠️  历史记录无法解析，已备份为 {moved}")
+
+    with span("history.save"):
+        storage = get_storage()
+        previous = load_previous_pricing(storage)
+        try:
+            count = storage.save_pricing(data, on_corrupt=report_corrupt)
+            print(f"\n\n✅ 已保存到历史记录 (共 {count} 条)")
+        except (IOError, OSError) as e:
+            print(f"\n\n⚠️  保存历史记录失败: {e}")
+        else:
+            if previous:
+                publish(price_change_events(previous.get("data"), data))
 
-        history = []
-        if HISTORY_FILE.exists():
-            try:
-                with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                    history = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                history = []
 
-        history.append({"timestamp": datetime.now().isoformat(), "data": data})
-        history = history[-MAX_HISTORY_RECORDS:]
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 快速价格查询（从标准输入读取）")
+    parser.add_argument("filter_keyword", nargs="?", default="", help="模型名称关键词")
+    add_format_argument(parser)
+    add_profile_argument(parser)
+    return parser.parse_args(argv)
 
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
 
-        print(f"\n\n✅ 已保存到历史记录 (共 {len(history)} 条)")
-    except IOError as e:
-        print(f"\n\n⚠️  保存历史记录失败: {e}")
+def main():
+    """主函数"""
+    args = parse_args()
+    with profile_session(args, "quick_fetch"), OutputWriter(
+        args.format
+    ) as out, out.redirect_incidental():
+        render(args.filter_keyword.lower(), out)
 
 
 if __name__ == "__main__":
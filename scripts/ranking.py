@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 排行模块
+基于堆的流式 Top-K，避免为取前几名而对全量数据排序
+"""
+
+import argparse
+import heapq
+
+
+def top_k(items, k, key, largest=False):
+    """
+    从可迭代对象中流式选出前 K 个元素
+
+    复杂度 O(N log K)，仅保留 K 个元素在堆中；
+    相同键值保持输入顺序，与 sorted(...)[:k] 的结果一致。
+    k 为 None 时返回全量排序结果。
+    """
+    if k is None:
+        return sorted(items, key=key, reverse=largest)
+    if k <= 0:
+        return []
+    if largest:
+        return heapq.nlargest(k, items, key=key)
+    return heapq.nsmallest(k, items, key=key)
+
+
+def positive_int(value):
+    """argparse 的 type：正整数（--top 等排行数量参数）"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"必须是正整数: {value}")
+    return number
+
+
+class CountingIterator:
+    """包装迭代器并统计已产出的元素数量"""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._iterator)
+        self.count += 1
+        return item
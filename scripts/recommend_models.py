@@ -4,62 +4,49 @@ Aiberm 模型推荐脚本
 基于价格和性能推荐性价比模型
 """
 
-import json
-import sys
-from pathlib import Path
-from datetime import datetime
+import argparse
 
 # 导入常量配置
 from constants import (
-    HISTORY_FILE,
     BASE_INPUT_PRICE,
     BASE_OUTPUT_PRICE,
-    MODEL_CATEGORIES,
+    CATEGORY_TOP_K,
+    RECOMMEND_TOP_K,
 )
-
-
+from capabilities import load_capabilities
+from categories import get_classifier
+from file_store import CorruptStoreError
+from output import OutputWriter, add_format_argument
+from pareto import capability_dimensions, model_vector, pareto_frontier
+from profiling import add_profile_argument, profile_session, traced
+from ranking import CountingIterator, positive_int, top_k
+from result_cache import add_cache_argument, disable as disable_cache, fingerprint, memoize
+from storage import get_storage
+
+
+@traced("history.load")
 def load_latest_prices():
     """加载最新的价格数据"""
-    if not HISTORY_FILE.exists():
-        print("❌ 价格历史文件不存在，请先运行 fetch_prices.py")
-        return None
-
     try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            history = json.load(f)
-    except json.JSONDecodeError:
+        latest = get_storage().load_latest_pricing()
+    except CorruptStoreError:
         print("❌ 价格历史文件格式错误")
         return None
     except IOError as e:
         print(f"❌ 读取价格历史失败: {e}")
         return None
 
-    if not history:
-        print("❌ 价格历史为空")
+    if not latest:
+        print("❌ 价格历史为空，请先运行 fetch_prices.py")
         return None
 
-    return history[-1]  # 返回最新记录
+    return latest  # 返回最新记录
 
 
+@traced("price.categorize")
 def categorize_models(models_data):
-    """将模型按类别分组"""
-    categorized = {cat: [] for cat in MODEL_CATEGORIES.keys()}
-    categorized["other"] = []
-
-    for model in models_data:
-        model_name = model.get("model_name", "").lower()
-        matched = False
-
-        for category, info in MODEL_CATEGORIES.items():
-            if any(keyword in model_name for keyword in info["models"]):
-                categorized[category].append(model)
-                matched = True
-                break
-
-        if not matched:
-            categorized["other"].append(model)
-
-    return categorized
+    """将模型按类别分组（编译后的分类器单次扫描，见 categories）"""
+    return get_classifier().group(models_data)
 
 
 def calculate_cost_per_million(model_data, group_ratio):
@@ -82,85 +69,75 @@ def calculate_cost_per_million(model_data, group_ratio):
     return round(avg_cost, 6)
 
 
-def recommend_by_category(categorized, group_ratio):
-    """按类别推荐性价比最高的模型"""
-    print(f"\n🎯 按类别推荐性价比模型")
-    print("=" * 80)
-
-    for category, info in MODEL_CATEGORIES.items():
+def iter_priced_models(models, group_ratio, exclude=None):
+    """逐个产出可比较成本的文本模型记录（生成器，不构建中间列表）"""
+    for model in models:
+        model_name = model.get("model_name")
+        if exclude is not None and model_name == exclude:
+            continue
+        cost = calculate_cost_per_million(model, group_ratio)
+        if cost is None:
+            continue
+        yield {
+            "name": model_name,
+            "cost": cost,
+            "model_ratio": model.get("model_ratio"),
+            "completion_ratio": model.get("completion_ratio"),
+            "supported_types": model.get("supported_endpoint_types", []),
+        }
+
+
+@traced("rank.category")
+def rank_by_category(categorized, group_ratio, top_n=CATEGORY_TOP_K):
+    """按类别计算最便宜的 top_n 个模型"""
+    results = []
+    for category, info in get_classifier().categories.items():
         models = categorized.get(category, [])
         if not models:
             continue
 
-        # 计算每个模型的性价比
-        model_costs = []
-        for model in models:
-            cost = calculate_cost_per_million(model, group_ratio)
-            if cost is not None:
-                model_costs.append(
-                    {
-                        "name": model.get("model_name"),
-                        "cost": cost,
-                        "model_ratio": model.get("model_ratio"),
-                        "completion_ratio": model.get("completion_ratio"),
-                    }
-                )
+        # 流式计算成本，只保留最便宜的 top_n 个
+        priced = CountingIterator(iter_priced_models(models, group_ratio))
+        top_models = top_k(priced, top_n, key=lambda x: x["cost"])
 
-        if not model_costs:
+        if not priced.count:
             continue
 
-        # 按成本排序
-        model_costs.sort(key=lambda x: x["cost"])
-
-        print(f"\n📁 {info['name']} - {info['desc']}")
-        print(f"   共 {len(model_costs)} 个模型")
-
-        # 显示前 3 个最便宜的
-        top_3 = model_costs[:3]
-        for i, model in enumerate(top_3, 1):
-            icon = "🥇" if i == 1 else "🥈" if i == 2 else "🥉"
-            print(f"\n   {icon} {model['name']}")
-            print(f"      平均成本: ${model['cost']}/百万token")
-            print(
-                f"      倍率: 输入 {model['model_ratio']}x, 输出 {model['completion_ratio']}x"
-            )
+        results.append(
+            {
+                "category": category,
+                "name": info["name"],
+                "desc": info["desc"],
+                "model_count": priced.count,
+                "models": top_models,
+            }
+        )
+    return results
 
 
-def recommend_overall(all_models, group_ratio):
-    """推荐整体性价比最高的模型"""
-    print(f"\n🏆 整体性价比 TOP 10")
-    print("=" * 80)
+@traced("rank.overall")
+def rank_overall(all_models, group_ratio, top_n=RECOMMEND_TOP_K):
+    """计算整体最便宜的 top_n 个模型"""
+    priced = iter_priced_models(all_models, group_ratio)
+    return top_k(priced, top_n, key=lambda x: x["cost"])
 
-    # 计算所有模型成本
-    model_costs = []
-    for model in all_models:
-        cost = calculate_cost_per_million(model, group_ratio)
-        if cost is not None:
-            model_costs.append(
-                {
-                    "name": model.get("model_name"),
-                    "cost": cost,
-                    "model_ratio": model.get("model_ratio"),
-                    "completion_ratio": model.get("completion_ratio"),
-                    "supported_types": model.get("supported_endpoint_types", []),
-                }
-            )
 
-    # 按成本排序
-    model_costs.sort(key=lambda x: x["cost"])
-
-    # 显示前 10
-    for i, model in enumerate(model_costs[:10], 1):
-        print(f"\n{i:2d}. {model['name']}")
-        print(f"    平均成本: ${model['cost']}/百万token")
-        print(
-            f"    倍率: 输入 {model['model_ratio']}x, 输出 {model['completion_ratio']}x"
-        )
-        print(f"    接口: {', '.join(model['supported_types'])}")
+@traced("rank.alternatives")
+def rank_alternatives(model_name, all_models, group_ratio, top_n=RECOMMEND_TOP_K):
+    """
+    计算指定模型的更便宜替代品
 
+    返回 {"target", "target_cost", "count", "alternatives", "error"}，
+    error 为 None 表示查找成功。
+    """
+    result = {
+        "target": model_name,
+        "target_cost": None,
+        "count": 0,
+        "alternatives": [],
+        "error": None,
+    }
 
-def find_alternatives(model_name, all_models, group_ratio):
-    """为指定模型寻找更便宜的替代品"""
     # 查找目标模型
     target = None
     for model in all_models:
@@ -169,83 +146,327 @@ def find_alternatives(model_name, all_models, group_ratio):
             break
 
     if not target:
-        print(f"❌ 未找到模型: {model_name}")
-        return
+        result["error"] = "not_found"
+        return result
 
     target_cost = calculate_cost_per_million(target, group_ratio)
     if target_cost is None:
-        print("❌ 该模型为图片生成模型，无法比较文本成本")
+        result["error"] = "image_model"
+        return result
+    result["target_cost"] = target_cost
+
+    # 查找更便宜的模型（流式筛选 + Top-K）
+    cheaper = CountingIterator(
+        {
+            "name": item["name"],
+            "cost": item["cost"],
+            "savings": target_cost - item["cost"],
+            "savings_percent": ((target_cost - item["cost"]) / target_cost) * 100,
+        }
+        for item in iter_priced_models(all_models, group_ratio, exclude=model_name)
+        if item["cost"] < target_cost
+    )
+
+    # 按节省金额排序
+    result["alternatives"] = top_k(
+        cheaper, top_n, key=lambda x: x["savings"], largest=True
+    )
+    result["count"] = cheaper.count
+    return result
+
+
+@traced("rank.pareto")
+def rank_pareto(categorized, group_ratio, capabilities, top_n=None):
+    """
+    按类别计算成本与能力的帕累托前沿（不被其他模型在所有维度上同时超过的模型）
+
+    返回 (能力维度, [{"category", "name", "desc", "model_count", "models"}])，
+    前沿内按成本升序，top_n 限制每个类别显示的数量（None 表示全部）。
+    """
+    dimensions = capability_dimensions(capabilities)
+    results = []
+    for category, info in get_classifier().categories.items():
+        priced = []
+        for model in iter_priced_models(categorized.get(category, []), group_ratio):
+            capability = capabilities.get(model["name"]) or {}
+            model["capabilities"] = {key: capability.get(key) for key in dimensions}
+            priced.append(model)
+        if not priced:
+            continue
+
+        frontier = pareto_frontier(
+            priced,
+            key=lambda m: model_vector(m["cost"], m["capabilities"], dimensions),
+        )
+        results.append(
+            {
+                "category": category,
+                "name": info["name"],
+                "desc": info["desc"],
+                "model_count": len(priced),
+                "models": frontier[:top_n] if top_n is not None else frontier,
+            }
+        )
+    return dimensions, results
+
+
+def recommend_by_category(
+    categorized, group_ratio, top_n=CATEGORY_TOP_K, out=None, ranked=None
+):
+    """按类别推荐性价比最高的模型（ranked 为已计算好的 rank_by_category 结果）"""
+    out = out or OutputWriter()
+    groups = ranked if ranked is not None else rank_by_category(
+        categorized, group_ratio, top_n
+    )
+
+    if out.structured:
+        for group in groups:
+            for rank, model in enumerate(group["models"], 1):
+                out.row(
+                    {
+                        "category": group["category"],
+                        "category_name": group["name"],
+                        "rank": rank,
+                        **model,
+                    }
+                )
         return
 
-    print(f"\n🔍 寻找 {model_name} 的替代品")
-    print("=" * 80)
-    print(f"📊 目标模型成本: ${target_cost}/百万token")
+    out.text(f"\n🎯 按类别推荐性价比模型", "=" * 80)
+    for group in groups:
+        out.text(
+            f"\n📁 {group['name']} - {group['desc']}",
+            f"   共 {group['model_count']} 个模型",
+        )
+
+        for i, model in enumerate(group["models"], 1):
+            icon = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
+            out.text(
+                f"\n   {icon} {model['name']}",
+                f"      平均成本: ${model['cost']}/百万token",
+                f"      倍率: 输入 {model['model_ratio']}x, 输出 {model['completion_ratio']}x",
+            )
 
-    # 查找更便宜的模型
-    alternatives = []
-    for model in all_models:
-        if model.get("model_name") == model_name:
-            continue
 
-        cost = calculate_cost_per_million(model, group_ratio)
-        if cost is not None and cost < target_cost:
-            alternatives.append(
-                {
-                    "name": model.get("model_name"),
-                    "cost": cost,
-                    "savings": target_cost - cost,
-                    "savings_percent": ((target_cost - cost) / target_cost) * 100,
-                }
+def recommend_pareto(
+    categorized, group_ratio, capabilities, top_n=None, out=None, ranked=None
+):
+    """按类别推荐成本与能力的帕累托前沿（ranked 为已计算好的 rank_pareto 结果）"""
+    out = out or OutputWriter()
+    if ranked is None:
+        ranked = rank_pareto(categorized, group_ratio, capabilities, top_n)
+    dimensions, groups = ranked
+
+    if out.structured:
+        out.meta(dimensions=["cost", *dimensions])
+        for group in groups:
+            for rank, model in enumerate(group["models"], 1):
+                out.row(
+                    {
+                        "category": group["category"],
+                        "category_name": group["name"],
+                        "rank": rank,
+                        "name": model["name"],
+                        "cost": model["cost"],
+                        **model["capabilities"],
+                    }
+                )
+        return
+
+    out.text(
+        f"\n📐 按类别的帕累托前沿（成本{''.join(f' / {d}' for d in dimensions)}）",
+        "=" * 80,
+    )
+    if not dimensions:
+        out.text("⚠️  未找到 model_capabilities.json 能力数据，只按成本比较（每类仅保留最便宜的模型）")
+    for group in groups:
+        out.text(
+            f"\n📁 {group['name']} - {group['desc']}",
+            f"   前沿 {len(group['models'])} 个 / 共 {group['model_count']} 个模型",
+        )
+        for model in group["models"]:
+            values = ", ".join(
+                f"{key} {value if value is not None else '-'}"
+                for key, value in model["capabilities"].items()
             )
+            line = f"   • {model['name']}: ${model['cost']}/百万token"
+            out.text(f"{line}（{values}）" if values else line)
+
+
+def recommend_overall(
+    all_models, group_ratio, top_n=RECOMMEND_TOP_K, out=None, ranked=None
+):
+    """推荐整体性价比最高的模型（ranked 为已计算好的 rank_overall 结果）"""
+    out = out or OutputWriter()
+    if ranked is None:
+        ranked = rank_overall(all_models, group_ratio, top_n)
 
-    if not alternatives:
-        print("\n✅ 该模型已经是最便宜的选择！")
+    if out.structured:
+        out.rows({"rank": i, **model} for i, model in enumerate(ranked, 1))
         return
 
-    # 按节省金额排序
-    alternatives.sort(key=lambda x: x["savings"], reverse=True)
+    out.text(f"\n🏆 整体性价比 TOP {top_n}", "=" * 80)
+    for i, model in enumerate(ranked, 1):
+        out.text(
+            f"\n{i:2d}. {model['name']}",
+            f"    平均成本: ${model['cost']}/百万token",
+            f"    倍率: 输入 {model['model_ratio']}x, 输出 {model['completion_ratio']}x",
+            f"    接口: {', '.join(model['supported_types'])}",
+        )
 
-    print(f"\n💡 找到 {len(alternatives)} 个更便宜的替代品:")
-    for i, alt in enumerate(alternatives[:10], 1):
-        print(f"\n{i:2d}. {alt['name']}")
-        print(f"    成本: ${alt['cost']}/百万token")
-        print(f"    节省: ${alt['savings']}/百万token ({alt['savings_percent']:.1f}%)")
 
+def find_alternatives(
+    model_name, all_models, group_ratio, top_n=RECOMMEND_TOP_K, out=None, ranked=None
+):
+    """为指定模型寻找更便宜的替代品（ranked 为已计算好的 rank_alternatives 结果）"""
+    out = out or OutputWriter()
+    result = ranked
+    if result is None:
+        result = rank_alternatives(model_name, all_models, group_ratio, top_n)
 
-def main():
-    """主函数"""
-    # 加载最新价格
-    latest = load_latest_prices()
-    if not latest:
+    if result["error"] == "not_found":
+        out.status(f"❌ 未找到模型: {model_name}")
+        return
+    if result["error"] == "image_model":
+        out.status("❌ 该模型为图片生成模型，无法比较文本成本")
+        return
+
+    target_cost = result["target_cost"]
+    if out.structured:
+        out.meta(target=model_name, target_cost=target_cost, count=result["count"])
+        out.rows(
+            {"rank": i, **alt} for i, alt in enumerate(result["alternatives"], 1)
+        )
         return
 
-    pricing_data = latest.get("data", {})
-    models = pricing_data.get("data", [])
-    group_ratio = pricing_data.get("group_ratio", {}).get("default", 0.23)
+    out.text(
+        f"\n🔍 寻找 {model_name} 的替代品",
+        "=" * 80,
+        f"📊 目标模型成本: ${target_cost}/百万token",
+    )
+
+    if not result["count"]:
+        out.text("\n✅ 该模型已经是最便宜的选择！")
+        return
+
+    out.text(f"\n💡 找到 {result['count']} 个更便宜的替代品:")
+    for i, alt in enumerate(result["alternatives"], 1):
+        out.text(
+            f"\n{i:2d}. {alt['name']}",
+            f"    成本: ${alt['cost']}/百万token",
+            f"    节省: ${alt['savings']}/百万token ({alt['savings_percent']:.1f}%)",
+        )
+
 
-    timestamp = latest.get("timestamp", "")
-    print(f"\n📊 基于 {timestamp[:19]} 的价格数据")
-    print(f"💰 用户分组折扣: {group_ratio}")
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="Aiberm 模型推荐",
+        epilog=(
+            "用法:\n"
+            "  python recommend_models.py              # 显示整体 TOP 10\n"
+            "  python recommend_models.py --category   # 按类别推荐\n"
+            "  python recommend_models.py --alternative <模型名>  # 寻找替代品\n"
+            "  python recommend_models.py --pareto     # 按类别的成本/能力帕累托前沿"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--category", action="store_true", help="按类别推荐")
+    mode.add_argument("--alternative", metavar="模型名", help="寻找更便宜的替代品")
+    mode.add_argument(
+        "--pareto",
+        action="store_true",
+        help="按类别显示成本与能力（model_capabilities.json）的帕累托前沿",
+    )
+    parser.add_argument(
+        "--top", type=positive_int, default=None, metavar="K", help="显示前 K 个结果"
+    )
+    add_format_argument(parser)
+    add_profile_argument(parser)
+    add_cache_argument(parser)
+    return parser.parse_args(argv)
 
-    # 分类模型
-    categorized = categorize_models(models)
 
-    # 根据参数执行不同操作
-    if len(sys.argv) > 1:
-        command = sys.argv[1]
+def main():
+    """主函数"""
+    args = parse_args()
+
+    with profile_session(args, "recommend_models"), OutputWriter(
+        args.format
+    ) as out, out.redirect_incidental():
+        # 加载最新价格
+        latest = load_latest_prices()
+        if not latest:
+            return
+
+        pricing_data = latest.get("data", {})
+        models = pricing_data.get("data", [])
+        group_ratio = pricing_data.get("group_ratio", {}).get("default", 0.23)
+
+        timestamp = latest.get("timestamp", "")
+        out.meta(price_timestamp=timestamp[:19], group_ratio=group_ratio)
+        out.text(
+            f"\n📊 基于 {timestamp[:19]} 的价格数据",
+            f"💰 用户分组折扣: {group_ratio}",
+        )
 
-        if command == "--category":
-            recommend_by_category(categorized, group_ratio)
-        elif command == "--alternative" and len(sys.argv) > 2:
-            model_name = sys.argv[2]
-            find_alternatives(model_name, models, group_ratio)
+        # 排行结果按 (价格快照, 分类配置, 能力文件, 分组折扣, 参数) 缓存，输入不变时不再重新计算
+        if args.no_cache:
+            disable_cache()
+        inputs = {"pricing": fingerprint(pricing_data), "group_ratio": group_ratio}
+
+        # 根据参数执行不同操作
+        if args.category:
+            top_n = CATEGORY_TOP_K if args.top is None else args.top
+            ranked = memoize(
+                "category",
+                lambda: rank_by_category(categorize_models(models), group_ratio, top_n),
+                categories=fingerprint(get_classifier().categories),
+                top=top_n,
+                **inputs,
+            )
+            recommend_by_category(None, group_ratio, top_n, out, ranked=ranked)
+        elif args.pareto:
+            capabilities = load_capabilities()
+            # 缓存读回的是列表，还原为 rank_pareto 返回的 (维度, 分组) 元组
+            dimensions, groups = memoize(
+                "pareto",
+                lambda: rank_pareto(
+                    categorize_models(models), group_ratio, capabilities, args.top
+                ),
+                categories=fingerprint(get_classifier().categories),
+                capabilities=fingerprint(capabilities),
+                top=args.top,
+                **inputs,
+            )
+            recommend_pareto(
+                None,
+                group_ratio,
+                capabilities,
+                args.top,
+                out,
+                ranked=(dimensions, groups),
+            )
+        elif args.alternative:
+            top_n = RECOMMEND_TOP_K if args.top is None else args.top
+            ranked = memoize(
+                "alternatives",
+                lambda: rank_alternatives(args.alternative, models, group_ratio, top_n),
+                model=args.alternative,
+                top=top_n,
+                **inputs,
+            )
+            find_alternatives(args.alternative, models, group_ratio, top_n, out, ranked=ranked)
         else:
-            print("用法:")
-            print("  python recommend_models.py              # 显示整体 TOP 10")
-            print("  python recommend_models.py --category   # 按类别推荐")
-            print("  python recommend_models.py --alternative <模型名>  # 寻找替代品")
-    else:
-        recommend_overall(models, group_ratio)
+            top_n = RECOMMEND_TOP_K if args.top is None else args.top
+            ranked = memoize(
+                "overall",
+                lambda: rank_overall(models, group_ratio, top_n),
+                top=top_n,
+                **inputs,
+            )
+            recommend_overall(models, group_ratio, top_n, out, ranked=ranked)
 
 
 if __name__ == "__main__":
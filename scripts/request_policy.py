@@ -0,0 +1,674 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 请求策略模块
+为价格接口与控制台接口提供统一的:
+- 抖动指数退避重试（full jitter）
+- 熔断器：连续失败达到阈值后短路，冷却后放行一次探测请求
+- 对冲请求：幂等 GET 超过历史 p95 延迟仍未返回时，再发一个相同请求，取先返回者
+- 请求合并：同时在途的相同请求（端点 + 参数 + 登录态）只发一次，见 single_flight
+策略参数按端点配置，见 constants.REQUEST_POLICIES。
+
+熔断状态与延迟样本保存在 references/request_state.json，短时运行的 CLI / cron 任务
+也能累计到熔断阈值与对冲所需的样本数。熔断状态变化时立即写入，延迟样本最多每
+REQUEST_STATE_INTERVAL 秒写入一次（进程退出时写入剩余部分）；写入时与文件中的内容合并
+（失败次数累加、延迟样本追加），多个进程不会互相覆盖。
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+
+from constants import (
+    CONFIG_FILE,
+    REQUEST_POLICIES,
+    REQUEST_STATE_FILE,
+    REQUEST_STATE_INTERVAL,
+)
+from file_store import CorruptStoreError, read_json, update_json
+from profiling import span
+from single_flight import SingleFlight, flight_key, shared_across_processes
+
+# 每个端点保留的延迟样本数
+LATENCY_WINDOW = 200
+
+# 计入重试 / 熔断的请求错误（其余异常视为程序错误，直接抛出）
+REQUEST_ERRORS = (requests.RequestException, json.JSONDecodeError)
+
+# 对冲请求使用的线程池（只在启用对冲时才会创建线程）
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="hedge"
+)
+
+# 长驻进程可开启连接复用：每个线程一个 requests.Session（Session 不保证线程安全）
+_session_reuse = False
+_thread_sessions = threading.local()
+
+_flights = SingleFlight()
+
+
+class CircuitOpenError(requests.RequestException):
+    """熔断器打开，请求被短路"""
+
+
+class RequestPolicy:
+    """单个端点的请求策略"""
+
+    def __init__(self, **options):
+        merged = dict(REQUEST_POLICIES["default"])
+        merged.update(options)
+        self.timeout = merged["timeout"]
+        self.attempts = max(1, int(merged["attempts"]))
+        self.backoff_base = merged["backoff_base"]
+        self.backoff_max = merged["backoff_max"]
+        self.breaker_threshold = merged["breaker_threshold"]
+        self.breaker_cooldown = merged["breaker_cooldown"]
+        self.hedge = bool(merged["hedge"])
+        self.hedge_quantile = merged["hedge_quantile"]
+        self.hedge_min_delay = merged["hedge_min_delay"]
+        self.hedge_min_samples = merged["hedge_min_samples"]
+        self.single_flight = bool(merged["single_flight"])
+        self.single_flight_processes = bool(merged["single_flight_processes"])
+
+    def backoff_delay(self, attempt):
+        """第 attempt 次失败后的等待时间（full jitter）"""
+        ceiling = min(self.backoff_max, self.backoff_base * (2**attempt))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器（closed → open → half-open）"""
+
+    def __init__(self, threshold, cooldown, state=None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        # 打开时刻为墙上时间，可跨进程保存
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        # 上次保存后的变化：是否被成功请求重置过、之后新增的失败次数
+        self._changed = False
+        self._reset = False
+        self._new_failures = 0
+        if state:
+            self.restore(state)
+
+    def restore(self, state):
+        """采用保存的状态（保存后本进程又有变化时保留本进程的状态）"""
+        with self._lock:
+            if self._changed:
+                return
+            self.failures = int(state.get("failures") or 0)
+            self.opened_at = state.get("opened_at")
+
+    @property
+    def changed(self):
+        return self._changed
+
+    def take_changes(self):
+        """取出上次保存后的变化 {"reset", "failures", "opened_at"}，没有变化时返回 None"""
+        with self._lock:
+            if not self._changed:
+                return None
+            changes = {
+                "reset": self._reset,
+                "failures": self._new_failures,
+                "opened_at": self.opened_at,
+            }
+            self._changed = self._reset = False
+            self._new_failures = 0
+            return changes
+
+    def allow(self):
+        """是否放行本次请求"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.time() - self.opened_at < self.cooldown:
+                return False
+            # 冷却结束：只放行一个探测请求
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.failures or self.opened_at is not None:
+                self._changed = self._reset = True
+                self._new_failures = 0
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._changed = True
+            self._new_failures += 1
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.time()
+
+    def abort_probe(self):
+        """请求被取消或因程序错误中断时不计结果，允许下一次探测"""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class LatencyTracker:
+    """记录最近的请求延迟，用于计算对冲等待时间"""
+
+    def __init__(self, window=LATENCY_WINDOW, samples=()):
+        self.window = window
+        self._samples = deque(samples, maxlen=window)
+        # 上次保存后新增的样本
+        self._unsaved = []
+        self._lock = threading.Lock()
+
+    @property
+    def unsaved(self):
+        return len(self._unsaved)
+
+    def take_unsaved(self):
+        with self._lock:
+            samples, self._unsaved = self._unsaved, []
+            return samples
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._unsaved.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def quantile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(q * len(samples)))
+        return samples[index]
+
+
+_policies = {}
+_breakers = {}
+_latencies = {}
+_last_saved = {}
+_registry_lock = threading.Lock()
+_observers = []
+
+
+def add_observer(callback):
+    """
+    注册请求观察者（用于指标采集）
+
+    每次实际发出的请求结束后调用 callback(endpoint, seconds, size, ok)，
+    size 为响应体字节数（失败时为 0）。
+    """
+    _observers.append(callback)
+
+
+def remove_observer(callback):
+    if callback in _observers:
+        _observers.remove(callback)
+
+
+def observe_request(endpoint, seconds, size, ok):
+    """通知所有观察者（观察者异常不影响请求本身）"""
+    for callback in list(_observers):
+        try:
+            callback(endpoint, seconds, size, ok)
+        except Exception:
+            pass
+
+
+def _load_overrides():
+    """读取 config.json 中的 request_policies 覆盖项"""
+    if not CONFIG_FILE.exists():
+        return {}
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+    overrides = config.get("request_policies", {}) if isinstance(config, dict) else {}
+    return overrides if isinstance(overrides, dict) else {}
+
+
+def get_policy(endpoint):
+    """获取端点策略（默认值 < 端点配置 < config.json 覆盖）"""
+    with _registry_lock:
+        policy = _policies.get(endpoint)
+        if policy is None:
+            overrides = _load_overrides()
+            options = dict(overrides.get("default", {}))
+            options.update(REQUEST_POLICIES.get(endpoint, {}))
+            options.update(overrides.get(endpoint, {}))
+            policy = RequestPolicy(**options)
+            state = _load_state().get(endpoint)
+            if not isinstance(state, dict):
+                state = {}
+            _policies[endpoint] = policy
+            _breakers[endpoint] = CircuitBreaker(
+                policy.breaker_threshold, policy.breaker_cooldown, state.get("breaker")
+            )
+            _latencies[endpoint] = LatencyTracker(samples=state.get("latencies") or ())
+            _last_saved[endpoint] = time.monotonic()
+        return policy
+
+
+def _load_state():
+    """读取保存的熔断状态与延迟样本（文件缺失或损坏时从空状态开始）"""
+    try:
+        state = read_json(REQUEST_STATE_FILE, {})
+    except (OSError, CorruptStoreError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def _merge_breaker(saved, changes, threshold):
+    """把本进程的熔断状态变化合并到已保存的状态上"""
+    saved = saved if isinstance(saved, dict) else {}
+    if changes["reset"]:
+        failures, opened_at = 0, None
+    else:
+        failures, opened_at = int(saved.get("failures") or 0), saved.get("opened_at")
+    failures += changes["failures"]
+    if changes["opened_at"] is not None:
+        opened_at = changes["opened_at"]
+    elif changes["failures"] and failures >= threshold and opened_at is None:
+        opened_at = time.time()
+    return {"failures": failures, "opened_at": opened_at}
+
+
+def state_due(endpoint):
+    """是否需要保存：熔断状态有变化，或有未保存的延迟样本且距上次保存已超过间隔"""
+    if _breakers[endpoint].changed:
+        return True
+    return bool(_latencies[endpoint].unsaved) and (
+        time.monotonic() - _last_saved[endpoint] >= REQUEST_STATE_INTERVAL
+    )
+
+
+def save_state(endpoint, force=False):
+    """
+    把端点的熔断状态变化与新增延迟样本合并写入 REQUEST_STATE_FILE（写入失败不影响请求）
+
+    force 为 False 时只在 state_due 时写入。
+    """
+    if not force and not state_due(endpoint):
+        return
+    breaker = _breakers[endpoint]
+    tracker = _latencies[endpoint]
+    changes = breaker.take_changes()
+    samples = [round(seconds, 4) for seconds in tracker.take_unsaved()]
+    _last_saved[endpoint] = time.monotonic()
+    if changes is None and not samples:
+        return
+
+    def update(state):
+        state = state if isinstance(state, dict) else {}
+        entry = state.get(endpoint)
+        entry = dict(entry) if isinstance(entry, dict) else {}
+        if changes is not None:
+            entry["breaker"] = _merge_breaker(
+                entry.get("breaker"), changes, breaker.threshold
+            )
+        saved = entry.get("latencies")
+        saved = saved if isinstance(saved, list) else []
+        entry["latencies"] = (saved + samples)[-tracker.window :]
+        state[endpoint] = entry
+        return state
+
+    try:
+        merged = update_json(REQUEST_STATE_FILE, update, default={})
+    except (IOError, OSError):
+        return
+    if changes is not None:
+        # 同时采用其他进程累计的失败次数
+        breaker.restore(merged[endpoint]["breaker"])
+
+
+def _save_all_states():
+    for endpoint in list(_policies):
+        save_state(endpoint, force=True)
+
+
+atexit.register(_save_all_states)
+
+
+def get_breaker(endpoint):
+    get_policy(endpoint)
+    return _breakers[endpoint]
+
+
+def get_latency_tracker(endpoint):
+    get_policy(endpoint)
+    return _latencies[endpoint]
+
+
+def _status_code(exc):
+    response = getattr(exc, "response", None)
+    if response is not None and getattr(response, "status_code", None) is not None:
+        return response.status_code
+    return getattr(exc, "status", None)
+
+
+def is_retryable(exc):
+    """超时、连接错误、5xx 与 429 可重试；其余 4xx（如登录态过期）与解析错误不重试"""
+    if isinstance(exc, ValueError):
+        return False
+    status = _status_code(exc)
+    if status is not None:
+        return status >= 500 or status == 429
+    return True
+
+
+def _counts_as_failure(exc):
+    """4xx（429 除外）与解析错误说明服务可用，不计入熔断"""
+    if isinstance(exc, ValueError):
+        return False
+    status = _status_code(exc)
+    return status is None or status >= 500 or status == 429
+
+
+def _hedge_delay(endpoint, policy):
+    if not policy.hedge:
+        return None
+    tracker = _latencies[endpoint]
+    if len(tracker) < policy.hedge_min_samples:
+        return None
+    return max(policy.hedge_min_delay, tracker.quantile(policy.hedge_quantile))
+
+
+def _hedged_call(attempt_fn, hedge_fn, timeout, delay):
+    """先发一个请求，超过 delay 未返回则用 hedge_fn 再发一个，取先成功者"""
+    primary = _hedge_executor.submit(attempt_fn, timeout)
+    try:
+        return primary.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+
+    backup = _hedge_executor.submit(hedge_fn, timeout)
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            try:
+                return future.result()
+            except REQUEST_ERRORS as exc:
+                error = exc
+    raise error
+
+
+def call_with_policy(endpoint, attempt_fn, timeout=None, hedge_fn=None):
+    """
+    按端点策略执行同步请求
+
+    attempt_fn(timeout) 执行一次请求，失败时抛出 REQUEST_ERRORS 中的异常；
+    hedge_fn(timeout) 用于对冲请求（默认同 attempt_fn），与首个请求并发执行，
+    不能与其共享非线程安全的资源。
+    返回 attempt_fn 的结果；重试耗尽或熔断时抛出最后一次的异常。
+    """
+    policy = get_policy(endpoint)
+    breaker = _breakers[endpoint]
+    tracker = _latencies[endpoint]
+    timeout = timeout or policy.timeout
+
+    try:
+        for attempt in range(policy.attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{endpoint} 熔断中，暂停请求")
+            started = time.monotonic()
+            try:
+                delay = _hedge_delay(endpoint, policy)
+                if delay is not None:
+                    result = _hedged_call(
+                        attempt_fn, hedge_fn or attempt_fn, timeout, delay
+                    )
+                else:
+                    result = attempt_fn(timeout)
+            except REQUEST_ERRORS as exc:
+                if _counts_as_failure(exc):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if attempt + 1 >= policy.attempts or not is_retryable(exc):
+                    raise
+                time.sleep(policy.backoff_delay(attempt))
+                continue
+            except BaseException:
+                breaker.abort_probe()
+                raise
+            tracker.add(time.monotonic() - started)
+            breaker.record_success()
+            return result
+    finally:
+        save_state(endpoint)
+
+
+def enable_session_reuse():
+    """
+    开启连接复用（调度器等长驻进程调用）
+
+    之后未显式传入 session 的请求使用所在线程的共享 Session，跨次调用保持 keep-alive 连接。
+    """
+    global _session_reuse
+    _session_reuse = True
+
+
+def _thread_session():
+    session = getattr(_thread_sessions, "session", None)
+    if session is None:
+        session = _thread_sessions.session = requests.Session()
+    return session
+
+
+def request_get(endpoint, url, session=None, timeout=None, **kwargs):
+    """按端点策略发起 GET 请求，返回已校验状态码的 Response"""
+
+    def getter(*args, **options):
+        if session is not None:
+            return session.get(*args, **options)
+        if _session_reuse:
+            return _thread_session().get(*args, **options)
+        return requests.get(*args, **options)
+
+    def hedge_getter(*args, **options):
+        # 对冲请求与首个请求并发，不能共用调用方的 Session
+        if session is not None:
+            with _clone_session(session) as clone:
+                return clone.get(*args, **options)
+        return getter(*args, **options)
+
+    def attempt_with(get):
+        def attempt(request_timeout):
+            started = time.monotonic()
+            try:
+                with span("fetch." + endpoint):
+                    response = get(url, timeout=request_timeout, **kwargs)
+                    response.raise_for_status()
+            except requests.RequestException:
+                observe_request(endpoint, time.monotonic() - started, 0, False)
+                raise
+            observe_request(
+                endpoint, time.monotonic() - started, len(response.content), True
+            )
+            return response
+
+        return attempt
+
+    def call():
+        return call_with_policy(
+            endpoint,
+            attempt_with(getter),
+            timeout=timeout,
+            hedge_fn=attempt_with(hedge_getter),
+        )
+
+    policy = get_policy(endpoint)
+    if not policy.single_flight:
+        return call()
+
+    key = flight_key(
+        endpoint,
+        url,
+        kwargs.get("params"),
+        kwargs.get("headers"),
+        _cookie_items(session),
+    )
+    if not policy.single_flight_processes or _authenticated(session, kwargs):
+        # 带登录态的响应（账户信息）不落盘，只在进程内合并
+        response, _ = _flights.do(key, call)
+        return response
+
+    # 等待其他进程的时间不超过自己完整请求一次（含重试）的时间
+    wait_timeout = (timeout or policy.timeout) * policy.attempts
+    response, _ = _flights.do(
+        key,
+        lambda: shared_across_processes(
+            key,
+            call,
+            encode_response,
+            decode_response,
+            wait_timeout,
+        ),
+    )
+    return response
+
+
+def _authenticated(session, kwargs):
+    """请求是否携带登录态（Cookie、Authorization 请求头或带 Cookie 的 Session）"""
+    if session is not None and len(session.cookies):
+        return True
+    headers = {name.lower() for name in (kwargs.get("headers") or {})}
+    return bool(headers & {"cookie", "authorization"})
+
+
+def _clone_session(session):
+    """复制 Session 的请求头与 Cookie（供并发的对冲请求使用）"""
+    clone = requests.Session()
+    clone.headers.update(session.headers)
+    clone.cookies.update(session.cookies)
+    return clone
+
+
+def _cookie_items(session):
+    """会话中的 Cookie（参与合并键，不同账户的请求不会被合并）"""
+    if session is None:
+        return None
+    return sorted((c.domain, c.path, c.name, c.value) for c in session.cookies)
+
+
+def encode_response(response):
+    """
+    把 Response 编码为可写入 JSON 的字典（跨进程共享）
+
+    只保留状态码、Content-Type 与响应体，Set-Cookie 等其余响应头不落盘。
+    """
+    return {
+        "status_code": response.status_code,
+        "content_type": response.headers.get("Content-Type"),
+        "body": response.content.decode("latin-1"),
+    }
+
+
+def decode_response(data):
+    """encode_response 的逆操作"""
+    response = requests.Response()
+    response.status_code = data["status_code"]
+    if data.get("content_type"):
+        response.headers["Content-Type"] = data["content_type"]
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = data["body"].encode("latin-1")
+    return response
+
+
+async def _hedged_call_async(attempt_fn, timeout, delay, errors):
+    primary = asyncio.ensure_future(attempt_fn(timeout))
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+
+        pending.add(asyncio.ensure_future(attempt_fn(timeout)))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    return task.result()
+                except errors as exc:
+                    error = exc
+        raise error
+    finally:
+        # 返回、出错或调用方取消时，不留下仍在运行的请求
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_policy_async(endpoint, attempt_fn, timeout=None, errors=()):
+    """
+    call_with_policy 的 asyncio 版本，attempt_fn(timeout) 返回协程
+
+    errors 为客户端库的请求错误类型（如 aiohttp.ClientError 与 asyncio.TimeoutError），
+    与 REQUEST_ERRORS 一起计入重试 / 熔断。
+    """
+    policy = get_policy(endpoint)
+    breaker = _breakers[endpoint]
+    tracker = _latencies[endpoint]
+    timeout = timeout or policy.timeout
+    errors = REQUEST_ERRORS + tuple(errors)
+
+    try:
+        for attempt in range(policy.attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{endpoint} 熔断中，暂停请求")
+            started = time.monotonic()
+            try:
+                delay = _hedge_delay(endpoint, policy)
+                if delay is not None:
+                    result = await _hedged_call_async(
+                        attempt_fn, timeout, delay, errors
+                    )
+                else:
+                    result = await attempt_fn(timeout)
+            except errors as exc:
+                if _counts_as_failure(exc):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if attempt + 1 >= policy.attempts or not is_retryable(exc):
+                    raise
+                await asyncio.sleep(policy.backoff_delay(attempt))
+                continue
+            except BaseException:
+                # 包括 asyncio.CancelledError
+                breaker.abort_probe()
+                raise
+            tracker.add(time.monotonic() - started)
+            breaker.record_success()
+            return result
+    finally:
+        # 文件锁与 fsync 放到线程中，不阻塞事件循环
+        if state_due(endpoint):
+            await asyncio.to_thread(save_state, endpoint)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 推荐结果缓存
+把分类、排行、替代建议等计算结果按输入指纹保存在磁盘上，输入不变时直接复用:
+
+- 键 = 命名空间 + (价格快照指纹, 能力文件指纹, 分类配置指纹, 分组折扣, 命令参数) 的哈希；
+  任一输入变化都会得到新的键，旧条目不再命中，无需主动失效
+- 键中还包含 RESULT_CACHE_VERSION：修改分类/排行逻辑或结果结构时递增该值，
+  否则输入不变时会继续读到旧代码算出的结果
+- 每个条目一个文件（references/result_cache/<键>.json），命中时更新 mtime，
+  写入新条目后按 mtime 淘汰最久未使用的条目（LRU），最多保留 RESULT_CACHE_SIZE 个
+- 值须可序列化为 JSON（元组读回后为列表）
+
+用法:
+    python3 scripts/result_cache.py            # 查看缓存条目
+    python3 scripts/result_cache.py --clear    # 清空缓存
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from constants import RESULT_CACHE_DIR, RESULT_CACHE_SIZE, RESULT_CACHE_VERSION
+from file_store import CorruptStoreError, atomic_write_json, read_json
+from profiling import span
+
+_MISSING = object()
+
+
+def fingerprint(value):
+    """可序列化为 JSON 的值的稳定指纹"""
+    text = json.dumps(
+        value, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":")
+    )
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def file_fingerprint(path: Path):
+    """文件内容的指纹，文件不存在时为 None"""
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()[:32]
+    except OSError:
+        return None
+
+
+class ResultCache:
+    """磁盘上的 LRU 结果缓存（多个进程可同时使用，条目写入是原子的）"""
+
+    def __init__(self, directory: Path = None, max_entries=RESULT_CACHE_SIZE):
+        self.directory = directory or RESULT_CACHE_DIR
+        self.max_entries = max_entries
+
+    def key(self, namespace, **parts):
+        return f"{namespace}-{fingerprint(parts)}"
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            entry = read_json(path)
+        except (OSError, CorruptStoreError):
+            return default
+        if not isinstance(entry, dict) or "value" not in entry:
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["value"]
+
+    def put(self, key, value):
+        try:
+            atomic_write_json(self._path(key), {"value": value}, indent=None)
+        except (IOError, OSError):
+            return
+        self._evict()
+
+    def memoize(self, key, compute):
+        """命中时返回缓存的值，否则执行 compute() 并保存结果"""
+        with span("history.result_cache", key=key):
+            value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def entries(self):
+        """[(路径, mtime, 大小)]，最近使用的在前"""
+        result = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            result.append((path, stat.st_mtime, stat.st_size))
+        result.sort(key=lambda entry: entry[1], reverse=True)
+        return result
+
+    def _evict(self):
+        for path, _, _ in self.entries()[self.max_entries :]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def clear(self):
+        removed = 0
+        for path, _, _ in self.entries():
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+_disabled = False
+
+
+def disable():
+    """本进程不使用缓存（--no-cache）"""
+    global _disabled
+    _disabled = True
+
+
+def memoize(namespace, compute, **parts):
+    """按 namespace 与 parts 缓存 compute() 的结果；缓存被禁用时直接计算"""
+    if _disabled:
+        return compute()
+    cache = ResultCache()
+    key = cache.key(namespace, version=RESULT_CACHE_VERSION, **parts)
+    return cache.memoize(key, compute)
+
+
+def add_cache_argument(parser):
+    """为命令行添加 --no-cache 选项"""
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用推荐结果缓存，重新计算",
+    )
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 推荐结果缓存")
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    cache = ResultCache()
+    if args.clear:
+        print(f"🧹 已清除 {cache.clear()} 个缓存条目")
+        return
+
+    entries = cache.entries()
+    total = sum(size for _, _, size in entries)
+    print(f"\n🗄️  推荐结果缓存: {len(entries)}/{cache.max_entries} 个条目, {total / 1024:.1f} KB")
+    for path, _, size in entries:
+        print(f"   {path.stem} ({size / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 常驻调度器
+在一个常驻进程里按间隔运行 价格 / 用量 / 余额 采集任务，代替 cron 反复启动脚本:
+- 解释器、模块导入、登录态解析只做一次；HTTP 连接跨次复用（keep-alive）
+- 用量在内存中保留最近 SCHEDULER_USAGE_DAYS 天，之后每次只增量拉取新数据
+- 间隔带随机抖动；同一任务上一次还没跑完时本次直接合并（跳过），不会叠加运行；
+  多个调度器实例之间通过锁文件合并
+- 任务失败后按指数退避延长间隔（上限 SCHEDULER_MAX_BACKOFF），成功后恢复
+- 每次同步到新的价格 / 用量 / 余额后重新生成汇总报告，./run.sh balance 直接读取
+
+任务间隔可在 config.json 中覆盖:
+    {"scheduler": {"pricing": {"interval": 300}, "balance": {"interval": 600}}}
+
+用法:
+    python3 scripts/scheduler.py                     # 常驻运行全部任务
+    python3 scripts/scheduler.py --jobs pricing      # 只运行价格任务
+    python3 scripts/scheduler.py --once              # 每个任务运行一次后退出
+"""
+
+import argparse
+import concurrent.futures
+import json
+import random
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+from aiberm_console_api import (
+    build_session_from_auth_state,
+    build_snapshot,
+    fetch_usage_data,
+    fetch_user_self,
+    load_auth_state,
+    save_snapshot,
+    save_usage,
+)
+from balance_series import record_snapshot
+from constants import (
+    BALANCE_FILE,
+    CONFIG_FILE,
+    REFERENCES_DIR,
+    SCHEDULER_JITTER,
+    SCHEDULER_JOBS,
+    SCHEDULER_MAX_BACKOFF,
+    SCHEDULER_USAGE_DAYS,
+    SCHEDULER_USAGE_OVERLAP,
+)
+from fetch_prices import save_to_history
+from file_store import StoreLockTimeout, locked
+from offline import load_latest_pricing
+from request_policy import enable_session_reuse
+from skill_report import AUTH_FILE, fetch_pricing_data, materialize_report
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def log(message):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+class JobError(RuntimeError):
+    """任务本次执行失败（不重试，等待下次调度）"""
+
+
+class Job:
+    """一个周期任务及其调度状态（时间均为 time.monotonic()）"""
+
+    def __init__(
+        self, name, func, interval, jitter=SCHEDULER_JITTER, max_backoff=SCHEDULER_MAX_BACKOFF
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max(max_backoff, interval)
+        self.next_run = 0.0
+        self.running = False
+        self.failures = 0
+        self.runs = 0
+        self.coalesced = 0
+
+    def next_delay(self):
+        """下次运行前的等待时间：失败时按 2^连续失败次数 退避，再加随机抖动"""
+        delay = self.interval
+        if self.failures:
+            delay = min(self.interval * 2 ** self.failures, self.max_backoff)
+        return max(1.0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+class Collector:
+    """
+    采集任务与跨次复用的状态
+
+    登录态在文件变化时才重新解析；每个任务持有自己的登录态会话（任务自身不会并发，
+    会话无需跨线程共享）；用量按 (模型, 时间) 保存在内存中增量合并。
+    任一任务成功后用内存中的最新数据重新生成汇总报告（需至少同步过一次余额）。
+    """
+
+    def __init__(self, auth_file=AUTH_FILE, usage_days=SCHEDULER_USAGE_DAYS):
+        self.auth_file = auth_file
+        self.usage_days = usage_days
+        self.pricing_data = None
+        self.user_data = None
+        self.usage = {}
+        self.usage_window = None
+        self.usage_state = {}
+        self.snapshot = None
+        self._auth_state = None
+        self._auth_mtime = None
+        self._sessions = {}
+        self._auth_lock = threading.Lock()
+        self._usage_lock = threading.Lock()
+        self._report_lock = threading.Lock()
+
+    def _auth(self, job_name):
+        """返回 (登录态, 该任务的会话)；登录态文件更新后自动重新加载"""
+        with self._auth_lock:
+            try:
+                mtime = self.auth_file.stat().st_mtime
+            except OSError:
+                raise JobError("未找到登录态，请先运行: python3 scripts/fetch_balance_auto.py")
+            if mtime != self._auth_mtime:
+                self._auth_state = load_auth_state(self.auth_file)
+                self._auth_mtime = mtime
+                self._sessions = {}
+            if not self._auth_state:
+                raise JobError("登录态文件无效")
+            session = self._sessions.get(job_name)
+            if session is None:
+                session = build_session_from_auth_state(self._auth_state)
+                self._sessions[job_name] = session
+            return self._auth_state, session
+
+    def collect_pricing(self):
+        pricing_data = fetch_pricing_data()
+        if not pricing_data:
+            raise JobError("价格接口未返回数据")
+        self.pricing_data = pricing_data
+        save_to_history(pricing_data, quiet=True)
+        self.materialize()
+        return f"{len(pricing_data.get('data', []))} 个模型"
+
+    def collect_usage(self):
+        """增量同步用量：首次拉取全部保留天数，之后只拉取上次同步点之后（含重叠）的数据"""
+        with self._usage_lock:
+            auth_state, session = self._auth("usage")
+            end_ts = int(time.time())
+            retention_start = end_ts - self.usage_days * SECONDS_PER_DAY
+            start_ts = retention_start
+            if self.usage_window is not None:
+                start_ts = max(retention_start, self.usage_window[1] - SCHEDULER_USAGE_OVERLAP)
+
+            records = fetch_usage_data(
+                auth_state=auth_state,
+                session=session,
+                start_timestamp=start_ts,
+                end_timestamp=end_ts,
+                default_time="day",
+            )
+            if records is None:
+                raise JobError("用量接口未返回数据")
+
+            for record in records:
+                self.usage[(record.get("model_name"), record.get("created_at"))] = record
+            self.usage = {
+                key: record
+                for key, record in self.usage.items()
+                if (record.get("created_at") or 0) >= retention_start
+            }
+            self.usage_window = (retention_start, end_ts)
+            self.usage_state = save_usage(
+                list(self.usage.values()), window=self.usage_window
+            )
+        self.materialize()
+        return f"新增/更新 {len(records)} 条，内存中 {len(self.usage)} 条"
+
+    def collect_balance(self):
+        auth_state, session = self._auth("balance")
+        user_data = fetch_user_self(auth_state=auth_state, session=session)
+        if not user_data:
+            raise JobError("余额查询失败，可能登录态已过期")
+        self.user_data = user_data
+
+        if self.usage_window is None:
+            # 还没有同步过用量时先同步一次，避免写出空的用量统计
+            self.collect_usage()
+        with self._usage_lock:
+            usage_records = list(self.usage.values())
+            start_ts, end_ts = self.usage_window
+            usage_state = dict(self.usage_state)
+
+        snapshot = build_snapshot(user_data, usage_records, start_ts, end_ts)
+        snapshot["forecast"] = record_snapshot(snapshot)
+        snapshot.update(usage_state)
+        save_snapshot(snapshot, BALANCE_FILE)
+        self.snapshot = snapshot
+        self.materialize()
+        remaining = snapshot["balance"].get("remaining_amount")
+        return f"剩余 ${remaining:.2f}" if remaining is not None else "已更新"
+
+    def materialize(self):
+        """用内存中的最新数据重新生成汇总报告（还没有余额数据时跳过）"""
+        if self.user_data is None or self.snapshot is None:
+            return
+        with self._usage_lock:
+            usage_records = list(self.usage.values())
+            # 用量任务更新的滚动窗口 / 异常比余额快照中的更新
+            snapshot = {**self.snapshot, **self.usage_state}
+        pricing_data = self.pricing_data
+        if pricing_data is None:
+            latest = load_latest_pricing()
+            pricing_data = latest["data"] if latest else None
+        with self._report_lock:
+            materialize_report(self.user_data, usage_records, pricing_data, snapshot)
+
+
+def load_job_config():
+    """读取 config.json 中的 scheduler 覆盖项"""
+    if not CONFIG_FILE.exists():
+        return {}
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+    overrides = config.get("scheduler", {}) if isinstance(config, dict) else {}
+    return overrides if isinstance(overrides, dict) else {}
+
+
+def build_jobs(collector, names=None):
+    """按配置创建任务（names 为 None 时创建全部）"""
+    funcs = {
+        "pricing": collector.collect_pricing,
+        "usage": collector.collect_usage,
+        "balance": collector.collect_balance,
+    }
+    overrides = load_job_config()
+    jobs = []
+    for name, defaults in SCHEDULER_JOBS.items():
+        if names is not None and name not in names:
+            continue
+        options = dict(defaults)
+        options.update(overrides.get(name, {}))
+        jobs.append(
+            Job(
+                name,
+                funcs[name],
+                interval=options["interval"],
+                jitter=options.get("jitter", SCHEDULER_JITTER),
+                max_backoff=options.get("max_backoff", SCHEDULER_MAX_BACKOFF),
+            )
+        )
+    return jobs
+
+
+class Scheduler:
+    """在线程池中运行到期的任务；主循环只负责计时，从不等待任务完成"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, len(jobs)), thread_name_prefix="job"
+        )
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+    def _execute(self, job):
+        """执行一次任务，返回是否成功（其他实例正在运行同一任务时返回 None）"""
+        started = time.monotonic()
+        try:
+            # 锁文件只用于与其他调度器实例合并同一任务，拿不到立即放弃
+            with locked(REFERENCES_DIR / f"job-{job.name}", timeout=0):
+                detail = job.func()
+        except StoreLockTimeout:
+            log(f"⏭️  [{job.name}] 其他进程正在运行，本次合并跳过")
+            return None
+        except Exception as e:
+            job.failures += 1
+            log(f"❌ [{job.name}] 失败（连续 {job.failures} 次）: {e}")
+            return False
+        job.failures = 0
+        log(f"✅ [{job.name}] {detail}（{time.monotonic() - started:.1f}s）")
+        return True
+
+    def _run(self, job):
+        try:
+            self._execute(job)
+        finally:
+            with self._lock:
+                job.running = False
+                job.runs += 1
+                job.next_run = time.monotonic() + job.next_delay()
+            self._wakeup.set()
+
+    def _launch_due(self):
+        """启动到期的任务，返回距下一个任务到期的秒数"""
+        now = time.monotonic()
+        with self._lock:
+            for job in self.jobs:
+                if job.next_run > now:
+                    continue
+                if job.running:
+                    # 到下一次时上一次还没结束：合并本次，结束后重新计时
+                    job.coalesced += 1
+                    job.next_run = float("inf")
+                    continue
+                job.running = True
+                job.next_run = now + job.interval
+                self._executor.submit(self._run, job)
+            pending = [job.next_run for job in self.jobs if job.next_run != float("inf")]
+        return max(0.0, min(pending) - now) if pending else None
+
+    def run_forever(self):
+        """运行直到 stop()；启动时每个任务错开一个小的随机延迟"""
+        start = time.monotonic()
+        for job in self.jobs:
+            job.next_run = start + random.uniform(0, 2)
+        while not self._stop.is_set():
+            wait = self._launch_due()
+            self._wakeup.wait(timeout=wait)
+            self._wakeup.clear()
+        self._executor.shutdown(wait=True)
+
+    def run_once(self):
+        """每个任务按顺序运行一次，返回是否全部成功"""
+        results = [self._execute(job) for job in self.jobs]
+        return all(result is not False for result in results)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 常驻采集调度器")
+    parser.add_argument(
+        "--jobs",
+        default=",".join(SCHEDULER_JOBS),
+        help=f"要运行的任务，逗号分隔（默认 {','.join(SCHEDULER_JOBS)}）",
+    )
+    parser.add_argument("--once", action="store_true", help="每个任务运行一次后退出")
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    names = [name.strip() for name in args.jobs.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCHEDULER_JOBS]
+    if unknown:
+        print(f"❌ 未知任务: {', '.join(unknown)}（可选: {', '.join(SCHEDULER_JOBS)}）")
+        sys.exit(1)
+
+    enable_session_reuse()
+    scheduler = Scheduler(build_jobs(Collector(), names))
+
+    if args.once:
+        sys.exit(0 if scheduler.run_once() else 1)
+
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    summary = "，".join(f"{job.name} 每 {job.interval}s" for job in scheduler.jobs)
+    log(f"⏱️  调度器已启动: {summary}")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中断")
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
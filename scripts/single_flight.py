@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 请求合并（single-flight）
+同一时刻对同一端点、同一参数（含登录态）的多个请求只向上游发出一次，其余调用方共享结果:
+
+- 进程内：第一个调用方（leader）执行请求，其余线程 / 协程等待并拿到同一个结果或异常
+- 跨进程：leader 在 references/inflight/<key>.lock 上持有文件锁，请求成功后把响应写入
+  <key>.json；等锁的其他进程拿到锁后，若响应是在自己开始等待之后写入的，直接复用，
+  否则（leader 失败）自己再请求一次
+
+合并只针对"同时在途"的请求，不是缓存：请求结束后再来的调用方会发起新的请求。
+共享的响应只在等待方可能还需要时保留：超过等待时限、写入它的进程退出，
+或之后拿到锁的进程发现它已过时，都会把文件删除。
+注意这里的锁会在网络请求期间一直持有，与 file_store 中只保护本地读写的锁不同，
+所以使用独立的锁文件，不会阻塞其他存储文件的读写。
+"""
+
+import asyncio
+import atexit
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+from constants import SINGLE_FLIGHT_DIR
+from file_store import (
+    CorruptStoreError,
+    StoreLockTimeout,
+    atomic_write_json,
+    locked,
+    read_json,
+)
+
+
+def flight_key(*parts):
+    """由请求的各组成部分（端点、URL、参数、请求头、Cookie）得到稳定的键"""
+    text = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """线程间的请求合并"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """执行 fn()，同一 key 并发的调用只执行一次，返回 (结果, 是否复用了他人的结果)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+class AsyncSingleFlight:
+    """asyncio 任务间的请求合并（同一事件循环内）"""
+
+    def __init__(self):
+        self._flights = {}
+
+    async def do(self, key, coro_fn):
+        """await coro_fn()，同一 key 并发的调用共享同一个任务"""
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda _: self._flights.pop(key, None))
+        # shield：某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+
+def flight_file(key, directory: Path = None):
+    return (directory or SINGLE_FLIGHT_DIR) / f"{key}.json"
+
+
+def _read_shared(path: Path, since):
+    """读取 since 之后写入的共享结果，没有时返回 None（先看 mtime，避免无谓地解析旧文件）"""
+    try:
+        # mtime 精度可能较粗，放宽 1 秒，以文件内的时间为准
+        if path.stat().st_mtime < since - 1:
+            return None
+        shared = read_json(path)
+    except (OSError, CorruptStoreError):
+        return None
+    if isinstance(shared, dict) and shared.get("time", 0) >= since:
+        return shared
+    return None
+
+
+# 本进程写入的共享结果: 路径 -> (写入后的 mtime_ns, 过期时间)
+_shared_files = {}
+_shared_lock = threading.Lock()
+
+
+def _remove(path: Path, mtime_ns=None):
+    """删除共享结果；给出 mtime_ns 时只在文件未被其他进程改写时删除"""
+    try:
+        if mtime_ns is None or path.stat().st_mtime_ns == mtime_ns:
+            path.unlink()
+    except OSError:
+        pass
+
+
+def _remove_shared(everything=False):
+    """删除本进程写入且已过期的共享结果（进程退出时全部删除）"""
+    now = time.time()
+    with _shared_lock:
+        for path, (mtime_ns, expires) in list(_shared_files.items()):
+            if everything or expires <= now:
+                del _shared_files[path]
+                _remove(path, mtime_ns)
+
+
+atexit.register(_remove_shared, everything=True)
+
+
+def shared_across_processes(key, fn, encode, decode, wait_timeout, directory: Path = None):
+    """
+    跨进程合并：持有 key 的文件锁执行 fn()，把 encode(结果) 留给同时在等待的进程
+
+    等待中的进程拿到锁后用 decode 还原 leader 的结果；等锁超时则直接执行 fn()。
+    只有成功的结果会被共享，且只保留 wait_timeout 秒（等待更久的进程已经自行请求）。
+    """
+    _remove_shared()
+    path = flight_file(key, directory)
+    started = time.time()
+    try:
+        with locked(path, timeout=wait_timeout):
+            shared = _read_shared(path, started)
+            if shared is not None:
+                return decode(shared["result"])
+            # 上一轮留下的结果对本次没有用处
+            _remove(path)
+            result = fn()
+            try:
+                shared = {"time": time.time(), "result": encode(result)}
+                atomic_write_json(path, shared, indent=None)
+                with _shared_lock:
+                    _shared_files[path] = (
+                        path.stat().st_mtime_ns,
+                        shared["time"] + wait_timeout,
+                    )
+            except (IOError, OSError):
+                pass
+            return result
+    except StoreLockTimeout:
+        return fn()
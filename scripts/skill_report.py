@@ -4,36 +4,74 @@ Skill 汇总输出:
 - 账户余额
 - 使用量最高的模型 Top 3
 - 价格信息
+- 同款模型的更便宜写法
 - 同类更便宜模型推荐
 """
 
 from pathlib import Path
-import json
+import argparse
 import sys
 import time
 
 import requests
 
-from aiberm_console_api import fetch_usage_data, fetch_user_self, load_auth_state
+from aiberm_console_api import (
+    build_snapshot,
+    fetch_usage_data,
+    fetch_user_self,
+    load_auth_state,
+    save_snapshot,
+    save_usage,
+)
+from balance_series import describe_forecast, record_snapshot
+from capabilities import load_capabilities
+from categories import get_classifier
 from constants import (
+    ALTERNATIVE_TOP_K,
+    BALANCE_FILE,
     BASE_INPUT_PRICE,
     BASE_OUTPUT_PRICE,
-    MODEL_CATEGORIES,
+    OFFLINE_MAX_AGE,
     PRICING_API,
     QUOTA_DIVISOR,
+    REPORT_FILE,
+    REPORT_MAX_AGE,
+    REPORT_REFRESH_AGE,
+    REPORT_TOP_K,
+    USAGE_TOP_K,
+)
+from fetch_prices import save_to_history
+from model_aliases import AliasIndex
+from offline import (
+    age_seconds,
+    format_age,
+    is_fresh,
+    load_balance_snapshot,
+    load_latest_pricing,
+    load_materialized_report,
+    spawn_refresh,
 )
+from output import OutputWriter, add_format_argument
+from price_asof import cost_by_model, join_usage, load_price_timeline
+from profiling import add_profile_argument, profile_session, span, traced
+from ranking import positive_int, top_k
+from request_policy import request_get
+from result_cache import add_cache_argument, disable as disable_cache, fingerprint, memoize
+from storage import get_storage
+from usage_anomaly import format_anomalies
+from usage_rollup import UsageRollup
+from usage_windows import format_windows
 
 
 AUTH_FILE = Path(__file__).parent.parent / ".auth_state.json"
-CAPABILITY_FILE = Path(__file__).parent.parent / "model_capabilities.json"
 
 
-def fetch_pricing_data(timeout=10):
+def fetch_pricing_data(timeout=None):
     """获取价格数据"""
     try:
-        response = requests.get(PRICING_API, timeout=timeout)
-        response.raise_for_status()
-        data = response.json()
+        response = request_get("pricing", PRICING_API, timeout=timeout)
+        with span("parse.pricing"):
+            data = response.json()
         if not data.get("success"):
             return None
         return data
@@ -57,6 +95,7 @@ def compute_text_price(model, group_ratio):
     }
 
 
+@traced("price.map")
 def build_price_map(pricing_data):
     """构建模型价格索引"""
     models = pricing_data.get("data", [])
@@ -74,44 +113,10 @@ def build_price_map(pricing_data):
     return price_map, group_ratio
 
 
-def aggregate_usage(records):
-    """聚合使用数据"""
-    by_model = {}
-
-    for record in records or []:
-        model_name = record.get("model_name", "unknown")
-        stats = by_model.setdefault(
-            model_name, {"quota": 0, "token_used": 0, "count": 0}
-        )
-        stats["quota"] += record.get("quota", 0) or 0
-        stats["token_used"] += record.get("token_used", 0) or 0
-        stats["count"] += record.get("count", 0) or 0
-
-    ranked = sorted(by_model.items(), key=lambda item: item[1]["quota"], reverse=True)
-    return ranked
-
-
-def detect_category(model_name):
-    """按关键词匹配模型分类"""
-    name = (model_name or "").lower()
-    for category, info in MODEL_CATEGORIES.items():
-        if any(keyword in name for keyword in info["models"]):
-            return category
-    return "other"
-
-
-def load_capabilities():
-    """加载模型能力配置"""
-    if not CAPABILITY_FILE.exists():
-        return {}
-    try:
-        with open(CAPABILITY_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {}
-    if not isinstance(data, dict):
-        return {}
-    return data
+@traced("aggregate.usage_by_model")
+def aggregate_usage(records, top_n=None):
+    """聚合使用数据，按消耗降序返回前 top_n 个模型（None 表示全部）"""
+    return UsageRollup("day").add_all(records).by_model(top_n)
 
 
 def normalize_score(value, min_value=0.0, max_value=10.0):
@@ -167,46 +172,102 @@ def capability_similarity(target, candidate, weights=None):
     )
 
 
-def find_alternatives(target_name, price_map, capabilities):
-    """找能力相近且更便宜的模型"""
-    target_price = price_map.get(target_name)
-    if not target_price:
-        return [], "none"
-
+def iter_capability_candidates(target_name, price_map, capabilities):
+    """逐个产出能力相近且更便宜的候选 (模型名, 价格, 相似度)"""
+    target_price = price_map[target_name]
     target_cap = capabilities.get(target_name)
-    if target_cap:
-        scored = []
-        for model_name, price in price_map.items():
-            if model_name == target_name:
-                continue
-            if price["avg_cost"] >= target_price["avg_cost"]:
-                continue
-            candidate_cap = capabilities.get(model_name)
-            if not candidate_cap:
-                continue
-            similarity = capability_similarity(target_cap, candidate_cap)
-            if similarity is None or similarity < 0.75:
-                continue
-            scored.append((model_name, price, similarity))
-
-        scored.sort(key=lambda item: (-item[2], item[1]["avg_cost"]))
-        if scored:
-            return [(name, price) for name, price, _ in scored[:3]], "capability"
+    for model_name, price in price_map.items():
+        if model_name == target_name:
+            continue
+        if price["avg_cost"] >= target_price["avg_cost"]:
+            continue
+        candidate_cap = capabilities.get(model_name)
+        if not candidate_cap:
+            continue
+        similarity = capability_similarity(target_cap, candidate_cap)
+        if similarity is None or similarity < 0.75:
+            continue
+        yield model_name, price, similarity
 
-    target_category = detect_category(target_name)
-    target_cost = target_price["avg_cost"]
 
-    alternatives = []
+def iter_category_candidates(target_name, price_map):
+    """逐个产出同类且更便宜的候选 (模型名, 价格)"""
+    classify = get_classifier().classify
+    target_category = classify(target_name)
+    target_cost = price_map[target_name]["avg_cost"]
     for model_name, price in price_map.items():
         if model_name == target_name:
             continue
-        if detect_category(model_name) != target_category:
+        if classify(model_name) != target_category:
             continue
         if price["avg_cost"] < target_cost:
-            alternatives.append((model_name, price))
+            yield model_name, price
 
-    alternatives.sort(key=lambda item: item[1]["avg_cost"])
-    return alternatives[:3], "category" if alternatives else "none"
+
+@traced("rank.alternatives")
+def find_alternatives(target_name, price_map, capabilities, top_n=ALTERNATIVE_TOP_K):
+    """找能力相近且更便宜的模型"""
+    target_price = price_map.get(target_name)
+    if not target_price:
+        return [], "none"
+
+    if capabilities.get(target_name):
+        scored = top_k(
+            iter_capability_candidates(target_name, price_map, capabilities),
+            top_n,
+            key=lambda item: (-item[2], item[1]["avg_cost"]),
+        )
+        if scored:
+            return [(name, price) for name, price, _ in scored], "capability"
+
+    alternatives = top_k(
+        iter_category_candidates(target_name, price_map),
+        top_n,
+        key=lambda item: item[1]["avg_cost"],
+    )
+    return alternatives, "category" if alternatives else "none"
+
+
+def recommend_for_models(
+    model_names, pricing_data, price_map, capabilities, alternatives_n=ALTERNATIVE_TOP_K
+):
+    """
+    各模型的替代建议与更便宜的同款写法，返回 {模型名: 建议}
+
+    结果按 (价格快照, 能力配置, 分类配置, 模型列表, 数量) 的指纹缓存在磁盘上，
+    价格与配置不变时重复查询不再重新计算。
+    """
+
+    def compute():
+        aliases = AliasIndex(
+            pricing_data.get("data", []) if pricing_data else [], price_map
+        )
+        result = {}
+        for model_name in model_names:
+            alternatives, mode = find_alternatives(
+                model_name, price_map, capabilities, top_n=alternatives_n
+            )
+            result[model_name] = {
+                "cheaper_equivalent": aliases.cheaper_equivalent(
+                    model_name, price_map.get(model_name)
+                ),
+                "alternative_mode": mode,
+                "alternatives": [
+                    {"model_name": alt_name, "avg_cost": alt_price["avg_cost"]}
+                    for alt_name, alt_price in alternatives
+                ],
+            }
+        return result
+
+    return memoize(
+        "report",
+        compute,
+        pricing=fingerprint(pricing_data),
+        capabilities=fingerprint(capabilities),
+        categories=fingerprint(get_classifier().categories),
+        models=list(model_names),
+        alternatives=alternatives_n,
+    )
 
 
 def format_money(value):
@@ -215,28 +276,78 @@ def format_money(value):
     return f"${value:.2f}"
 
 
-def main():
-    """主函数"""
-    auth_state = load_auth_state(AUTH_FILE)
-    if not auth_state:
-        print("❌ 未找到登录态，请先运行: python3 scripts/fetch_balance_auto.py")
-        sys.exit(1)
-
-    user_data = fetch_user_self(auth_state=auth_state)
-    if not user_data:
-        print("❌ 余额查询失败，可能登录态已过期")
-        sys.exit(1)
-
-    end_ts = int(time.time())
-    start_ts = end_ts - 30 * 24 * 60 * 60
-    usage_records = fetch_usage_data(
-        auth_state=auth_state,
-        start_timestamp=start_ts,
-        end_timestamp=end_ts,
-        default_time="day",
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 余额 + 用量 + 价格汇总")
+    parser.add_argument(
+        "--top",
+        type=positive_int,
+        default=REPORT_TOP_K,
+        metavar="K",
+        help=f"显示用量最高的前 K 个模型（默认 {REPORT_TOP_K}）",
     )
-
-    pricing_data = fetch_pricing_data()
+    parser.add_argument(
+        "--alternatives",
+        type=positive_int,
+        default=ALTERNATIVE_TOP_K,
+        metavar="K",
+        help=f"每个模型最多显示 K 个替代建议（默认 {ALTERNATIVE_TOP_K}）",
+    )
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help="忽略预生成的报告，实时查询余额/用量/价格",
+    )
+    parser.add_argument(
+        "--offline-first",
+        action="store_true",
+        help="本地余额/价格快照足够新时直接使用，并在后台刷新",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=int,
+        default=OFFLINE_MAX_AGE,
+        metavar="SEC",
+        help=f"离线优先模式下本地数据的最大年龄（秒，默认 {OFFLINE_MAX_AGE}）",
+    )
+    parser.add_argument(
+        "--report-max-age",
+        type=int,
+        default=REPORT_MAX_AGE,
+        metavar="SEC",
+        help=f"预生成报告的最大年龄，超过时实时查询（秒，默认 {REPORT_MAX_AGE}）",
+    )
+    parser.add_argument(
+        "--refresh-only",
+        action="store_true",
+        help="只抓取并保存余额/用量/价格，不输出（供后台刷新使用）",
+    )
+    add_format_argument(parser)
+    add_profile_argument(parser)
+    add_cache_argument(parser)
+    return parser.parse_args(argv)
+
+
+@traced("aggregate.report")
+def build_report(
+    user_data,
+    usage_records,
+    pricing_data,
+    capabilities,
+    top_n=REPORT_TOP_K,
+    alternatives_n=ALTERNATIVE_TOP_K,
+    forecast=None,
+    usage_windows=None,
+    anomalies=None,
+    historical_prices=False,
+):
+    """
+    组装汇总报告数据（与输出格式无关）
+
+    forecast 为余额消耗预测，usage_windows 为增量维护的滚动窗口合计，
+    anomalies 为本次同步发现的用量异常；historical_prices 为 True 时
+    按每个小时桶当时生效的价格估算各模型成本（需要带 created_at 的原始用量记录）。
+    """
     price_map = {}
     group_ratio = 0.23
     if pricing_data:
@@ -249,55 +360,410 @@ def main():
     )
     used_amount = used_amount / QUOTA_DIVISOR if used_amount is not None else None
 
-    print("\n💰 Aiberm 账户余额")
-    print(f"⏰ 查询时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"👤 用户名: {user_data.get('username', 'N/A')}")
-    print(f"💵 剩余余额: {format_money(remaining_amount)}")
-    print(f"📊 历史消耗: {format_money(used_amount)}")
-    print(f"💰 分组折扣: {group_ratio}")
-
+    report = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "username": user_data.get("username"),
+        "remaining_amount": remaining_amount,
+        "used_amount": used_amount,
+        "forecast": forecast,
+        "usage_windows": usage_windows,
+        "anomalies": anomalies or [],
+        "group_ratio": group_ratio,
+        "pricing_available": bool(pricing_data),
+        "usage_available": bool(usage_records),
+        "top_n": top_n,
+        "top_models": [],
+    }
     if not usage_records:
-        print("\n⚠️  未获取到用量数据")
+        return report
+
+    top_models = aggregate_usage(usage_records, top_n=top_n)
+    costs = {}
+    if historical_prices:
+        names = {model_name for model_name, _ in top_models}
+        rows = join_usage(
+            UsageRollup("hour").add_all(usage_records),
+            load_price_timeline(compute_text_price, names),
+            price_map,
+            names,
+        )
+        costs = cost_by_model(rows)
+
+    recommendations = recommend_for_models(
+        [model_name for model_name, _ in top_models],
+        pricing_data,
+        price_map,
+        capabilities,
+        alternatives_n,
+    )
+    for model_name, stats in top_models:
+        cost = costs.get(model_name, {})
+        report["top_models"].append(
+            {
+                "model_name": model_name,
+                "quota": stats.get("quota", 0),
+                "quota_amount": stats.get("quota", 0) / QUOTA_DIVISOR,
+                "count": stats.get("count", 0),
+                "token_used": stats.get("token_used", 0),
+                "price": price_map.get(model_name),
+                "historical_cost": cost.get("historical_cost"),
+                "current_cost": cost.get("current_cost"),
+                "before_history": cost.get("before_history", 0),
+                **recommendations[model_name],
+            }
+        )
+    return report
+
+
+@traced("render.report")
+def render_report(report, out):
+    """按输出格式渲染汇总报告"""
+    if out.structured:
+        out.meta(
+            timestamp=report["timestamp"],
+            username=report["username"],
+            remaining_amount=report["remaining_amount"],
+            used_amount=report["used_amount"],
+            forecast=report["forecast"],
+            usage_windows=report["usage_windows"],
+            anomalies=report["anomalies"],
+            group_ratio=report["group_ratio"],
+            pricing_available=report["pricing_available"],
+            usage_available=report["usage_available"],
+        )
+        if report.get("offline"):
+            out.meta(data_source="offline", **report["offline"])
+        if report.get("materialized"):
+            out.meta(data_source="materialized", **report["materialized"])
+        for rank, item in enumerate(report["top_models"], 1):
+            price = item["price"] or {}
+            out.row(
+                {
+                    "rank": rank,
+                    "model_name": item["model_name"],
+                    "quota_amount": item["quota_amount"],
+                    "count": item["count"],
+                    "token_used": item["token_used"],
+                    "input_price": price.get("input_price"),
+                    "output_price": price.get("output_price"),
+                    "avg_cost": price.get("avg_cost"),
+                    "historical_cost": item["historical_cost"],
+                    "current_cost": item["current_cost"],
+                    "before_history": item.get("before_history", 0),
+                    "cheaper_equivalent": (item.get("cheaper_equivalent") or {}).get(
+                        "model_name"
+                    ),
+                    "alternative_mode": item["alternative_mode"],
+                    "alternatives": [alt["model_name"] for alt in item["alternatives"]],
+                }
+            )
         return
 
-    capabilities = load_capabilities()
-
-    ranked = aggregate_usage(usage_records)
-    top_three = ranked[:3]
-
-    print("\n🏆 使用量最高的模型 (Top 3)")
-    print("=" * 60)
+    out.text(
+        "\n💰 Aiberm 账户余额",
+        f"⏰ 查询时间: {report['timestamp']}",
+        f"👤 用户名: {report['username'] or 'N/A'}",
+        f"💵 剩余余额: {format_money(report['remaining_amount'])}",
+        f"📊 历史消耗: {format_money(report['used_amount'])}",
+    )
+    burn, runway = describe_forecast(report["forecast"])
+    if burn:
+        out.text(f"🔥 日均消耗: {burn}")
+    out.text(f"⏳ 预计可用: {runway}", f"💰 分组折扣: {report['group_ratio']}")
+
+    offline = report.get("offline")
+    if offline:
+        label = (
+            f"📦 本地数据: 余额 {format_age(offline['balance_age'])}, "
+            f"价格 {format_age(offline['pricing_age'])}"
+        )
+        if offline.get("refreshing"):
+            label += "（后台刷新中）"
+        out.text(label)
+
+    materialized = report.get("materialized")
+    if materialized:
+        label = f"📦 预生成报告: {format_age(materialized['report_age'])}"
+        if materialized.get("refreshing"):
+            label += "（后台刷新中）"
+        out.text(f"{label}，实时查询: ./run.sh balance --live")
+
+    if report["usage_windows"]:
+        out.text(f"📅 {format_windows(report['usage_windows']).strip()}")
+    out.text(*format_anomalies(report["anomalies"]))
+
+    if not report["usage_available"]:
+        out.text("\n⚠️  未获取到用量数据")
+        return
 
-    for idx, (model_name, stats) in enumerate(top_three, 1):
-        quota_amount = stats.get("quota", 0) / QUOTA_DIVISOR
-        token_used = stats.get("token_used", 0)
-        count = stats.get("count", 0)
+    out.text(f"\n🏆 使用量最高的模型 (Top {report['top_n']})", "=" * 60)
 
-        print(f"\n{idx}. {model_name}")
-        print(f"   使用消耗: ${quota_amount:.2f} / {count} 次 / {token_used} tokens")
+    for idx, item in enumerate(report["top_models"], 1):
+        out.text(
+            f"\n{idx}. {item['model_name']}",
+            f"   使用消耗: ${item['quota_amount']:.2f} / {item['count']} 次 / {item['token_used']} tokens",
+        )
 
-        price_info = price_map.get(model_name)
+        price_info = item["price"]
         if price_info:
-            print(
-                f"   价格: 输入 ${price_info['input_price']:.4f}/百万token, 输出 ${price_info['output_price']:.4f}/百万token"
+            out.text(
+                f"   价格: 输入 ${price_info['input_price']:.4f}/百万token, 输出 ${price_info['output_price']:.4f}/百万token",
+                f"   平均成本: ${price_info['avg_cost']:.4f}/百万token",
             )
-            print(f"   平均成本: ${price_info['avg_cost']:.4f}/百万token")
-        elif not pricing_data:
-            print("   价格: 暂不可用 (价格接口未返回)")
+        elif not report["pricing_available"]:
+            out.text("   价格: 暂不可用 (价格接口未返回)")
         else:
-            print("   价格: 未找到该模型价格")
+            out.text("   价格: 未找到该模型价格")
+        if item["historical_cost"] is not None:
+            line = f"   估算成本: ${item['historical_cost']:.4f}（按当时价格）"
+            if item["current_cost"] is not None:
+                line += f" / ${item['current_cost']:.4f}（按当前价格）"
+            out.text(line)
+            if item.get("before_history"):
+                out.text(
+                    f"   ⚠️  {item['before_history']} 个小时桶早于价格历史，按最早的已知价格估算"
+                )
+
+        equivalent = item.get("cheaper_equivalent")
+        if equivalent:
+            out.text(
+                f"   ⚠️  同款更便宜: {equivalent['model_name']} "
+                f"${equivalent['avg_cost']:.4f}/百万token（便宜 {equivalent['savings_percent']:.1f}%）"
+            )
 
-        alternatives, mode = find_alternatives(model_name, price_map, capabilities)
-        if alternatives:
-            if mode == "capability":
+        if item["alternatives"]:
+            if item["alternative_mode"] == "capability":
                 label = "   更便宜替代(能力相近)"
             else:
                 label = "   更便宜替代"
-            print(f"{label}:")
-            for alt_name, alt_price in alternatives:
-                print(f"     - {alt_name}: ${alt_price['avg_cost']:.4f}/百万token")
+            out.text(f"{label}:")
+            for alt in item["alternatives"]:
+                out.text(
+                    f"     - {alt['model_name']}: ${alt['avg_cost']:.4f}/百万token"
+                )
         else:
-            print("   更便宜替代: 暂无")
+            out.text("   更便宜替代: 暂无")
+
+
+@traced("aggregate.offline_report")
+def build_offline_report(snapshot, stored_pricing, capabilities, top_n, alternatives_n):
+    """用本地余额快照与价格历史组装报告"""
+    balance = snapshot.get("balance", {})
+    user_data = {
+        "username": snapshot.get("user", {}).get("username"),
+        "quota": balance.get("quota"),
+        "used_quota": balance.get("used_quota"),
+    }
+    usage_records = [
+        {"model_name": name, **stats}
+        for name, stats in snapshot.get("usage_summary", {}).get("top_models", [])
+    ]
+    pricing_data = stored_pricing.get("data") if stored_pricing else None
+
+    report = build_report(
+        user_data,
+        usage_records,
+        pricing_data,
+        capabilities,
+        top_n=top_n,
+        alternatives_n=alternatives_n,
+        forecast=snapshot.get("forecast"),
+        usage_windows=snapshot.get("usage_windows"),
+        anomalies=snapshot.get("anomalies"),
+    )
+    report["timestamp"] = snapshot.get("timestamp")
+    report["offline"] = {
+        "balance_timestamp": snapshot.get("timestamp"),
+        "balance_age": age_seconds(snapshot.get("timestamp")),
+        "pricing_timestamp": (
+            stored_pricing.get("timestamp") if stored_pricing else None
+        ),
+        "pricing_age": (
+            age_seconds(stored_pricing.get("timestamp")) if stored_pricing else None
+        ),
+        "usage_window": snapshot.get("usage_window"),
+        "refreshing": False,
+    }
+    return report
+
+
+def materialize_report(
+    user_data,
+    usage_records,
+    pricing_data,
+    snapshot,
+    top_n=REPORT_TOP_K,
+    alternatives_n=ALTERNATIVE_TOP_K,
+):
+    """
+    用刚同步的数据生成汇总报告并保存（供 balance 直接读取），返回报告
+
+    排行与替代建议至少保留默认数量，之后的查询可按更小的 --top / --alternatives 截取。
+    """
+    report = build_report(
+        user_data,
+        usage_records,
+        pricing_data,
+        load_capabilities(),
+        top_n=max(top_n, REPORT_TOP_K),
+        alternatives_n=max(alternatives_n, ALTERNATIVE_TOP_K),
+        forecast=snapshot.get("forecast"),
+        usage_windows=snapshot.get("usage_windows"),
+        anomalies=snapshot.get("anomalies"),
+        historical_prices=True,
+    )
+    report["alternatives_n"] = max(alternatives_n, ALTERNATIVE_TOP_K)
+    # 价格历史更新后（如单独运行的价格采集）报告中的价格与替代建议随之失效
+    report["pricing_fingerprint"] = fingerprint(pricing_data)
+    try:
+        with span("history.save_report"):
+            get_storage().save_snapshot(REPORT_FILE, report)
+    except (IOError, OSError):
+        pass
+    return report
+
+
+def slice_report(report, top_n, alternatives_n):
+    """
+    按 --top / --alternatives 截取报告，报告保留的数量不足时返回 None
+
+    排行与替代建议都是按同一键排序后的前 K 个，截取结果与直接按较小数量计算一致。
+    """
+    if report.get("top_n", 0) < top_n or report.get("alternatives_n", 0) < alternatives_n:
+        return None
+    report = dict(report, top_n=top_n, alternatives_n=alternatives_n)
+    report["top_models"] = [
+        dict(item, alternatives=item["alternatives"][:alternatives_n])
+        for item in report["top_models"][:top_n]
+    ]
+    return report
+
+
+def load_report(top_n, alternatives_n, max_age):
+    """
+    读取足够新、数量足够、且基于当前价格历史的预生成报告，没有时返回 None
+    """
+    report = load_materialized_report()
+    if not report or "top_models" not in report:
+        return None
+    age = age_seconds(report.get("timestamp"))
+    if not is_fresh(age, max_age):
+        return None
+    latest = load_latest_pricing()
+    if report.get("pricing_fingerprint") != fingerprint(latest["data"] if latest else None):
+        return None
+    report = slice_report(report, top_n, alternatives_n)
+    if report is None:
+        return None
+    report["materialized"] = {"report_age": age, "refreshing": False}
+    return report
+
+
+def fetch_live_data(auth_state, top_n):
+    """
+    抓取余额、30 天用量与价格，并写回本地存储供离线模式使用
+
+    返回 (user_data, usage_records, pricing_data, snapshot)。
+    """
+    user_data = fetch_user_self(auth_state=auth_state)
+    if not user_data:
+        return None, None, None, None
+
+    end_ts = int(time.time())
+    start_ts = end_ts - 30 * 24 * 60 * 60
+    usage_records = fetch_usage_data(
+        auth_state=auth_state,
+        start_timestamp=start_ts,
+        end_timestamp=end_ts,
+        default_time="day",
+    )
+
+    pricing_data = fetch_pricing_data()
+
+    snapshot = build_snapshot(
+        user_data,
+        usage_records or [],
+        start_ts,
+        end_ts,
+        top_n=max(top_n, USAGE_TOP_K),
+    )
+    snapshot["forecast"] = record_snapshot(snapshot)
+    snapshot.update(save_usage(usage_records, window=(start_ts, end_ts)))
+    save_snapshot(snapshot, BALANCE_FILE)
+    if pricing_data:
+        save_to_history(pricing_data, quiet=True)
+
+    return user_data, usage_records, pricing_data, snapshot
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    if args.no_cache:
+        disable_cache()
+
+    if args.refresh_only:
+        auth_state = load_auth_state(AUTH_FILE)
+        if not auth_state:
+            sys.exit(1)
+        user_data, usage_records, pricing_data, snapshot = fetch_live_data(
+            auth_state, args.top
+        )
+        if not user_data:
+            sys.exit(1)
+        materialize_report(user_data, usage_records, pricing_data, snapshot)
+        return
+
+    with profile_session(args, "skill_report"), OutputWriter(
+        args.format
+    ) as out, out.redirect_incidental():
+        if not args.live:
+            report = load_report(args.top, args.alternatives, args.report_max_age)
+            if report:
+                if report["materialized"]["report_age"] > REPORT_REFRESH_AGE:
+                    report["materialized"]["refreshing"] = spawn_refresh(
+                        "skill_report.py"
+                    )
+                render_report(report, out)
+                return
+
+        if args.offline_first:
+            snapshot = load_balance_snapshot()
+            if snapshot and is_fresh(
+                age_seconds(snapshot.get("timestamp")), args.max_age
+            ):
+                report = build_offline_report(
+                    snapshot,
+                    load_latest_pricing(),
+                    load_capabilities(),
+                    args.top,
+                    args.alternatives,
+                )
+                report["offline"]["refreshing"] = spawn_refresh("skill_report.py")
+                render_report(report, out)
+                return
+
+        auth_state = load_auth_state(AUTH_FILE)
+        if not auth_state:
+            print("❌ 未找到登录态，请先运行: python3 scripts/fetch_balance_auto.py")
+            sys.exit(1)
+
+        user_data, usage_records, pricing_data, snapshot = fetch_live_data(
+            auth_state, args.top
+        )
+        if not user_data:
+            print("❌ 余额查询失败，可能登录态已过期")
+            sys.exit(1)
+
+        report = materialize_report(
+            user_data,
+            usage_records,
+            pricing_data,
+            snapshot,
+            top_n=args.top,
+            alternatives_n=args.alternatives,
+        )
+        render_report(slice_report(report, args.top, args.alternatives), out)
 
 
 if __name__ == "__main__":
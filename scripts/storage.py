@@ -0,0 +1,646 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 存储后端
+价格历史、余额/用量快照与用量明细统一通过 Storage 接口读写:
+- JsonStorage（默认）：references/ 下的 JSON 文件，与以往格式完全一致；
+  完整价格快照只保留最近 MAX_HISTORY_RECORDS 份，另在 price_changes.json 中
+  逐模型记录价格变化点（价格不变不记录），供按历史价格估算成本
+- SqliteStorage：references/aiberm.db（WAL 模式），按 (model, 时间) 建索引，
+  "近 30 天各模型消耗"这类查询是一条走索引的 SQL
+
+后端选择（优先级从高到低）：环境变量 AIBERM_STORAGE，config.json 的 "storage" 字段。
+取值为 "json" 或 "sqlite"。
+
+用法:
+    python3 scripts/storage.py migrate          # 将现有 JSON 历史导入 SQLite
+    python3 scripts/storage.py spend --days 30  # 近 30 天各模型消耗
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+
+from constants import (
+    BALANCE_FILE,
+    CONFIG_FILE,
+    HISTORY_FILE,
+    MAX_HISTORY_RECORDS,
+    PRICE_CHANGES_FILE,
+    QUOTA_DIVISOR,
+    REFERENCES_DIR,
+    STORAGE_DB_FILE,
+    USAGE_FILE,
+    USAGE_RETENTION_DAYS,
+)
+from file_store import CorruptStoreError, atomic_write_json, read_json, update_json
+
+STORAGE_BACKENDS = ("json", "sqlite")
+STORAGE_ENV = "AIBERM_STORAGE"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pricing_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    ts REAL NOT NULL,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pricing_snapshots_ts ON pricing_snapshots (ts);
+
+CREATE TABLE IF NOT EXISTS model_prices (
+    snapshot_id INTEGER NOT NULL REFERENCES pricing_snapshots (id),
+    model TEXT NOT NULL,
+    ts REAL NOT NULL,
+    quota_type INTEGER,
+    model_ratio REAL,
+    completion_ratio REAL,
+    model_price REAL,
+    group_ratio REAL
+);
+CREATE INDEX IF NOT EXISTS idx_model_prices_model_ts ON model_prices (model, ts);
+
+CREATE TABLE IF NOT EXISTS usage_buckets (
+    account TEXT NOT NULL,
+    model TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    quota INTEGER NOT NULL DEFAULT 0,
+    token_used INTEGER NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (account, model, ts)
+);
+CREATE INDEX IF NOT EXISTS idx_usage_buckets_model_ts ON usage_buckets (model, ts);
+CREATE INDEX IF NOT EXISTS idx_usage_buckets_ts ON usage_buckets (ts);
+
+CREATE TABLE IF NOT EXISTS balance_samples (
+    account TEXT NOT NULL,
+    ts REAL NOT NULL,
+    quota INTEGER,
+    used_quota INTEGER,
+    PRIMARY KEY (account, ts)
+);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    key TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+
+
+class StorageError(IOError):
+    """存储后端读写失败"""
+
+
+def _epoch(timestamp):
+    """ISO 时间戳转 epoch 秒（无法解析时取当前时间）"""
+    try:
+        return datetime.fromisoformat(str(timestamp)).timestamp()
+    except ValueError:
+        return time.time()
+
+
+# 决定价格的字段（与 model_prices 表的列一致）
+PRICE_FIELDS = ("quota_type", "model_ratio", "completion_ratio", "model_price")
+
+
+def price_point(model, group_ratio):
+    """模型价格条目中决定价格的部分"""
+    point = {field: model.get(field) for field in PRICE_FIELDS}
+    point["quota_type"] = point["quota_type"] or 0
+    point["group_ratio"] = group_ratio
+    return point
+
+
+def snapshot_key(path: Path):
+    """快照键：references/ 下的相对路径（其他位置用绝对路径）"""
+    path = Path(path)
+    try:
+        return path.resolve().relative_to(REFERENCES_DIR.resolve()).as_posix()
+    except ValueError:
+        return str(path.resolve())
+
+
+def usage_row(record):
+    """将 /api/data/self 的一条记录转为 (model, ts, quota, token_used, count)"""
+    return (
+        record.get("model_name", "unknown"),
+        int(record.get("created_at") or 0),
+        record.get("quota", 0) or 0,
+        record.get("token_used", 0) or 0,
+        record.get("count", 0) or 0,
+    )
+
+
+class Storage(ABC):
+    """存储接口（后端须实现全部抽象方法，缺少任何一个时无法实例化）"""
+
+    name = None
+
+    @abstractmethod
+    def save_pricing(self, pricing_data, timestamp=None, on_corrupt=None):
+        """
+        保存一次价格数据，返回当前保留的记录数
+
+        on_corrupt(隔离后的路径, 错误) 在已有历史无法解析时调用（仅 JSON 后端）。
+        """
+
+    @abstractmethod
+    def load_latest_pricing(self):
+        """最近一次价格记录 {"timestamp", "data"}，没有时返回 None"""
+
+    @abstractmethod
+    def save_snapshot(self, path: Path, snapshot):
+        """保存余额/用量等快照（path 为对应的 JSON 文件位置）"""
+
+    @abstractmethod
+    def load_snapshot(self, path: Path):
+        """读取快照，没有时返回 None"""
+
+    @abstractmethod
+    def save_usage(self, records, account="default"):
+        """保存用量明细（同一账户、模型、时间桶重复保存时覆盖）"""
+
+    @abstractmethod
+    def spend_by_model(self, since_ts, until_ts=None, account=None):
+        """时间段内各模型消耗，按 quota 降序：[(model, {"quota", "token_used", "count"})]"""
+
+    @abstractmethod
+    def iter_model_prices(self, models=None):
+        """
+        按时间升序逐条产出历史价格 (ts, 模型价格条目, group_ratio)
+
+        模型价格条目与 /api/pricing 的 data[] 字段一致；models 不为 None 时只产出这些模型。
+        """
+
+
+class JsonStorage(Storage):
+    """references/ 下的 JSON 文件"""
+
+    name = "json"
+
+    def __init__(
+        self,
+        history_file=HISTORY_FILE,
+        usage_file=USAGE_FILE,
+        price_changes_file=PRICE_CHANGES_FILE,
+    ):
+        self.history_file = history_file
+        self.usage_file = usage_file
+        self.price_changes_file = price_changes_file
+
+    def save_pricing(self, pricing_data, timestamp=None, on_corrupt=None):
+        record = {
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "data": pricing_data,
+        }
+
+        def append_record(history):
+            if not isinstance(history, list):
+                history = []
+            history.append(record)
+            # 只保留最近 N 条记录
+            return history[-MAX_HISTORY_RECORDS:]
+
+        history = update_json(
+            self.history_file, append_record, default=[], on_corrupt=on_corrupt
+        )
+        self._record_price_changes(record, on_corrupt)
+        return len(history)
+
+    def _record_price_changes(self, record, on_corrupt=None):
+        """逐模型追加与上一个价格点不同的价格，保留 USAGE_RETENTION_DAYS 天内的变化
+        （以及窗口开始时生效的那一个）"""
+        ts = _epoch(record["timestamp"])
+        pricing_data = record["data"] if isinstance(record["data"], dict) else {}
+        group_ratio = (pricing_data.get("group_ratio") or {}).get("default", 0.23)
+        cutoff = time.time() - USAGE_RETENTION_DAYS * 24 * 60 * 60
+
+        def merge(changes):
+            if not isinstance(changes, dict):
+                changes = {}
+            for model in pricing_data.get("data", []):
+                name = model.get("model_name")
+                if not name:
+                    continue
+                points = changes.setdefault(name, [])
+                point = price_point(model, group_ratio)
+                if not points or points[-1][1] != point:
+                    points.append([ts, point])
+                start = 0
+                while start + 1 < len(points) and points[start + 1][0] <= cutoff:
+                    start += 1
+                changes[name] = points[start:]
+            return changes
+
+        update_json(self.price_changes_file, merge, default={}, on_corrupt=on_corrupt)
+
+    def load_latest_pricing(self):
+        history = read_json(self.history_file)
+        if not history or not isinstance(history, list):
+            return None
+        return history[-1]
+
+    def save_snapshot(self, path: Path, snapshot):
+        atomic_write_json(Path(path), snapshot)
+
+    def load_snapshot(self, path: Path):
+        snapshot = read_json(Path(path))
+        return snapshot if isinstance(snapshot, dict) else None
+
+    def save_usage(self, records, account="default"):
+        rows = [usage_row(record) for record in records or []]
+        cutoff = time.time() - USAGE_RETENTION_DAYS * 24 * 60 * 60
+
+        def merge(data):
+            if not isinstance(data, dict):
+                data = {}
+            buckets = data.setdefault(account, {})
+            for model, ts, quota, token_used, count in rows:
+                buckets[f"{model}|{ts}"] = [model, ts, quota, token_used, count]
+            # JSON 文件整体重写，只保留最近 USAGE_RETENTION_DAYS 天
+            for name in data:
+                data[name] = {
+                    key: row for key, row in data[name].items() if row[1] >= cutoff
+                }
+            return data
+
+        update_json(self.usage_file, merge, default={})
+        return len(rows)
+
+    def spend_by_model(self, since_ts, until_ts=None, account=None):
+        data = read_json(self.usage_file, {}) or {}
+        totals = {}
+        for name, buckets in data.items():
+            if account is not None and name != account:
+                continue
+            for model, ts, quota, token_used, count in buckets.values():
+                if ts < since_ts or (until_ts is not None and ts >= until_ts):
+                    continue
+                stats = totals.setdefault(
+                    model, {"quota": 0, "token_used": 0, "count": 0}
+                )
+                stats["quota"] += quota
+                stats["token_used"] += token_used
+                stats["count"] += count
+        return sorted(totals.items(), key=lambda item: item[1]["quota"], reverse=True)
+
+    def iter_price_changes(self, models=None):
+        """价格变化记录中的 (ts, 模型价格条目, group_ratio)（未排序）"""
+        changes = read_json(self.price_changes_file, {}) or {}
+        if not isinstance(changes, dict):
+            return
+        for name, points in changes.items():
+            if models is not None and name not in models:
+                continue
+            for ts, point in points:
+                point = dict(point)
+                group_ratio = point.pop("group_ratio", 0.23)
+                yield ts, {"model_name": name, **point}, group_ratio
+
+    def iter_model_prices(self, models=None):
+        # 价格变化记录覆盖更早的时间；完整快照补上变化记录建立之前保存的历史
+        entries = list(self.iter_price_changes(models))
+        history = read_json(self.history_file, []) or []
+        for record in history:
+            if not isinstance(record, dict):
+                continue
+            ts = _epoch(record.get("timestamp"))
+            pricing_data = record.get("data") or {}
+            group_ratio = (pricing_data.get("group_ratio") or {}).get("default", 0.23)
+            for model in pricing_data.get("data", []):
+                if models is None or model.get("model_name") in models:
+                    entries.append((ts, model, group_ratio))
+        entries.sort(key=lambda entry: entry[0])
+        yield from entries
+
+
+class SqliteStorage(Storage):
+    """SQLite（WAL 模式）存储；每次操作使用独立连接，可在多线程/多进程中使用"""
+
+    name = "sqlite"
+
+    def __init__(self, db_file=STORAGE_DB_FILE):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+
+        def init(conn):
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+        self._run(init)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run(self, callback):
+        """在一个事务中执行 callback(conn)"""
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    return callback(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            raise StorageError(f"{self.db_file}: {e}") from e
+
+    def save_pricing(self, pricing_data, timestamp=None, on_corrupt=None):
+        timestamp = timestamp or datetime.now().isoformat()
+        ts = _epoch(timestamp)
+        models = pricing_data.get("data", []) if isinstance(pricing_data, dict) else []
+        group_ratio = (pricing_data.get("group_ratio") or {}).get("default", 0.23)
+
+        def write(conn):
+            cursor = conn.execute(
+                "INSERT INTO pricing_snapshots (timestamp, ts, payload) VALUES (?, ?, ?)",
+                (timestamp, ts, json.dumps(pricing_data, ensure_ascii=False)),
+            )
+            snapshot_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO model_prices (snapshot_id, model, ts, quota_type,"
+                " model_ratio, completion_ratio, model_price, group_ratio)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        snapshot_id,
+                        model.get("model_name"),
+                        ts,
+                        model.get("quota_type", 0),
+                        model.get("model_ratio"),
+                        model.get("completion_ratio"),
+                        model.get("model_price"),
+                        group_ratio,
+                    )
+                    for model in models
+                    if model.get("model_name")
+                ),
+            )
+            # 完整原始数据只保留最近 N 份，逐模型价格行全部保留
+            conn.execute(
+                "UPDATE pricing_snapshots SET payload = NULL"
+                " WHERE payload IS NOT NULL AND id <= ?",
+                (snapshot_id - MAX_HISTORY_RECORDS,),
+            )
+            return conn.execute(
+                "SELECT COUNT(*) FROM pricing_snapshots WHERE payload IS NOT NULL"
+            ).fetchone()[0]
+
+        return self._run(write)
+
+    def import_price_points(self, entries):
+        """导入不带完整快照的价格点 (ts, 模型价格条目, group_ratio)，返回导入的数量"""
+        by_ts = {}
+        for ts, model, group_ratio in entries:
+            by_ts.setdefault(ts, []).append((model, group_ratio))
+
+        def write(conn):
+            for ts, rows in sorted(by_ts.items()):
+                cursor = conn.execute(
+                    "INSERT INTO pricing_snapshots (timestamp, ts, payload)"
+                    " VALUES (?, ?, NULL)",
+                    (datetime.fromtimestamp(ts).isoformat(), ts),
+                )
+                conn.executemany(
+                    "INSERT INTO model_prices (snapshot_id, model, ts, quota_type,"
+                    " model_ratio, completion_ratio, model_price, group_ratio)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (
+                            cursor.lastrowid,
+                            model["model_name"],
+                            ts,
+                            *(model.get(field) for field in PRICE_FIELDS),
+                            group_ratio,
+                        )
+                        for model, group_ratio in rows
+                    ),
+                )
+            return sum(len(rows) for rows in by_ts.values())
+
+        return self._run(write)
+
+    def load_latest_pricing(self):
+        row = self._run(
+            lambda conn: conn.execute(
+                "SELECT timestamp, payload FROM pricing_snapshots"
+                " WHERE payload IS NOT NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        )
+        if not row:
+            return None
+        return {"timestamp": row[0], "data": json.loads(row[1])}
+
+    def save_snapshot(self, path: Path, snapshot):
+        key = snapshot_key(path)
+        ts = time.time()
+        balance = snapshot.get("balance") if isinstance(snapshot, dict) else None
+
+        def write(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (key, ts, payload) VALUES (?, ?, ?)",
+                (key, ts, json.dumps(snapshot, ensure_ascii=False)),
+            )
+            if balance:
+                conn.execute(
+                    "INSERT OR REPLACE INTO balance_samples"
+                    " (account, ts, quota, used_quota) VALUES (?, ?, ?, ?)",
+                    (
+                        snapshot.get("account", "default"),
+                        ts,
+                        balance.get("quota"),
+                        balance.get("used_quota"),
+                    ),
+                )
+
+        self._run(write)
+
+    def load_snapshot(self, path: Path):
+        row = self._run(
+            lambda conn: conn.execute(
+                "SELECT payload FROM snapshots WHERE key = ?", (snapshot_key(path),)
+            ).fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def save_usage(self, records, account="default"):
+        rows = [(account, *usage_row(record)) for record in records or []]
+        self._run(
+            lambda conn: conn.executemany(
+                "INSERT OR REPLACE INTO usage_buckets"
+                " (account, model, ts, quota, token_used, count)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        )
+        return len(rows)
+
+    def spend_by_model(self, since_ts, until_ts=None, account=None):
+        sql = (
+            "SELECT model, SUM(quota), SUM(token_used), SUM(count)"
+            " FROM usage_buckets WHERE ts >= ?"
+        )
+        params = [int(since_ts)]
+        if until_ts is not None:
+            sql += " AND ts < ?"
+            params.append(int(until_ts))
+        if account is not None:
+            sql += " AND account = ?"
+            params.append(account)
+        sql += " GROUP BY model ORDER BY SUM(quota) DESC"
+        rows = self._run(lambda conn: conn.execute(sql, params).fetchall())
+        return [
+            (model, {"quota": quota, "token_used": token_used, "count": count})
+            for model, quota, token_used, count in rows
+        ]
+
+    def iter_model_prices(self, models=None):
+        sql = (
+            "SELECT ts, model, quota_type, model_ratio, completion_ratio, model_price,"
+            " group_ratio FROM model_prices"
+        )
+        params = []
+        if models is not None:
+            models = list(models)
+            sql += f" WHERE model IN ({', '.join('?' * len(models))})"
+            params = models
+        sql += " ORDER BY ts"
+        rows = self._run(lambda conn: conn.execute(sql, params).fetchall())
+        for ts, model, quota_type, model_ratio, completion_ratio, price, group in rows:
+            entry = {
+                "model_name": model,
+                "quota_type": quota_type,
+                "model_ratio": model_ratio,
+                "completion_ratio": completion_ratio,
+                "model_price": price,
+            }
+            yield ts, entry, group
+
+
+def configured_backend():
+    """读取配置的存储后端名称"""
+    backend = os.environ.get(STORAGE_ENV)
+    if not backend and CONFIG_FILE.exists():
+        try:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            config = {}
+        if isinstance(config, dict):
+            backend = config.get("storage")
+    backend = (backend or "json").lower()
+    return backend if backend in STORAGE_BACKENDS else "json"
+
+
+_storage = None
+
+
+def get_storage():
+    """获取当前配置的存储后端（进程内复用）"""
+    global _storage
+    if _storage is None:
+        if configured_backend() == "sqlite":
+            _storage = SqliteStorage()
+        else:
+            _storage = JsonStorage()
+    return _storage
+
+
+def migrate_json_to_sqlite(db_file=STORAGE_DB_FILE):
+    """将 JSON 价格历史、余额快照与用量明细导入 SQLite，返回导入的价格记录数"""
+    source = JsonStorage()
+    target = SqliteStorage(db_file)
+
+    history = read_json(HISTORY_FILE, []) or []
+    records = [
+        record for record in history if isinstance(record, dict) and record.get("data")
+    ]
+    # 早于完整快照的价格变化点单独导入（之后的由快照本身覆盖）
+    first_ts = min((_epoch(record.get("timestamp")) for record in records), default=None)
+    target.import_price_points(
+        entry
+        for entry in source.iter_price_changes()
+        if first_ts is None or entry[0] < first_ts
+    )
+    for record in records:
+        target.save_pricing(record["data"], record.get("timestamp"))
+
+    snapshot = source.load_snapshot(BALANCE_FILE)
+    if snapshot:
+        target.save_snapshot(BALANCE_FILE, snapshot)
+
+    usage = read_json(USAGE_FILE, {}) or {}
+    for account, buckets in usage.items():
+        target.save_usage(
+            (
+                {
+                    "model_name": model,
+                    "created_at": ts,
+                    "quota": quota,
+                    "token_used": token_used,
+                    "count": count,
+                }
+                for model, ts, quota, token_used, count in buckets.values()
+            ),
+            account=account,
+        )
+    return len(history)
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Aiberm 存储工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="将现有 JSON 数据导入 SQLite")
+    spend = subparsers.add_parser("spend", help="各模型消耗统计")
+    spend.add_argument("--days", type=int, default=30, help="统计天数（默认 30）")
+    spend.add_argument("--account", default=None, help="只统计指定账户")
+    return parser.parse_args(argv)
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    if args.command == "migrate":
+        try:
+            count = migrate_json_to_sqlite()
+        except CorruptStoreError as e:
+            print(f"❌ JSON 数据无法解析: {e}")
+            sys.exit(1)
+        except StorageError as e:
+            print(f"❌ 写入 SQLite 失败: {e}")
+            sys.exit(1)
+        print(f"✅ 已导入 {count} 条价格记录到 {STORAGE_DB_FILE}")
+        print('   在 config.json 中设置 "storage": "sqlite" 以启用')
+        return
+
+    storage = get_storage()
+    since_ts = time.time() - args.days * 24 * 60 * 60
+    try:
+        rows = storage.spend_by_model(since_ts, account=args.account)
+    except CorruptStoreError as e:
+        print(f"❌ 用量数据无法解析: {e}")
+        sys.exit(1)
+    except StorageError as e:
+        print(f"❌ 读取用量数据失败: {e}")
+        sys.exit(1)
+    print(f"\n📊 近 {args.days} 天各模型消耗（{storage.name} 存储）")
+    if not rows:
+        print("   暂无用量数据")
+        return
+    for model, stats in rows:
+        print(
+            f"   {model}: ${stats['quota'] / QUOTA_DIVISOR:.2f} / "
+            f"{stats['count']} 次 / {stats['token_used']} tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 用量异常检测
+按模型对每个已结束的小时桶做流式检测：维护 quota / token_used 的指数加权均值与方差，
+新桶相对加权均值偏离超过 ANOMALY_Z_THRESHOLD 个标准差时记为异常（只关注消耗突增）。
+
+    diff = x - mean
+    mean = mean + α * diff
+    var  = (1 - α) * (var + α * diff²)
+    （α = 1 - 2^(-1 / 半衰期桶数)，半衰期见 constants.ANOMALY_HALF_LIFE）
+
+状态按模型保存最后处理的桶，每次同步只处理之后的新桶，不回扫历史；
+查询范围内没有记录的小时按 0 计入，范围外的空档（未查询到的时段）直接跳过。
+"""
+
+import math
+import time
+from pathlib import Path
+
+from constants import (
+    ACCOUNT_SNAPSHOT_DIR,
+    ANOMALY_HALF_LIFE,
+    ANOMALY_HISTORY,
+    ANOMALY_MIN_QUOTA,
+    ANOMALY_MIN_SAMPLES,
+    ANOMALY_Z_THRESHOLD,
+    DEFAULT_ACCOUNT,
+    QUOTA_DIVISOR,
+    USAGE_ANOMALY_FILE,
+)
+from file_store import CorruptStoreError, atomic_write_json, locked, read_json
+from profiling import traced
+from usage_rollup import HOUR, bucket_start, format_bucket
+
+METRICS = ("quota", "token_used")
+
+# 连续空档超过该桶数时，加权均值与方差已衰减到可忽略，直接归零
+MAX_GAP_BUCKETS = 10 * ANOMALY_HALF_LIFE
+
+
+def smoothing_factor(half_life=ANOMALY_HALF_LIFE):
+    """由半衰期（桶数）得到 EWMA 平滑系数 α"""
+    return 1 - 2 ** (-1 / half_life)
+
+
+def new_model_state():
+    """单个模型的空状态"""
+    return {
+        "last_bucket": None,
+        "samples": 0,
+        "mean": {metric: 0.0 for metric in METRICS},
+        "var": {metric: 0.0 for metric in METRICS},
+    }
+
+
+def update_stats(state, values, alpha):
+    """用一个桶的数值更新加权均值与方差（原地修改），首个样本直接作为均值"""
+    if state["samples"] == 0:
+        state["mean"] = {metric: float(values[metric]) for metric in METRICS}
+        state["samples"] = 1
+        return
+    for metric in METRICS:
+        diff = values[metric] - state["mean"][metric]
+        increment = alpha * diff
+        state["mean"][metric] += increment
+        state["var"][metric] = (1 - alpha) * (state["var"][metric] + diff * increment)
+    state["samples"] += 1
+
+
+def score(state, values, z_threshold=ANOMALY_Z_THRESHOLD):
+    """
+    用更新前的基线为一个桶打分
+
+    返回 {metric: z}，只包含向上偏离超过阈值的指标；样本不足时返回空字典。
+    """
+    if state["samples"] < ANOMALY_MIN_SAMPLES:
+        return {}
+    flagged = {}
+    for metric in METRICS:
+        diff = values[metric] - state["mean"][metric]
+        if diff <= 0:
+            continue
+        std = math.sqrt(state["var"][metric])
+        z = diff / std if std > 0 else math.inf
+        if z >= z_threshold:
+            flagged[metric] = z
+    return flagged
+
+
+def skip_gap(state, empty_buckets, alpha):
+    """连续 empty_buckets 个无用量的桶按 0 计入"""
+    if empty_buckets <= 0:
+        return
+    if empty_buckets > MAX_GAP_BUCKETS:
+        state["mean"] = {metric: 0.0 for metric in METRICS}
+        state["var"] = {metric: 0.0 for metric in METRICS}
+        state["samples"] += empty_buckets
+        return
+    zeros = {metric: 0 for metric in METRICS}
+    for _ in range(empty_buckets):
+        update_stats(state, zeros, alpha)
+
+
+class AnomalyDetector:
+    """
+    按模型的流式异常检测器
+
+    models[model] 为 new_model_state() 结构；anomalies 为最近的异常记录（新的在后）。
+    """
+
+    def __init__(self, models=None, anomalies=None, half_life=ANOMALY_HALF_LIFE):
+        self.models = models or {}
+        self.anomalies = anomalies or []
+        self.alpha = smoothing_factor(half_life)
+
+    def observe(self, model, bucket, values, covered_since=None):
+        """
+        处理一个模型的一个已结束的桶（bucket 必须晚于该模型上次处理的桶）
+
+        covered_since 为本次查询范围的起点：上次处理的桶与本桶之间、
+        且落在查询范围内的空档按 0 计入。返回异常记录或 None。
+        """
+        state = self.models.setdefault(model, new_model_state())
+        last = state["last_bucket"]
+        if last is not None:
+            if bucket <= last:
+                return None
+            gap_start = last + HOUR
+            if covered_since is not None:
+                gap_start = max(gap_start, covered_since)
+            skip_gap(state, (bucket - gap_start) // HOUR, self.alpha)
+
+        flagged = score(state, values) if values["quota"] >= ANOMALY_MIN_QUOTA else {}
+        anomaly = None
+        if flagged:
+            anomaly = {
+                "model_name": model,
+                "bucket": bucket,
+                "time": format_bucket(bucket, "hour"),
+                **{metric: values[metric] for metric in METRICS},
+                "baseline": {metric: state["mean"][metric] for metric in METRICS},
+                "z": {metric: round(z, 2) for metric, z in flagged.items()},
+            }
+            self.anomalies.append(anomaly)
+            del self.anomalies[:-ANOMALY_HISTORY]
+
+        update_stats(state, values, self.alpha)
+        state["last_bucket"] = bucket
+        return anomaly
+
+    @traced("aggregate.usage_anomaly")
+    def update(self, hourly_rollup, window=None, now=None):
+        """
+        用一次同步的小时汇总更新检测器，返回本次新发现的异常
+
+        只处理已结束的桶（当前小时还在累积，留到下次同步）；
+        window 为本次查询的 (start_ts, end_ts)。
+        """
+        current = bucket_start(time.time() if now is None else now, "hour")
+        covered_since = None
+        if window:
+            covered_since = bucket_start(window[0] + HOUR - 1, "hour")
+            current = min(current, bucket_start(window[1], "hour"))
+
+        per_model = {}
+        for (model, bucket), cell in hourly_rollup.cells.items():
+            if bucket < current:
+                per_model.setdefault(model, []).append((bucket, cell))
+
+        found = []
+        for model, buckets in per_model.items():
+            buckets.sort()
+            for bucket, cell in buckets:
+                anomaly = self.observe(
+                    model,
+                    bucket,
+                    {"quota": cell[0], "token_used": cell[1]},
+                    covered_since,
+                )
+                if anomaly:
+                    found.append(anomaly)
+        return found
+
+    def to_dict(self):
+        return {"models": self.models, "anomalies": self.anomalies}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("models"), data.get("anomalies"))
+
+
+def anomaly_file(account=DEFAULT_ACCOUNT):
+    """账户对应的异常检测状态文件"""
+    if account == DEFAULT_ACCOUNT:
+        return USAGE_ANOMALY_FILE
+    return ACCOUNT_SNAPSHOT_DIR / f"{account}.anomalies.json"
+
+
+def load_detector(path: Path = USAGE_ANOMALY_FILE):
+    """读取检测器状态，缺失或损坏时返回空检测器"""
+    try:
+        data = read_json(path)
+    except CorruptStoreError:
+        data = None
+    if not isinstance(data, dict):
+        return AnomalyDetector()
+    return AnomalyDetector.from_dict(data)
+
+
+@traced("history.usage_anomaly")
+def detect_anomalies(hourly_rollup, path: Path = USAGE_ANOMALY_FILE, window=None):
+    """加锁读取状态、增量检测并写回，返回本次新发现的异常"""
+    with locked(path):
+        detector = load_detector(path)
+        found = detector.update(hourly_rollup, window)
+        atomic_write_json(path, detector.to_dict(), indent=None)
+    return found
+
+
+def format_anomaly(anomaly):
+    """单条异常的显示文本"""
+    baseline = anomaly["baseline"]["quota"] / QUOTA_DIVISOR
+    z_text = ", ".join(f"{metric} z={z}" for metric, z in anomaly["z"].items())
+    return (
+        f"   {anomaly['time']} {anomaly['model_name']}: "
+        f"${anomaly['quota'] / QUOTA_DIVISOR:.2f}（基线 ${baseline:.2f}，{z_text}）"
+    )
+
+
+def format_anomalies(anomalies):
+    """格式化异常列表（文本行列表），没有异常时返回空列表"""
+    if not anomalies:
+        return []
+    lines = [f"\n⚠️  用量异常 ({len(anomalies)} 个小时桶消耗突增)"]
+    lines.extend(format_anomaly(anomaly) for anomaly in anomalies)
+    return lines
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 用量汇总引擎
+将 /api/data/self 的用量记录按 模型 × 时间桶（hour / day / week）单次遍历汇总，
+总量、分模型、分时段的问题都直接从汇总结果回答，粗粒度由细粒度合并得到。
+内存只与 模型数 × 时间桶数 有关，与记录条数无关（记录可以是任意可迭代对象）。
+"""
+
+import time
+from datetime import datetime
+from pathlib import Path
+
+from constants import ACCOUNT_SNAPSHOT_DIR, DEFAULT_ACCOUNT, USAGE_ROLLUP_FILE
+from file_store import CorruptStoreError, atomic_write_json, read_json
+from profiling import traced
+from ranking import top_k
+
+GRANULARITIES = ("hour", "day", "week")
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+# 1970-01-05 是周一，周桶以此为起点对齐
+WEEK_ANCHOR = 4 * DAY
+
+# 本地时区偏移（秒），按天 / 周分桶以本地零点对齐
+LOCAL_OFFSET = int(datetime.now().astimezone().utcoffset().total_seconds())
+
+
+def bucket_start(ts, granularity):
+    """时间戳所在时间桶的起点（epoch 秒）"""
+    ts = int(ts)
+    if granularity == "hour":
+        return ts - ts % HOUR
+    local = ts + LOCAL_OFFSET
+    if granularity == "day":
+        return local - local % DAY - LOCAL_OFFSET
+    if granularity == "week":
+        return local - (local - WEEK_ANCHOR) % WEEK - LOCAL_OFFSET
+    raise ValueError(f"不支持的时间粒度: {granularity}")
+
+
+def format_bucket(bucket, granularity):
+    """时间桶的显示文本"""
+    if granularity == "hour":
+        return datetime.fromtimestamp(bucket).strftime("%Y-%m-%d %H:00")
+    if granularity == "week":
+        return datetime.fromtimestamp(bucket).strftime("%Y-%m-%d 当周")
+    return datetime.fromtimestamp(bucket).strftime("%Y-%m-%d")
+
+
+def _stats(cell):
+    return {"quota": cell[0], "token_used": cell[1], "count": cell[2]}
+
+
+class UsageRollup:
+    """
+    单一粒度的用量汇总
+
+    遍历记录时只更新 cells[(model, bucket)] = [quota, token_used, count]（每条记录 O(1)），
+    按模型 / 按时段 / 总计在首次查询时由 cells 汇总得到（O(cells)）。
+    """
+
+    def __init__(self, granularity="day"):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"不支持的时间粒度: {granularity}")
+        self.granularity = granularity
+        self.cells = {}
+        self.records = 0
+        self._summary = None
+
+    def add_values(self, model, bucket, quota, token_used, count):
+        """累加一组已分桶的数值"""
+        cell = self.cells.get((model, bucket))
+        if cell is None:
+            self.cells[(model, bucket)] = [quota, token_used, count]
+        else:
+            cell[0] += quota
+            cell[1] += token_used
+            cell[2] += count
+        self._summary = None
+
+    def _summarize(self):
+        """由 cells 汇总出 (models, periods, total)，结果缓存到下次写入为止"""
+        if self._summary is None:
+            models = {}
+            periods = {}
+            total = [0, 0, 0]
+            for (model, bucket), cell in self.cells.items():
+                for table, key in ((models, model), (periods, bucket)):
+                    merged = table.get(key)
+                    if merged is None:
+                        table[key] = list(cell)
+                    else:
+                        merged[0] += cell[0]
+                        merged[1] += cell[1]
+                        merged[2] += cell[2]
+                total[0] += cell[0]
+                total[1] += cell[1]
+                total[2] += cell[2]
+            self._summary = (models, periods, total)
+        return self._summary
+
+    def add(self, record):
+        """累加一条 /api/data/self 记录"""
+        self.records += 1
+        self.add_values(
+            record.get("model_name", "unknown"),
+            bucket_start(record.get("created_at") or 0, self.granularity),
+            record.get("quota", 0) or 0,
+            record.get("token_used", 0) or 0,
+            record.get("count", 0) or 0,
+        )
+
+    def add_all(self, records):
+        for record in records or []:
+            self.add(record)
+        return self
+
+    def totals(self):
+        """全部合计 {"quota", "token_used", "count"}"""
+        return _stats(self._summarize()[2])
+
+    def by_model(self, top_n=None):
+        """按消耗降序的模型合计 [(model, stats)]（top_n 为 None 表示全部）"""
+        ranked = top_k(
+            self._summarize()[0].items(), top_n, key=lambda item: item[1][0], largest=True
+        )
+        return [(model, _stats(cell)) for model, cell in ranked]
+
+    def by_period(self, model=None, since=None, until=None):
+        """按时间升序的时段合计 [(bucket, stats)]，可限定模型与时间范围"""
+        if model is None:
+            items = self._summarize()[1].items()
+        else:
+            items = (
+                (bucket, cell)
+                for (name, bucket), cell in self.cells.items()
+                if name == model
+            )
+        return [
+            (bucket, _stats(cell))
+            for bucket, cell in sorted(items)
+            if (since is None or bucket >= since) and (until is None or bucket < until)
+        ]
+
+    def coarsen(self, granularity):
+        """由细粒度汇总生成粗粒度汇总（hour → day → week），无需原始记录"""
+        if GRANULARITIES.index(granularity) < GRANULARITIES.index(self.granularity):
+            raise ValueError(f"无法从 {self.granularity} 细化到 {granularity}")
+        result = UsageRollup(granularity)
+        for (model, bucket), cell in self.cells.items():
+            result.add_values(model, bucket_start(bucket, granularity), *cell)
+        result.records = self.records
+        return result
+
+    def to_dict(self):
+        return {
+            "granularity": self.granularity,
+            "records": self.records,
+            "cells": [
+                [model, bucket, *cell] for (model, bucket), cell in self.cells.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        rollup = cls(data.get("granularity", "day"))
+        for model, bucket, quota, token_used, count in data.get("cells", []):
+            rollup.add_values(model, bucket, quota, token_used, count)
+        rollup.records = data.get("records", 0)
+        return rollup
+
+
+@traced("aggregate.rollup")
+def build_rollups(records, granularities=GRANULARITIES):
+    """
+    单次遍历记录生成多个粒度的汇总 {granularity: UsageRollup}
+
+    遍历时只按最细的粒度累加，更粗的粒度由其合并得到（不再遍历原始记录）。
+    """
+    ordered = sorted(granularities, key=GRANULARITIES.index)
+    finest = UsageRollup(ordered[0]).add_all(records)
+    rollups = {ordered[0]: finest}
+    for granularity in ordered[1:]:
+        rollups[granularity] = finest.coarsen(granularity)
+    return rollups
+
+
+def rollup_file(account=DEFAULT_ACCOUNT):
+    """账户对应的汇总文件"""
+    if account == DEFAULT_ACCOUNT:
+        return USAGE_ROLLUP_FILE
+    return ACCOUNT_SNAPSHOT_DIR / f"{account}.rollup.json"
+
+
+@traced("history.save_rollup")
+def save_rollups(rollups, path: Path = USAGE_ROLLUP_FILE, window=None):
+    """保存汇总结果（window 为 (start_ts, end_ts) 时一并记录）"""
+    payload = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "window": list(window) if window else None,
+        "rollups": {name: rollup.to_dict() for name, rollup in rollups.items()},
+    }
+    atomic_write_json(path, payload, indent=None)
+
+
+def load_rollups(path: Path = USAGE_ROLLUP_FILE):
+    """读取保存的汇总，返回 (payload 元信息, {granularity: UsageRollup})；没有时返回 (None, {})"""
+    try:
+        payload = read_json(path)
+    except CorruptStoreError:
+        return None, {}
+    if not isinstance(payload, dict):
+        return None, {}
+    rollups = {
+        name: UsageRollup.from_dict(data)
+        for name, data in (payload.get("rollups") or {}).items()
+        if name in GRANULARITIES
+    }
+    return payload, rollups
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Aiberm 价格监控工具 - 滚动用量窗口
+近 1 天 / 7 天 / 30 天等滚动窗口的用量合计随每次同步增量维护，而不是每次从原始记录重算:
+- 保留最大窗口内的小时桶 cells[bucket][model] = [quota, token_used, count]
+- 同步到的桶按差值（新值 - 旧值）计入覆盖它的每个窗口
+- 时间前进时，滑出窗口的桶从该窗口的合计中减去
+每次更新只触及变化的桶与滑出的桶，任一窗口的合计随时 O(1) 可读，报告可同时展示所有窗口。
+"""
+
+import time
+from pathlib import Path
+
+from constants import (
+    ACCOUNT_SNAPSHOT_DIR,
+    DEFAULT_ACCOUNT,
+    QUOTA_DIVISOR,
+    USAGE_WINDOWS,
+    USAGE_WINDOWS_FILE,
+)
+from file_store import CorruptStoreError, atomic_write_json, locked, read_json
+from profiling import traced
+from ranking import top_k
+from usage_rollup import DAY, HOUR, bucket_start
+
+
+def _stats(cell):
+    return {"quota": cell[0], "token_used": cell[1], "count": cell[2]}
+
+
+def _accumulate(table, key, delta):
+    """table[key] += delta，合计归零的条目直接删除"""
+    cell = table.get(key)
+    if cell is None:
+        cell = table[key] = [0, 0, 0]
+    cell[0] += delta[0]
+    cell[1] += delta[1]
+    cell[2] += delta[2]
+    if not any(cell):
+        del table[key]
+
+
+class RollingWindows:
+    """
+    一组共享小时桶的滚动窗口
+
+    windows 为 {窗口名: 天数}；窗口 name 覆盖 [starts[name], 当前小时桶] 内的桶。
+    sums[name][model] 与 totals[name] 是该窗口的运行合计。
+    """
+
+    def __init__(self, windows=USAGE_WINDOWS):
+        self.windows = {name: int(days) * DAY for name, days in windows.items()}
+        self.span = max(self.windows.values())
+        self.cells = {}
+        self.sums = {name: {} for name in self.windows}
+        self.totals = {name: [0, 0, 0] for name in self.windows}
+        self.starts = {name: None for name in self.windows}
+        self.current = None
+
+    def _window_start(self, name, current):
+        return current - self.windows[name] + HOUR
+
+    def _add_bucket(self, name, bucket_cells, sign):
+        """把一个桶的全部模型计入 / 移出窗口"""
+        sums = self.sums[name]
+        for model, cell in bucket_cells.items():
+            delta = [sign * value for value in cell]
+            _accumulate(sums, model, delta)
+            for i in range(3):
+                self.totals[name][i] += delta[i]
+
+    def _recompute(self, name):
+        """从保留的桶重算一个窗口（跨越超过整个窗口的时间跳跃时使用）"""
+        self.sums[name] = {}
+        self.totals[name] = [0, 0, 0]
+        start = self.starts[name]
+        for bucket, bucket_cells in self.cells.items():
+            if bucket >= start:
+                self._add_bucket(name, bucket_cells, 1)
+
+    def advance(self, now=None):
+        """时间前进到 now：滑出窗口的桶从合计中减去，超出最大窗口的桶丢弃"""
+        current = bucket_start(time.time() if now is None else now, "hour")
+        if self.current is not None and current <= self.current:
+            return
+
+        for name in self.windows:
+            old_start = self.starts[name]
+            new_start = self._window_start(name, current)
+            self.starts[name] = new_start
+            if old_start is None:
+                continue
+            if new_start - old_start >= self.windows[name]:
+                self._recompute(name)
+                continue
+            for bucket in range(old_start, new_start, HOUR):
+                bucket_cells = self.cells.get(bucket)
+                if bucket_cells:
+                    self._add_bucket(name, bucket_cells, -1)
+
+        oldest = current - self.span + HOUR
+        for bucket in [bucket for bucket in self.cells if bucket < oldest]:
+            del self.cells[bucket]
+        self.current = current
+
+    def set_cell(self, model, bucket, quota, token_used, count):
+        """
+        写入一个 (模型, 小时桶) 的最新合计（同步到的数据覆盖旧值）
+
+        只把差值计入覆盖该桶的窗口；早于最大窗口的桶忽略。
+        """
+        if self.current is None:
+            self.advance()
+        bucket = bucket_start(bucket, "hour")
+        if bucket < self.current - self.span + HOUR:
+            return
+
+        bucket_cells = self.cells.setdefault(bucket, {})
+        old = bucket_cells.get(model, [0, 0, 0])
+        delta = [quota - old[0], token_used - old[1], count - old[2]]
+        if not any(delta):
+            return
+        bucket_cells[model] = [quota, token_used, count]
+
+        for name, start in self.starts.items():
+            if bucket >= start:
+                _accumulate(self.sums[name], model, delta)
+                for i in range(3):
+                    self.totals[name][i] += delta[i]
+
+    @traced("aggregate.usage_windows")
+    def update(self, hourly_rollup, now=None):
+        """用一次同步的小时汇总（usage_rollup.UsageRollup("hour")）更新全部窗口"""
+        self.advance(now)
+        for (model, bucket), cell in hourly_rollup.cells.items():
+            self.set_cell(model, bucket, *cell)
+        return self
+
+    def window(self, name):
+        """窗口合计 {"quota", "token_used", "count"}（O(1)）"""
+        return _stats(self.totals[name])
+
+    def by_model(self, name, top_n=None):
+        """窗口内按消耗降序的模型合计 [(model, stats)]"""
+        ranked = top_k(
+            self.sums[name].items(), top_n, key=lambda item: item[1][0], largest=True
+        )
+        return [(model, _stats(cell)) for model, cell in ranked]
+
+    def summary(self):
+        """全部窗口的合计 {窗口名: stats}，按窗口从短到长排列"""
+        return {
+            name: self.window(name)
+            for name in sorted(self.windows, key=self.windows.get)
+        }
+
+    def to_dict(self):
+        return {
+            "windows": {name: length // DAY for name, length in self.windows.items()},
+            "current": self.current,
+            "starts": self.starts,
+            "totals": self.totals,
+            "sums": self.sums,
+            "cells": [
+                [bucket, model, *cell]
+                for bucket, bucket_cells in self.cells.items()
+                for model, cell in bucket_cells.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data, windows=USAGE_WINDOWS):
+        """
+        从保存的状态恢复
+
+        窗口配置改变（增删窗口 / 调整天数）时，由保留的桶重算运行合计。
+        """
+        result = cls(windows)
+        for bucket, model, quota, token_used, count in data.get("cells", []):
+            result.cells.setdefault(int(bucket), {})[model] = [quota, token_used, count]
+        result.current = data.get("current")
+        if result.current is None:
+            return result
+
+        if data.get("windows") == dict(windows) and data.get("totals"):
+            result.starts = {name: data["starts"][name] for name in result.windows}
+            result.totals = {name: list(data["totals"][name]) for name in result.windows}
+            result.sums = {
+                name: {model: list(cell) for model, cell in data["sums"][name].items()}
+                for name in result.windows
+            }
+        else:
+            for name in result.windows:
+                result.starts[name] = result._window_start(name, result.current)
+                result._recompute(name)
+        return result
+
+
+def windows_file(account=DEFAULT_ACCOUNT):
+    """账户对应的滚动窗口状态文件"""
+    if account == DEFAULT_ACCOUNT:
+        return USAGE_WINDOWS_FILE
+    return ACCOUNT_SNAPSHOT_DIR / f"{account}.windows.json"
+
+
+def load_windows(path: Path = USAGE_WINDOWS_FILE):
+    """读取滚动窗口状态，缺失或损坏时返回空状态"""
+    try:
+        data = read_json(path)
+    except CorruptStoreError:
+        data = None
+    if not isinstance(data, dict):
+        return RollingWindows()
+    return RollingWindows.from_dict(data)
+
+
+@traced("history.usage_windows")
+def update_windows(hourly_rollup, path: Path = USAGE_WINDOWS_FILE, now=None):
+    """加锁读取状态、增量更新并写回，返回全部窗口的合计"""
+    with locked(path):
+        windows = load_windows(path).update(hourly_rollup, now)
+        atomic_write_json(path, windows.to_dict(), indent=None)
+    return windows.summary()
+
+
+def window_label(name):
+    """窗口名的显示文本（"7d" → "近 7 天"）"""
+    days = USAGE_WINDOWS.get(name)
+    return f"近 {days} 天" if days is not None else name
+
+
+def format_windows(usage_windows):
+    """格式化滚动窗口合计（单行）"""
+    parts = [
+        f"{window_label(name)} ${stats['quota'] / QUOTA_DIVISOR:.2f}（{stats['count']} 次）"
+        for name, stats in usage_windows.items()
+    ]
+    return "   滚动窗口: " + " / ".join(parts)